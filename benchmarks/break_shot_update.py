@@ -0,0 +1,110 @@
+import time
+
+import fastfiz as ff
+import vectormath as vmath
+
+from fastfiz_renderer import GameTable
+from fastfiz_renderer.DevUtils import DevShotDeciders
+
+FRAMES_PER_SECOND = 120
+REPEATS = 5
+
+
+def legacy_update(ball, time_since_shot_start: float, shot: ff.Shot, sliding_friction_const: float,
+                  rolling_friction_const: float, gravitational_const: float):
+    # Per-frame event list rescan that GameBall.update did before shots were compiled into timelines
+    relevant_states = ball._get_relevant_ball_states_from_shot(shot)
+
+    if not relevant_states:
+        return
+
+    cur_state = relevant_states[0]
+
+    if cur_state.e_time > time_since_shot_start:
+        return
+
+    for state in relevant_states:
+        if cur_state.e_time < state.e_time <= time_since_shot_start:
+            cur_state = state
+
+    delta_time = time_since_shot_start - cur_state.e_time
+    displacement = vmath.Vector2(0, 0)
+
+    if cur_state.state == ff.Ball.ROLLING:
+        displacement = cur_state.vel * delta_time - 0.5 * rolling_friction_const * gravitational_const * \
+                       delta_time ** 2 * cur_state.vel.copy().normalize()
+    if cur_state.state == ff.Ball.SLIDING:
+        rotational_velocity = ball.radius * vmath.Vector3(0, 0, cur_state.ang_vel.z).cross(cur_state.ang_vel)
+        relative_velocity = cur_state.vel + vmath.Vector2(rotational_velocity.x, rotational_velocity.y)
+        displacement = cur_state.vel * delta_time - 0.5 * sliding_friction_const * gravitational_const * \
+                       delta_time ** 2 * relative_velocity.normalize()
+
+    ball.position = displacement + cur_state.pos
+    ball.state = cur_state.state
+
+
+def frame_times(duration: float):
+    frame_count = int(duration * FRAMES_PER_SECOND) + 1
+    return [i / FRAMES_PER_SECOND for i in range(frame_count)]
+
+
+def bench_legacy(game_table: GameTable, shot: ff.Shot) -> float:
+    times = frame_times(shot.getDuration())
+    start = time.perf_counter()
+    for t in times:
+        for ball in game_table.game_balls:
+            legacy_update(ball, t, shot, game_table.sliding_friction_const, game_table.rolling_friction_const,
+                          game_table.gravitational_const)
+    return (time.perf_counter() - start) / len(times)
+
+
+def bench_timeline(game_table: GameTable, shot: ff.Shot) -> float:
+    start = time.perf_counter()
+    game_table.add_shot(ff.ShotParams(), shot)
+    timeline = game_table._shot_queue.pop()[1]
+    compile_time = time.perf_counter() - start
+
+    times = frame_times(timeline.duration)
+    start = time.perf_counter()
+    for t in times:
+        for ball in game_table.game_balls:
+            ball_timeline = timeline.get_ball_timeline(ball.number)
+            if ball_timeline:
+                ball.update(t, ball_timeline)
+    return (time.perf_counter() - start + compile_time) / len(times)
+
+
+def bench_batched(game_table: GameTable, shot: ff.Shot) -> float:
+    game_table.add_shot(ff.ShotParams(), shot)
+    timeline = game_table._shot_queue.pop()[1]
+
+    times = frame_times(timeline.duration)
+    start = time.perf_counter()
+    for t in times:
+        positions, states, moved = timeline.positions_at(t)
+        positions, states, moved = positions.tolist(), states.tolist(), moved.tolist()
+        for ball in game_table.game_balls:
+            if moved[ball.number]:
+                ball.position = vmath.Vector2(*positions[ball.number])
+                ball.state = states[ball.number]
+    return (time.perf_counter() - start) / len(times)
+
+
+def main():
+    table_state: ff.TableState = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    game_table = GameTable.from_table_state(table_state, 1)
+    shot = table_state.executeShot(DevShotDeciders.break_shot_decider(table_state))
+
+    legacy = min(bench_legacy(game_table, shot) for _ in range(REPEATS))
+    timeline = min(bench_timeline(game_table, shot) for _ in range(REPEATS))
+    batched = min(bench_batched(game_table, shot) for _ in range(REPEATS))
+
+    print(f"Break shot: {len(shot.getEventList())} events, {shot.getDuration():.2f}s at {FRAMES_PER_SECOND} fps")
+    print(f"Event list rescan: {legacy * 1e6:10.1f} us/frame")
+    print(f"Compiled timeline: {timeline * 1e6:10.1f} us/frame (compile cost amortised)")
+    print(f"Batched NumPy:     {batched * 1e6:10.1f} us/frame")
+    print(f"Speedup:           {legacy / timeline:10.1f}x per ball, {legacy / batched:.1f}x batched")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, Optional
+
+import fastfiz as ff
+import skia
+
+from fastfiz_renderer import GameSession, GameTable
+from fastfiz_renderer.DevUtils import DevShotDeciders
+from fastfiz_renderer.HeadlessRenderer import HeadlessRenderer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+FRAMES_PER_SECOND = 60
+DRAW_SCALINGS = (100, 200, 400)
+
+
+class Benchmark:
+    def __init__(self, name: str, run: Callable[[], None], setup: Optional[Callable[[], None]] = None,
+                 repeats: int = 20):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.repeats = repeats
+
+    def measure(self) -> dict:
+        samples = []
+        for _ in range(self.repeats):
+            if self.setup:
+                self.setup()
+            start = time.perf_counter()
+            self.run()
+            samples.append(time.perf_counter() - start)
+
+        return {"median": statistics.median(samples), "min": min(samples), "mean": statistics.mean(samples),
+                "repeats": self.repeats}
+
+
+def racked_table_state() -> ff.TableState:
+    return ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+
+
+def frame_times(duration: float) -> list[float]:
+    return [i / FRAMES_PER_SECOND for i in range(int(duration * FRAMES_PER_SECOND) + 1)]
+
+
+def build_benchmarks() -> list[Benchmark]:
+    table_state = racked_table_state()
+    game_table = GameTable.from_table_state(table_state, 1)
+    params = DevShotDeciders.break_shot_decider(table_state)
+    shot = racked_table_state().executeShot(params)
+    game_table.add_shot(params, shot)
+    timeline = game_table._shot_queue.pop()[1]
+    times = frame_times(timeline.duration)
+
+    def _ball_update():
+        for t in times:
+            for ball in game_table.game_balls:
+                ball_timeline = timeline.get_ball_timeline(ball.number)
+                if ball_timeline:
+                    ball.update(t, ball_timeline)
+
+    def _relevant_ball_states():
+        for ball in game_table.game_balls:
+            ball._get_relevant_ball_states_from_shot(shot)
+
+    benchmarks = [
+        Benchmark("GameTable.from_table_state", lambda: GameTable.from_table_state(table_state, 1), repeats=200),
+        Benchmark("GameBall.update break shot", _ball_update),
+        Benchmark("GameBall._get_relevant_ball_states_from_shot", _relevant_ball_states, repeats=50),
+    ]
+
+    for horizontal_mode in (False, True):
+        for scaling in DRAW_SCALINGS:
+            benchmarks.append(draw_benchmark(game_table, scaling, horizontal_mode))
+
+    benchmarks.append(shoot_benchmark())
+    return benchmarks
+
+
+def draw_benchmark(game_table: GameTable, scaling: int, horizontal_mode: bool) -> Benchmark:
+    renderer = HeadlessRenderer(*game_table.get_canvas_size(scaling, horizontal_mode))
+    canvas = renderer.surface.getCanvas()
+
+    def _draw():
+        # Flushed but not read back, so only the drawing itself is timed
+        # draw leaves the horizontal mode transform on the canvas, so it is undone after every repeat
+        canvas.clear(skia.ColorWHITE)
+        canvas.save()
+        try:
+            game_table.draw(scaling, horizontal_mode)
+        finally:
+            canvas.restore()
+        renderer.surface.flushAndSubmit()
+
+    name = f"GameTable.draw scaling={scaling}{' horizontal' if horizontal_mode else ''}"
+    return Benchmark(name, _draw, setup=renderer.activate, repeats=100)
+
+
+def shoot_benchmark() -> Benchmark:
+    # End to end: decide, simulate and compile a break on a freshly racked table
+    session: Optional[GameSession] = None
+
+    def _setup():
+        nonlocal session
+        session = GameSession([(racked_table_state(), DevShotDeciders.break_shot_decider)])
+
+    return Benchmark("GameSession.shoot break", lambda: session.shoot(), setup=_setup)
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(RESULTS_DIR),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def latest_result_path() -> Optional[str]:
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    paths = [os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR) if name.endswith(".json")]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}), threshold {threshold:.0%}")
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            print(f"{name:55} new")
+            continue
+        ratio = result["median"] / baseline["results"][name]["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "faster"
+        print(f"{name:55} {ratio:6.2f}x {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the renderer's hot paths headlessly.")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", help="result file to compare with, defaults to the latest stored result")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown flagged as a regression")
+    parser.add_argument("--no-save", action="store_true", help="do not store the results of this run")
+    args = parser.parse_args()
+
+    baseline_path = args.baseline or latest_result_path()
+    results = dict()
+    for benchmark in build_benchmarks():
+        if args.filter in benchmark.name:
+            results[benchmark.name] = benchmark.measure()
+            print(f"{benchmark.name:55} {results[benchmark.name]['median'] * 1000:10.3f} ms median")
+
+    run = {"commit": current_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "python": platform.python_version(), "machine": platform.platform(), "results": results}
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{run['commit']}.json")
+        with open(path, "w") as file:
+            json.dump(run, file, indent=2)
+        print(f"\nResults stored in {path}")
+
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
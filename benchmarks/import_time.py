@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+REPEATS = 5
+
+# Each import runs in a fresh interpreter, like a respawned pool worker
+IMPORTS = (
+    ("fastfiz_renderer", "import fastfiz_renderer"),
+    ("ShotTimeline + TableGeometry", "from fastfiz_renderer import ShotTimeline, TableGeometry"),
+    ("GameRunner", "from fastfiz_renderer import GameRunner"),
+    ("ShotRecording", "from fastfiz_renderer import ShotRecording"),
+    ("GameHandler (renderer)", "from fastfiz_renderer import GameHandler"),
+    ("p5 alone", "import p5"),
+)
+
+_PROBE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start, "p5" in sys.modules)
+"""
+
+
+def time_import(statement: str):
+    samples = []
+    loads_p5 = False
+    for _ in range(REPEATS):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(statement=statement)], capture_output=True,
+                                text=True, check=True).stdout.split()
+        samples.append(float(output[-2]))
+        loads_p5 = output[-1] == "True"
+    return min(samples), loads_p5
+
+
+def main():
+    for name, statement in IMPORTS:
+        try:
+            seconds, loads_p5 = time_import(statement)
+        except subprocess.CalledProcessError as error:
+            print(f"{name:30} failed: {error.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{name:30} {seconds * 1000:10.1f} ms {'(loads p5)' if loads_p5 else ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import math
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .FastFizCompat import ff
+from .TableGeometry import TableGeometry
+
+_OFF_TABLE_STATES = (ff.Ball.NOTINPLAY, ff.Ball.POCKETED_SW, ff.Ball.POCKETED_W, ff.Ball.POCKETED_NW,
+                     ff.Ball.POCKETED_NE, ff.Ball.POCKETED_E, ff.Ball.POCKETED_SE)
+
+Line = Tuple[Tuple[float, float], Tuple[float, float]]
+
+
+class AimPrediction(NamedTuple):
+    # cue_path ends where the cue ball touches the first ball (the ghost ball) or the first rail
+    phi: float
+    cue_path: Line
+    first_contact: Optional[int] = None
+    object_path: Optional[Line] = None
+    cue_deflection: Optional[Line] = None
+
+
+class AimPredictor:
+    # Ghost ball geometry instead of physics: the cue ball travels straight along phi, the first ball it touches
+    # leaves along the line between the centers and the cue ball along the tangent, each until its first rail. Spin,
+    # throw and friction are ignored, which is what makes it cheap enough to run on every mouse event; the real
+    # outcome comes from executeShot.
+    def __init__(self, geometry: TableGeometry, ball_radius: float):
+        self.ball_radius = ball_radius
+        self._low = np.array((ball_radius, ball_radius))
+        self._high = np.array((geometry.board_width - ball_radius, geometry.board_length - ball_radius))
+
+    def predict(self, positions: np.ndarray, states: np.ndarray, phi: float,
+                cue_ball: int = ff.Ball.CUE) -> AimPrediction:
+        # positions and states as in a FrameFeed frame, shaped (16, 2) and (16,); phi in degrees like ShotParams
+        cue = positions[cue_ball]
+        direction = np.array((math.cos(math.radians(phi)), math.sin(math.radians(phi))))
+
+        # Distance along the aim at which the cue ball would touch each ball, infinite for balls it misses
+        relative = positions - cue
+        along = relative @ direction
+        offset_sq = (relative * relative).sum(axis=1) - along * along
+        reach_sq = (2 * self.ball_radius) ** 2
+        hit = (along > 0) & (offset_sq < reach_sq) & ~np.isin(states, _OFF_TABLE_STATES)
+        hit[cue_ball] = False
+        distances = np.where(hit, along - np.sqrt(np.maximum(reach_sq - offset_sq, 0)), np.inf)
+
+        first_contact = int(np.argmin(distances))
+        rail_distance = self._get_rail_distance(cue, direction)
+        if distances[first_contact] >= rail_distance:
+            return AimPrediction(phi, self._get_line(cue, direction, rail_distance))
+
+        contact = cue + direction * max(distances[first_contact], 0)
+        normal = (positions[first_contact] - contact) / (2 * self.ball_radius)
+        object_path = self._get_line(positions[first_contact], normal,
+                                     self._get_rail_distance(positions[first_contact], normal))
+
+        # A full hit leaves the cue ball where it is
+        tangent = direction - (direction @ normal) * normal
+        tangent_length = math.hypot(*tangent.tolist())
+        cue_deflection = None
+        if tangent_length > 1e-6:
+            tangent /= tangent_length
+            cue_deflection = self._get_line(contact, tangent, self._get_rail_distance(contact, tangent))
+
+        return AimPrediction(phi, self._get_line(cue, direction, distances[first_contact]), first_contact,
+                             object_path, cue_deflection)
+
+    @staticmethod
+    def get_phi(cue_position: Tuple[float, float], target: Tuple[float, float]) -> float:
+        return math.degrees(math.atan2(target[1] - cue_position[1], target[0] - cue_position[0])) % 360
+
+    def _get_rail_distance(self, start: np.ndarray, direction: np.ndarray) -> float:
+        # How far a ball can roll from start before touching a rail
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distances = np.where(direction > 0, (self._high - start) / direction,
+                                 np.where(direction < 0, (self._low - start) / direction, np.inf))
+        return max(float(distances.min()), 0.0)
+
+    @staticmethod
+    def _get_line(start: np.ndarray, direction: np.ndarray, length: float) -> Line:
+        end = start + direction * length
+        return (float(start[0]), float(start[1])), (float(end[0]), float(end[1]))
@@ -0,0 +1,168 @@
+import bisect
+import multiprocessing
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import fastfiz as ff
+
+from .DevUtils import DevShotDeciders
+from .GameHandler import GameHandler
+from .HeadlessRenderer import EncoderPipeSink, FrameSink, PngSequenceSink
+from .StateCodec import StateCodec
+
+_worker_handler: Optional[GameHandler] = None
+
+
+class BatchExporter:
+    RecordedGame = Tuple[ff.TableState, list[ff.ShotParams]]
+
+    def __init__(self, processes: Optional[int] = None, frames_per_second: int = 60, scaling: int = 200,
+                 horizontal_mode: bool = False, stroke_mode: bool = False, chunk_frames: int = 1800,
+                 output_format: str = "mp4"):
+        if output_format not in ("mp4", "png"):
+            raise Exception("Output format must be 'mp4' or 'png'!")
+
+        self.processes = processes or os.cpu_count()
+        self.frames_per_second = frames_per_second
+        self.chunk_frames = chunk_frames
+        self.output_format = output_format
+        self.worker_stats: dict[int, Tuple[int, float]] = dict()
+        self._handler_settings = (frames_per_second, scaling, horizontal_mode, stroke_mode)
+
+    def export_games(self, games: list[GameHandler.Game], output_dir: str, shot_speed_factor: float = 1) -> list[str]:
+        # Deciders are run once to record their shots, so they must be picklable (module level functions)
+        jobs = [(StateCodec.encode_table_state(table_state), StateCodec.encode_table(table_state.getTable()), decider,
+                 None) for table_state, decider in games]
+        return self._export(jobs, output_dir, shot_speed_factor)
+
+    def export_recorded_games(self, games: list[RecordedGame], output_dir: str,
+                              shot_speed_factor: float = 1) -> list[str]:
+        jobs = [(StateCodec.encode_table_state(table_state), StateCodec.encode_table(table_state.getTable()), None,
+                 [StateCodec.encode_shot_params(params) for params in shot_params_list])
+                for table_state, shot_params_list in games]
+        return self._export(jobs, output_dir, shot_speed_factor)
+
+    def _export(self, jobs: list, output_dir: str, shot_speed_factor: float) -> list[str]:
+        if not jobs:
+            raise Exception("No games provided!")
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.worker_stats = dict()
+        context = multiprocessing.get_context("spawn")
+
+        with ProcessPoolExecutor(self.processes, mp_context=context, initializer=_init_worker,
+                                 initargs=self._handler_settings) as pool:
+            # Pass 1: settle every game's shots and frame count, so long games can be split into frame ranges
+            recordings = list(pool.map(_record_game, [(*job, shot_speed_factor) for job in jobs]))
+
+            render_jobs = []
+            for game_index, (encoded_params, frame_count, shot_frames, shot_states) in enumerate(recordings):
+                for chunk_index, first_frame in enumerate(range(0, frame_count, self.chunk_frames)):
+                    # Each chunk starts from the table before the last shot asked for at or before its first frame,
+                    # so only the frames since that shot are simulated again
+                    shot_index = max(bisect.bisect_right(shot_frames, first_frame) - 1, 0)
+                    seed_frame = shot_frames[shot_index] if shot_frames else 0
+                    seed_state = shot_states[shot_index] if shot_states else jobs[game_index][0]
+                    frame_range = (first_frame, min(first_frame + self.chunk_frames, frame_count))
+                    render_jobs.append((game_index, chunk_index, seed_state, jobs[game_index][1],
+                                        encoded_params[shot_index:],
+                                        seed_frame, frame_range, self._get_chunk_path(output_dir, game_index,
+                                                                                      chunk_index),
+                                        shot_speed_factor, self.frames_per_second, self.output_format))
+
+            # Pass 2: render every chunk of every game across the pool, then merge chunks back in order
+            chunk_paths: dict[int, list[Tuple[int, str]]] = dict()
+            for game_index, chunk_index, path, pid, frames, seconds in pool.map(_render_chunk, render_jobs):
+                chunk_paths.setdefault(game_index, []).append((chunk_index, path))
+                worker_frames, worker_seconds = self.worker_stats.get(pid, (0, 0))
+                self.worker_stats[pid] = (worker_frames + frames, worker_seconds + seconds)
+
+        for pid, (frames, seconds) in sorted(self.worker_stats.items()):
+            print(f"Worker {pid}: {frames} frames in {seconds:.1f}s ({frames / max(seconds, 1e-9):.1f} frames/s)")
+
+        return [self._merge_chunks(output_dir, game_index, sorted(chunk_paths.get(game_index, [])))
+                for game_index in range(len(jobs))]
+
+    def _get_chunk_path(self, output_dir: str, game_index: int, chunk_index: int) -> str:
+        if self.output_format == "png":
+            return os.path.join(output_dir, f"game_{game_index:04d}")
+        return os.path.join(output_dir, f"game_{game_index:04d}_part_{chunk_index:03d}.mp4")
+
+    def _merge_chunks(self, output_dir: str, game_index: int, chunks: list[Tuple[int, str]]) -> str:
+        if self.output_format == "png":
+            # Chunks already wrote their frames into the game's directory under global frame numbers
+            return self._get_chunk_path(output_dir, game_index, 0)
+
+        output_path = os.path.join(output_dir, f"game_{game_index:04d}.mp4")
+        list_path = os.path.join(output_dir, f"game_{game_index:04d}_parts.txt")
+        with open(list_path, "w") as f:
+            for _, path in chunks:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+                        "-c", "copy", output_path], check=True)
+
+        os.remove(list_path)
+        for _, path in chunks:
+            os.remove(path)
+        return output_path
+
+
+def _init_worker(frames_per_second: int, scaling: int, horizontal_mode: bool, stroke_mode: bool):
+    global _worker_handler
+    _worker_handler = GameHandler(frames_per_second=frames_per_second, scaling=scaling,
+                                  horizontal_mode=horizontal_mode, stroke_mode=stroke_mode)
+
+
+def _record_game(job) -> Tuple[list[StateCodec.EncodedShotParams], int, list[int],
+                               list[list[StateCodec.EncodedBall]]]:
+    # Besides the shots, records the frame each shot was asked for in and the table before it; a session started
+    # from that table asks for the shot in its first frame and then renders the same frames as the whole game
+    encoded_state, encoded_table, decider, encoded_params, shot_speed_factor = job
+    if decider is None:
+        decider = DevShotDeciders.get_from_shot_params_list(
+            [StateCodec.decode_shot_params(params) for params in encoded_params])
+
+    recorded_params: list[StateCodec.EncodedShotParams] = []
+    shot_frames: list[int] = []
+    shot_states: list[list[StateCodec.EncodedBall]] = []
+    current_frame = 0
+
+    def recording_decider(table_state: ff.TableState) -> Optional[ff.ShotParams]:
+        encoded_table_state = StateCodec.encode_table_state(table_state)
+        params = decider(table_state)
+        if params is not None:
+            recorded_params.append(StateCodec.encode_shot_params(params))
+            shot_frames.append(current_frame)
+            shot_states.append(encoded_table_state)
+        return params
+
+    def on_frame(frame_number: int):
+        nonlocal current_frame
+        current_frame = frame_number
+
+    game = (StateCodec.decode_table_state(encoded_state, encoded_table), recording_decider)
+    frame_count = _worker_handler.export_games([game], None, shot_speed_factor, on_frame=on_frame)
+    return recorded_params, frame_count, shot_frames, shot_states
+
+
+def _render_chunk(job):
+    (game_index, chunk_index, encoded_state, encoded_table, encoded_params, seed_frame, frame_range, path,
+     shot_speed_factor, frames_per_second, output_format) = job
+    start = time.perf_counter()
+
+    decider = DevShotDeciders.get_from_shot_params_list(
+        [StateCodec.decode_shot_params(params) for params in encoded_params])
+    game = (StateCodec.decode_table_state(encoded_state, encoded_table), decider)
+
+    if output_format == "png":
+        frame_sink: FrameSink = PngSequenceSink(path, first_frame_number=frame_range[0])
+    else:
+        frame_sink = EncoderPipeSink(path, frames_per_second)
+
+    _worker_handler.export_games([game], frame_sink, shot_speed_factor,
+                                 (frame_range[0] - seed_frame, frame_range[1] - seed_frame))
+    return game_index, chunk_index, path, os.getpid(), frame_sink.frame_count, time.perf_counter() - start
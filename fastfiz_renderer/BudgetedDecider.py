@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from .FastFizCompat import ff
+from .StateCodec import StateCodec
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+class ShotSkipped(Exception):
+    # Raised by a decider to pass the turn without ending the game; it is asked again for the next shot
+    pass
+
+
+class GameAborted(Exception):
+    # Raised by a decider to end the game, with the message as the end reason
+    pass
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    # Coroutine deciders of every game share one event loop on a daemon thread
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+async def _last_yielded(generator, best: list):
+    async for params in generator:
+        best[:] = [params]
+    return best[0] if best else None
+
+
+def resolve_decision(decision: Any, timeout: Optional[float] = None) -> Optional[ff.ShotParams]:
+    # Waits for what a decider returned: shot params as they are, a future, a coroutine or awaitable, or an async
+    # generator yielding better and better shots, of which the last one yielded in time is taken. Raises
+    # TimeoutError once the timeout passes without a shot.
+    best: list[ff.ShotParams] = []
+    if inspect.isasyncgen(decision):
+        decision = _last_yielded(decision, best)
+
+    if isinstance(decision, concurrent.futures.Future):
+        future = decision
+    elif inspect.isawaitable(decision):
+        future = asyncio.run_coroutine_threadsafe(_await(decision), _get_loop())
+    else:
+        return decision
+
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        if best:
+            return best[0]
+        raise TimeoutError(f"No shot within {timeout}s")
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+class BudgetedDecider:
+    # Gives a decider a fixed time per shot and decides what happens when it runs out: "skip" passes the turn,
+    # "default" plays the default shot and "abort" ends the game. Sync deciders are run on a thread of their own per
+    # decision so they can be abandoned; they keep running in the background until they return, without holding up
+    # the decisions after them.
+    SKIP = "skip"
+    DEFAULT = "default"
+    ABORT = "abort"
+    OUT_OF_TIME = "Decider ran out of time"
+
+    def __init__(self, shot_decider: Callable[[ff.TableState], Any], budget: Optional[float] = None,
+                 fallback: str = SKIP, default_shot: Optional[ff.ShotParams] = None):
+        if fallback not in (BudgetedDecider.SKIP, BudgetedDecider.DEFAULT, BudgetedDecider.ABORT):
+            raise Exception("Fallback must be 'skip', 'default' or 'abort'!")
+        if fallback == BudgetedDecider.DEFAULT and default_shot is None:
+            raise Exception("The 'default' fallback needs a default shot!")
+
+        self.shot_decider = shot_decider
+        self.budget = budget
+        self.fallback = fallback
+        self.default_shot = default_shot
+        # Seconds every decision took and whether it ran out of time, one entry per shot asked for
+        self.latencies: list[Tuple[float, bool]] = []
+
+    @property
+    def timeouts(self) -> int:
+        return sum(1 for _, timed_out in self.latencies if timed_out)
+
+    def __call__(self, table_state: ff.TableState) -> Optional[ff.ShotParams]:
+        start = time.perf_counter()
+        try:
+            params = resolve_decision(self._start_decision(table_state), self._get_remaining(start))
+            params = resolve_decision(params, self._get_remaining(start))
+        except TimeoutError:
+            self.latencies.append((time.perf_counter() - start, True))
+            return self._fall_back()
+        self.latencies.append((time.perf_counter() - start, False))
+        return params
+
+    def _start_decision(self, table_state: ff.TableState) -> Any:
+        if self.budget is None:
+            return self.shot_decider(table_state)
+
+        # Abandoned decisions may still be looking at the table after the shot was played, so they get a copy
+        table_state = StateCodec.copy_table_state(table_state)
+        if inspect.iscoroutinefunction(self.shot_decider) or inspect.isasyncgenfunction(self.shot_decider):
+            return self.shot_decider(table_state)
+
+        # A sync decider may itself return a future or coroutine, which is then waited for on the same budget
+        future = concurrent.futures.Future()
+
+        def _decide():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.shot_decider(table_state))
+            except BaseException as error:
+                future.set_exception(error)
+
+        threading.Thread(target=_decide, name="decider", daemon=True).start()
+        return future
+
+    def _get_remaining(self, start: float) -> Optional[float]:
+        if self.budget is None:
+            return None
+        return max(0.0, self.budget - (time.perf_counter() - start))
+
+    def _fall_back(self) -> Optional[ff.ShotParams]:
+        if self.fallback == BudgetedDecider.DEFAULT:
+            return self.default_shot
+        if self.fallback == BudgetedDecider.ABORT:
+            raise GameAborted(BudgetedDecider.OUT_OF_TIME)
+        raise ShotSkipped()
@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import fastfiz as ff
+
+from .GameRunner import ShotRecord
+from .ShotTimeline import ShotTimeline
+from .StateCodec import StateCodec
+
+
+class CandidateResult:
+    def __init__(self, index: int, params: StateCodec.EncodedShotParams, possible: bool,
+                 record: Optional[ShotRecord] = None, cue_end_position: Optional[Tuple[float, float]] = None):
+        self.index = index
+        self.params = params
+        self.possible = possible
+        self.record = record
+        self.cue_end_position = cue_end_position
+        # Sampled ball paths, only filled in for the results that are shown as ghosts
+        self.trajectories: dict[int, list[Tuple[float, float]]] = dict()
+
+    @property
+    def pocketed(self) -> list[Tuple[int, int]]:
+        return self.record.pocketed if self.record else []
+
+    @property
+    def fouls(self) -> list[str]:
+        return self.record.fouls if self.record else []
+
+    @property
+    def pocketed_object_balls(self) -> list[int]:
+        return [ball for ball, _ in self.pocketed if ball != ff.Ball.CUE]
+
+    def __str__(self):
+        if not self.possible:
+            return f"Candidate {self.index}: not possible"
+        return (f"Candidate {self.index}: pocketed {self.pocketed_object_balls}, fouls {self.fouls}, "
+                f"cue ball ends at ({self.cue_end_position[0]:.3f}, {self.cue_end_position[1]:.3f})")
+
+
+class CandidateEvaluator:
+    RankKey = Callable[[CandidateResult], tuple]
+
+    def __init__(self, processes: Optional[int] = None, chunk_size: int = 64,
+                 rank_key: Optional[RankKey] = None, samples_per_second: int = 30):
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.rank_key = rank_key or CandidateEvaluator.default_rank_key
+        self.samples_per_second = samples_per_second
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @staticmethod
+    def default_rank_key(result: CandidateResult) -> tuple:
+        # Higher is better: possible shots first, then foul-free ones, then the most object balls pocketed
+        return result.possible, not result.fouls, len(result.pocketed_object_balls)
+
+    def evaluate(self, table_state: ff.TableState, candidates: list[ff.ShotParams],
+                 top_k: int = 0) -> list[CandidateResult]:
+        return self._evaluate_encoded(StateCodec.encode_table_state(table_state),
+                                      StateCodec.encode_table(table_state.getTable()),
+                                      [StateCodec.encode_shot_params(params) for params in candidates], top_k)
+
+    def evaluate_async(self, table_state: ff.TableState, candidates: list[ff.ShotParams],
+                       top_k: int = 0) -> Future:
+        # The table state and candidates are snapshotted here, so the caller can keep playing while the pool works
+        encoded_state = StateCodec.encode_table_state(table_state)
+        encoded_table = StateCodec.encode_table(table_state.getTable())
+        encoded_candidates = [StateCodec.encode_shot_params(params) for params in candidates]
+        future = Future()
+
+        def _run():
+            try:
+                future.set_result(self._evaluate_encoded(encoded_state, encoded_table, encoded_candidates, top_k))
+            except Exception as error:
+                future.set_exception(error)
+
+        threading.Thread(target=_run, daemon=True).start()
+        return future
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Kept alive between turns, so workers are only spawned once
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _evaluate_encoded(self, encoded_state: list[StateCodec.EncodedBall], encoded_table: StateCodec.EncodedTable,
+                          encoded_candidates: list[StateCodec.EncodedShotParams], top_k: int) -> list[CandidateResult]:
+        if not encoded_candidates:
+            return []
+
+        pool = self._get_pool()
+        jobs = [(encoded_state, encoded_table, start, encoded_candidates[start:start + self.chunk_size])
+                for start in range(0, len(encoded_candidates), self.chunk_size)]
+        results = [result for chunk in pool.map(_evaluate_chunk, jobs) for result in chunk]
+        results.sort(key=self.rank_key, reverse=True)
+
+        shown = [result for result in results[:top_k] if result.possible]
+        traces = pool.map(_trace_candidate, [(encoded_state, encoded_table, result.params, self.samples_per_second)
+                                             for result in shown])
+        for result, trajectories in zip(shown, traces):
+            result.trajectories = trajectories
+
+        return results
+
+
+def _evaluate_chunk(job) -> list[CandidateResult]:
+    encoded_state, encoded_table, start, encoded_candidates = job
+    results = []
+
+    for index, encoded_params in enumerate(encoded_candidates, start):
+        table_state = StateCodec.decode_table_state(encoded_state, encoded_table)
+        params = StateCodec.decode_shot_params(encoded_params)
+
+        if table_state.isPhysicallyPossible(params) != ff.TableState.OK_PRECONDITION:
+            results.append(CandidateResult(index, encoded_params, False))
+            continue
+
+        shot = table_state.executeShot(params)
+        cue_pos = table_state.getBall(ff.Ball.CUE).getPos()
+        results.append(CandidateResult(index, encoded_params, True, ShotRecord.from_shot(params, shot),
+                                       (cue_pos.x, cue_pos.y)))
+
+    return results
+
+
+def _trace_candidate(job) -> dict[int, list[Tuple[float, float]]]:
+    encoded_state, encoded_table, encoded_params, samples_per_second = job
+    table_state = StateCodec.decode_table_state(encoded_state, encoded_table)
+    table: ff.Table = table_state.getTable()
+    shot = table_state.executeShot(StateCodec.decode_shot_params(encoded_params))
+    timeline = ShotTimeline.from_shot(shot, table.MU_SLIDING, table.MU_ROLLING, table.g)
+
+    sample_count = int(timeline.duration * samples_per_second) + 1
+    trajectories = dict()
+    for number, ball_timeline in timeline.ball_timelines.items():
+        points = [position[:2] for position in
+                  (ball_timeline.position_at(i / samples_per_second) for i in range(sample_count))
+                  if position is not None]
+        points.append(tuple(ball_timeline.end_position))
+        if len(set(points)) > 1:
+            trajectories[number] = points
+
+    return trajectories
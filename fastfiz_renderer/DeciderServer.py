@@ -0,0 +1,280 @@
+import asyncio
+import concurrent.futures
+import struct
+import threading
+from typing import Optional, Tuple, Union
+
+import fastfiz as ff
+
+from .GameFlow import GameFlow
+from .StateCodec import StateCodec
+
+# Every message is a header followed by its payload, all little-endian:
+#   header    magic "FFZD", version u8, kind u8, request id u32, payload length u32
+#   HELLO     agent -> server, the agent's name in UTF-8, sent once after connecting
+#   DECIDE    server -> agent, the table's width, length, side and corner pocket width, rolling and sliding
+#             friction and gravity as f64, then 16 balls of number u8, state u8, x f64, y f64
+#   SHOT      agent -> server, a, b, theta, phi, v as f64, answering the DECIDE with the same request id
+#   NO_SHOT   agent -> server, empty, the agent has no more shots
+_MAGIC = b"FFZD"
+_VERSION = 2
+_HELLO, _DECIDE, _SHOT, _NO_SHOT = range(4)
+
+_header = struct.Struct("<4sBBII")
+_table = struct.Struct("<7d")
+_ball = struct.Struct("<BBdd")
+_shot_params = struct.Struct("<5d")
+
+Address = Union[Tuple[str, int], str]
+
+
+def _pack(kind: int, request_id: int, payload: bytes = b"") -> bytes:
+    return _header.pack(_MAGIC, _VERSION, kind, request_id, len(payload)) + payload
+
+
+async def _read_message(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    magic, version, kind, request_id, payload_length = _header.unpack(await reader.readexactly(_header.size))
+    if magic != _MAGIC or version != _VERSION:
+        raise ConnectionError(f"Unexpected message header {magic!r} version {version}")
+    return kind, request_id, await reader.readexactly(payload_length)
+
+
+def encode_table_state(table_state: ff.TableState) -> bytes:
+    # Every request carries its table, so agents simulate on the geometry the game is played on
+    return _table.pack(*StateCodec.encode_table(table_state.getTable())) + b"".join(
+        _ball.pack(number, state, x, y) for number, state, x, y in StateCodec.encode_table_state(table_state))
+
+
+def decode_table_state(payload: bytes) -> ff.TableState:
+    return StateCodec.decode_table_state(list(_ball.iter_unpack(payload[_table.size:])),
+                                         _table.unpack_from(payload))
+
+
+async def _open_connection(address: Address) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+class _AgentConnection:
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer = writer
+        self.pending: dict[int, asyncio.Future] = dict()
+
+    def fail_pending(self, error: Exception):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending.clear()
+
+
+class DeciderServer:
+    # Serves shot deciders that run in other processes. Agents connect over TCP or a Unix socket, say their name
+    # once and then answer table states with shot params over the same connection until they disconnect. The event
+    # loop runs on its own thread, so the deciders handed out can be called from any thread.
+    def __init__(self, address: Address = ("127.0.0.1", 0), timeout: float = 5):
+        self.address = address
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._agents: dict[str, _AgentConnection] = dict()
+        self._agent_connected: dict[str, asyncio.Event] = dict()
+        self._next_request_id = 0
+        self._requests: set[asyncio.Task] = set()
+
+    @property
+    def agent_names(self) -> list[str]:
+        return list(self._agents)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        started = threading.Event()
+        errors: list[BaseException] = []
+
+        def _run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._server = self._loop.run_until_complete(self._start_server())
+            except BaseException as error:
+                errors.append(error)
+                started.set()
+                self._loop.close()
+                return
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._shut_down())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=_run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread = None
+            raise errors[0]
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get_decider(self, name: str, timeout: Optional[float] = None) -> GameFlow.ShotDecider:
+        # The decider waits for the agent to connect if it has not yet; an agent that does not answer in time, or
+        # drops the connection, ends the game as if it had no more shots
+        timeout = self.timeout if timeout is None else timeout
+
+        def decider(table_state: ff.TableState) -> Optional[ff.ShotParams]:
+            if self._thread is None:
+                raise Exception("Decider server is not running!")
+            future = asyncio.run_coroutine_threadsafe(self._decide(name, encode_table_state(table_state), timeout),
+                                                      self._loop)
+            try:
+                encoded = future.result()
+            except asyncio.TimeoutError:
+                print(f"Agent {name!r}: No answer within {timeout}s")
+                return None
+            except ConnectionError as error:
+                print(f"Agent {name!r}: {error}")
+                return None
+            except concurrent.futures.CancelledError:
+                print(f"Agent {name!r}: Decider server closed")
+                return None
+            return None if encoded is None else StateCodec.decode_shot_params(encoded)
+
+        return decider
+
+    async def _start_server(self) -> asyncio.AbstractServer:
+        if isinstance(self.address, str):
+            return await asyncio.start_unix_server(self._handle_agent, self.address)
+        server = await asyncio.start_server(self._handle_agent, *self.address)
+        # Port 0 picks a free port; publish the one actually bound
+        self.address = server.sockets[0].getsockname()[:2]
+        return server
+
+    async def _shut_down(self):
+        # Outstanding requests are cancelled, which releases the threads waiting in their deciders, and agent
+        # connections end as if the agents had hung up
+        self._server.close()
+        for task in self._requests:
+            task.cancel()
+        for agent in list(self._agents.values()):
+            agent.writer.close()
+        await asyncio.gather(*[task for task in asyncio.all_tasks() if task is not asyncio.current_task()],
+                             return_exceptions=True)
+        await self._server.wait_closed()
+
+    def _get_connected_event(self, name: str) -> asyncio.Event:
+        if name not in self._agent_connected:
+            self._agent_connected[name] = asyncio.Event()
+        return self._agent_connected[name]
+
+    async def _decide(self, name: str, payload: bytes,
+                      timeout: float) -> Optional[StateCodec.EncodedShotParams]:
+        task = asyncio.current_task()
+        self._requests.add(task)
+        try:
+            return await asyncio.wait_for(self._request(name, payload), timeout)
+        finally:
+            self._requests.discard(task)
+
+    async def _request(self, name: str, payload: bytes) -> Optional[StateCodec.EncodedShotParams]:
+        await self._get_connected_event(name).wait()
+        agent = self._agents[name]
+
+        self._next_request_id = (self._next_request_id + 1) % 2 ** 32
+        request_id = self._next_request_id
+        reply = asyncio.get_running_loop().create_future()
+        agent.pending[request_id] = reply
+        try:
+            agent.writer.write(_pack(_DECIDE, request_id, payload))
+            await agent.writer.drain()
+            return await reply
+        finally:
+            # Late answers to timed out requests are dropped
+            agent.pending.pop(request_id, None)
+
+    async def _handle_agent(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        agent: Optional[_AgentConnection] = None
+        try:
+            kind, _, payload = await _read_message(reader)
+            if kind != _HELLO:
+                raise ConnectionError("Agents must introduce themselves first")
+            name = payload.decode("utf-8")
+            if name in self._agents:
+                raise ConnectionError(f"Agent {name!r} is already connected")
+
+            agent = _AgentConnection(name, writer)
+            self._agents[name] = agent
+            self._get_connected_event(name).set()
+
+            while True:
+                kind, request_id, payload = await _read_message(reader)
+                reply = agent.pending.get(request_id)
+                if reply is None or reply.done():
+                    continue
+                if kind == _SHOT:
+                    reply.set_result(_shot_params.unpack(payload))
+                elif kind == _NO_SHOT:
+                    reply.set_result(None)
+                else:
+                    reply.set_exception(ConnectionError(f"Unexpected message kind {kind}"))
+        except (asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError) as error:
+            if agent is not None:
+                agent.fail_pending(ConnectionError(f"Connection lost ({error})"))
+        finally:
+            if agent is not None and self._agents.get(agent.name) is agent:
+                del self._agents[agent.name]
+                self._get_connected_event(agent.name).clear()
+            writer.close()
+
+
+class DeciderAgent:
+    # The agent side of the protocol for a Python shot decider, as a stub for testing servers and as a reference for
+    # agents written in other languages
+    def __init__(self, name: str, shot_decider: GameFlow.ShotDecider):
+        self.name = name
+        self.shot_decider = shot_decider
+        self.requests = 0
+
+    async def serve(self, address: Address):
+        reader, writer = await _open_connection(address)
+        try:
+            writer.write(_pack(_HELLO, 0, self.name.encode("utf-8")))
+            await writer.drain()
+            while True:
+                try:
+                    kind, request_id, payload = await _read_message(reader)
+                except asyncio.IncompleteReadError:
+                    return
+                if kind != _DECIDE:
+                    continue
+                self.requests += 1
+
+                params = self.shot_decider(decode_table_state(payload))
+                if params is None:
+                    writer.write(_pack(_NO_SHOT, request_id))
+                else:
+                    writer.write(_pack(_SHOT, request_id,
+                                       _shot_params.pack(*StateCodec.encode_shot_params(params))))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def run(self, address: Address):
+        asyncio.run(self.serve(address))
+
+    def run_in_thread(self, address: Address) -> threading.Thread:
+        thread = threading.Thread(target=self.run, args=(address,), daemon=True)
+        thread.start()
+        return thread
@@ -54,6 +54,16 @@ class DevShotDeciders:
         shot_params.theta = 11
         return shot_params
 
+    @staticmethod
+    def break_shot_decider(_: ff.TableState) -> ff.ShotParams:
+        shot_params = ff.ShotParams()
+        shot_params.v = 4
+        shot_params.a = 0
+        shot_params.b = 0
+        shot_params.phi = 270
+        shot_params.theta = 11
+        return shot_params
+
     @staticmethod
     def hole_shot_decider(_: ff.TableState) -> ff.ShotParams:
         shot_params = ff.ShotParams()
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .FastFizCompat import EVENT_CODES, ff
+
+# Written next to a recording while it is recorded: a header, one row per event in recording order and, once the
+# writer is closed, a permutation of the rows sorted by event type and first ball plus where every (type, ball) key
+# starts in it. Without the sorted part (an interrupted writer) queries scan every row instead.
+_MAGIC = b"FFZEVTS\x01"
+_VERSION = 1
+_KEY_BALLS = ff.Ball.FIFTEEN + 2  # The balls plus one key for anything else, like rails or no ball
+_KEY_COUNT = len(EVENT_CODES) * _KEY_BALLS
+
+_header_dtype = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("event_codes", "<i4", (len(EVENT_CODES),)), ("sorted", "<u4"),
+    ("event_count", "<u8"),
+])
+
+# shot is the shot's index in the recording, shot_number its number within its game and event the event's position
+# within its shot. state is the first ball's state after the event, which for pocketings tells the pocket.
+event_dtype = np.dtype([
+    ("time", "<f8"), ("game", "<u4"), ("shot", "<u4"), ("shot_number", "<u4"), ("event", "<u4"),
+    ("event_type", "i1"), ("ball", "i1"), ("other_ball", "i1"), ("state", "i1"),
+])
+
+EventPattern = dict
+
+
+def get_index_path(recording_path: str) -> str:
+    return recording_path + ".events"
+
+
+def _get_keys(event_types: np.ndarray, balls: np.ndarray) -> np.ndarray:
+    key_balls = np.where((balls >= ff.Ball.CUE) & (balls <= ff.Ball.FIFTEEN), balls, _KEY_BALLS - 1)
+    return event_types.astype(np.int64) * _KEY_BALLS + key_balls
+
+
+class EventIndexWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(self._make_header(0, False).tobytes())
+        self._event_count = 0
+
+    def write_shot(self, game_number: int, shot_index: int, shot_number: int, shot: ff.Shot):
+        rows = []
+        for event_number, event in enumerate(shot.getEventList()):
+            event: ff.Event
+            ball = event.getBall1()
+            state = event.getBall1Data().getState() if ff.Ball.CUE <= ball <= ff.Ball.FIFTEEN else -1
+            rows.append((event.getTime(), game_number, shot_index, shot_number, event_number, event.getType(),
+                         _clip_id(ball), _clip_id(event.getBall2()), state))
+
+        self._file.write(np.array(rows, dtype=event_dtype).tobytes())
+        self._event_count += len(rows)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+
+        events = np.fromfile(self.path, dtype=event_dtype, offset=_header_dtype.itemsize, count=self._event_count)
+        keys = _get_keys(events["event_type"], events["ball"])
+        order = np.argsort(keys, kind="stable").astype(np.uint32)
+        key_offsets = np.searchsorted(keys[order], np.arange(_KEY_COUNT + 1)).astype(np.uint64)
+
+        with open(self.path, "r+b") as file:
+            file.write(self._make_header(self._event_count, True).tobytes())
+            file.seek(0, 2)
+            file.write(order.tobytes())
+            file.write(key_offsets.tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @staticmethod
+    def _make_header(event_count: int, is_sorted: bool) -> np.ndarray:
+        header = np.zeros((), dtype=_header_dtype)
+        header["magic"] = _MAGIC
+        header["version"] = _VERSION
+        header["event_codes"] = EVENT_CODES
+        header["sorted"] = is_sorted
+        header["event_count"] = event_count
+        return header
+
+
+def _clip_id(number: int) -> int:
+    return number if -128 <= number <= 127 else -1
+
+
+class EventIndex:
+    # Answers questions like "every shot where the 8 ball hit a rail and was then pocketed" from the memory-mapped
+    # index, without touching the recording or simulating anything. Matches are rows of event_dtype, which
+    # RecordingPlayer.review_event opens at the moment they happened.
+    def __init__(self, path: str):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        header = self._data[:_header_dtype.itemsize].view(_header_dtype)[0]
+
+        if bytes(header["magic"]) != _MAGIC or header["version"] != _VERSION:
+            raise Exception(f"{path} is not an event index!")
+        if tuple(header["event_codes"]) != EVENT_CODES:
+            raise Exception(f"{path} was written with different fastfiz event codes!")
+
+        events_end = _header_dtype.itemsize
+        if header["sorted"]:
+            event_count = int(header["event_count"])
+            events_end += event_count * event_dtype.itemsize
+            order_end = events_end + event_count * 4
+            self._order: Optional[np.ndarray] = self._data[events_end:order_end].view(np.uint32)
+            self._key_offsets: Optional[np.ndarray] = self._data[
+                order_end:order_end + (_KEY_COUNT + 1) * 8].view(np.uint64)
+        else:
+            event_count = (len(self._data) - events_end) // event_dtype.itemsize
+            events_end += event_count * event_dtype.itemsize
+            self._order = None
+            self._key_offsets = None
+
+        self.events: np.ndarray = self._data[_header_dtype.itemsize:events_end].view(event_dtype)
+
+    @classmethod
+    def for_recording(cls, recording_path: str):
+        return cls(get_index_path(recording_path))
+
+    def __len__(self):
+        return len(self.events)
+
+    def find(self, event_type: Optional[int] = None, ball: Optional[int] = None, other_ball: Optional[int] = None,
+             involving: Optional[int] = None, pocket: Optional[int] = None, shot_number: Optional[int] = None,
+             game: Optional[int] = None, time_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        return self.events[self.find_rows(event_type, ball, other_ball, involving, pocket, shot_number, game,
+                                          time_range)]
+
+    def find_rows(self, event_type: Optional[int] = None, ball: Optional[int] = None,
+                  other_ball: Optional[int] = None, involving: Optional[int] = None, pocket: Optional[int] = None,
+                  shot_number: Optional[int] = None, game: Optional[int] = None,
+                  time_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        # Row numbers of the matching events in recording order. involving matches either ball, since which ball of
+        # a collision comes first is arbitrary; pocket is one of the ff.Ball.POCKETED_* states. Only event type and
+        # first ball are looked up in the sorted index; the other conditions scan the rows those leave.
+        if pocket is not None and event_type is None:
+            event_type = ff.Event.POCKETED
+        rows = self._get_key_rows(event_type, ball)
+
+        conditions = []
+        if rows is None:
+            candidates = self.events
+            if event_type is not None:
+                conditions.append(candidates["event_type"] == event_type)
+            if ball is not None:
+                conditions.append(candidates["ball"] == ball)
+        else:
+            candidates = self.events[rows]
+
+        if other_ball is not None:
+            conditions.append(candidates["other_ball"] == other_ball)
+        if involving is not None:
+            conditions.append((candidates["ball"] == involving) | (candidates["other_ball"] == involving))
+        if pocket is not None:
+            conditions.append(candidates["state"] == pocket)
+        if shot_number is not None:
+            conditions.append(candidates["shot_number"] == shot_number)
+        if game is not None:
+            conditions.append(candidates["game"] == game)
+        if time_range is not None:
+            conditions.append((candidates["time"] >= time_range[0]) & (candidates["time"] <= time_range[1]))
+
+        if rows is None:
+            rows = np.arange(len(self.events))
+        if conditions:
+            rows = rows[np.logical_and.reduce(conditions)]
+        return rows
+
+    def find_sequence(self, *patterns: EventPattern) -> np.ndarray:
+        # Events matching the last pattern that, within the same shot, follow events matching every earlier pattern
+        # in order. Patterns take the keyword arguments of find, e.g.
+        # find_sequence(dict(event_type=ff.Event.RAIL_COLLISION, ball=8), dict(event_type=ff.Event.POCKETED, ball=8))
+        if not patterns:
+            raise Exception("At least one pattern is needed!")
+
+        rows = self.find_rows(**patterns[0])
+        for pattern in patterns[1:]:
+            # For each partial match, the first event after it in the same shot that matches the next pattern. Rows
+            # are in recording order, which orders events by shot and then by when they happened.
+            candidates = self.find_rows(**pattern)
+            positions = np.searchsorted(candidates, rows, side="right")
+
+            found = positions < len(candidates)
+            positions = positions[found]
+            rows = rows[found]
+            follows = self.events["shot"][candidates[positions]] == self.events["shot"][rows]
+            rows = np.unique(candidates[positions[follows]])
+
+        return self.events[rows]
+
+    @staticmethod
+    def get_shots(matches: np.ndarray) -> np.ndarray:
+        # The recording indices of the shots the matches are in, each once
+        return np.unique(matches["shot"])
+
+    def close(self):
+        self.events = None
+        self._order = None
+        self._key_offsets = None
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _get_key_rows(self, event_type: Optional[int], ball: Optional[int]) -> Optional[np.ndarray]:
+        # Rows of one event type, optionally of one ball, straight from the sorted permutation
+        # Ids outside the balls share one key with rails and missing balls, so they are matched by scanning
+        if self._order is None or event_type is None or (ball is not None
+                                                         and not ff.Ball.CUE <= ball <= ff.Ball.FIFTEEN):
+            return None
+        if ball is not None:
+            first = int(_get_keys(np.array([event_type]), np.array([ball]))[0])
+            last = first + 1
+        else:
+            first, last = event_type * _KEY_BALLS, (event_type + 1) * _KEY_BALLS
+        return np.sort(self._order[int(self._key_offsets[first]):int(self._key_offsets[last])]).astype(np.int64)
@@ -0,0 +1,31 @@
+import types
+
+try:
+    import fastfiz as ff
+
+    HAS_FASTFIZ = True
+except ImportError:
+    HAS_FASTFIZ = False
+
+
+    # Just the constants the renderer needs to replay recorded shots without fastfiz; the values mirror its enums
+    # and recordings carry the codes they were written with, so a mismatch is detected when one is opened
+    class _Ball:
+        CUE, ONE, TWO, THREE, FOUR, FIVE, SIX, SEVEN, EIGHT, NINE, TEN, ELEVEN, TWELVE, THIRTEEN, FOURTEEN, \
+            FIFTEEN, UNKNOWN_ID = range(17)
+        NOTINPLAY, STATIONARY, SPINNING, SLIDING, ROLLING, POCKETED_SW, POCKETED_W, POCKETED_NW, POCKETED_NE, \
+            POCKETED_E, POCKETED_SE, SLIDING_SPINNING, ROLLING_SPINNING, UNKNOWN_STATE = range(14)
+
+
+    class _Event:
+        NO_EVENT, STATE_CHANGE, BALL_COLLISION, RAIL_COLLISION, POCKETED, CUE_STRIKE, MISCUE, \
+            UNKNOWN_EVENT = range(8)
+
+
+    ff = types.SimpleNamespace(Ball=_Ball, Event=_Event)
+
+STATE_CODES = (ff.Ball.NOTINPLAY, ff.Ball.STATIONARY, ff.Ball.SPINNING, ff.Ball.SLIDING, ff.Ball.ROLLING,
+               ff.Ball.POCKETED_SW, ff.Ball.POCKETED_W, ff.Ball.POCKETED_NW, ff.Ball.POCKETED_NE, ff.Ball.POCKETED_E,
+               ff.Ball.POCKETED_SE, ff.Ball.SLIDING_SPINNING, ff.Ball.ROLLING_SPINNING, ff.Ball.UNKNOWN_STATE)
+EVENT_CODES = (ff.Event.NO_EVENT, ff.Event.STATE_CHANGE, ff.Event.BALL_COLLISION, ff.Event.RAIL_COLLISION,
+               ff.Event.POCKETED, ff.Event.CUE_STRIKE, ff.Event.MISCUE, ff.Event.UNKNOWN_EVENT)
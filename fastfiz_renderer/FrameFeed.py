@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from multiprocessing import resource_tracker, shared_memory
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .FastFizCompat import STATE_CODES, ff
+from .TableGeometry import TableGeometry
+
+# Layout: a header followed by a ring of frame slots. One writer fills the slots in turn; readers map the same
+# memory and read slots in place. Every slot carries the sequence number of the frame in it, which is odd while the
+# writer is filling the slot, so a reader that saw the same even number before and after reading has a whole frame.
+_MAGIC = b"FFZFEED\x01"
+_VERSION = 1
+
+# Feeds created by this process, whose resource tracker registration belongs to the writer
+_created_names: set[str] = set()
+_BALL_COUNT = ff.Ball.FIFTEEN + 1
+
+_header_dtype = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("ball_count", "<u4"), ("slot_count", "<u4"), ("closed", "<u4"),
+    ("state_codes", "<i4", (len(STATE_CODES),)), ("written", "<u8"),
+    ("ball_radius", "<f8"), ("sliding_friction_const", "<f8"), ("rolling_friction_const", "<f8"),
+    ("gravitational_const", "<f8"), ("table_width", "<f8"), ("table_length", "<f8"),
+    ("side_pocket_width", "<f8"), ("corner_pocket_width", "<f8"),
+])
+
+_slot_dtype = np.dtype([
+    ("sequence", "<u8"), ("time", "<f8"), ("game_number", "<u4"), ("shot_number", "<u4"),
+    ("positions", "<f8", (_BALL_COUNT, 2)), ("states", "<i4", (_BALL_COUNT,)),
+])
+
+
+class FeedFrame:
+    def __init__(self, sequence: int, time: float, game_number: int, shot_number: int, positions: np.ndarray,
+                 states: np.ndarray):
+        self.sequence = sequence
+        self.time = time
+        self.game_number = game_number
+        self.shot_number = shot_number
+        self.positions = positions
+        self.states = states
+
+
+class FrameFeed:
+    # Ball positions and states of every frame a simulation produces, shared with any number of viewer processes.
+    # Readers never block the writer; a reader that falls more than a ring behind skips ahead.
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self._memory = memory
+        self._owner = owner
+        self.header = np.ndarray((1,), dtype=_header_dtype, buffer=memory.buf)[0]
+        if bytes(self.header["magic"]) != _MAGIC or self.header["version"] != _VERSION:
+            raise Exception(f"{memory.name} is not a frame feed!")
+        if tuple(self.header["state_codes"]) != STATE_CODES:
+            raise Exception(f"{memory.name} was written with different fastfiz state codes!")
+
+        self.slot_count = int(self.header["slot_count"])
+        self.slots = np.ndarray((self.slot_count,), dtype=_slot_dtype, buffer=memory.buf,
+                                offset=_header_dtype.itemsize)
+
+    @classmethod
+    def create(cls, name: Optional[str], geometry: TableGeometry, ball_radius: float, slot_count: int = 256):
+        size = _header_dtype.itemsize + slot_count * _slot_dtype.itemsize
+        memory = shared_memory.SharedMemory(name, create=True, size=size)
+
+        header = np.ndarray((1,), dtype=_header_dtype, buffer=memory.buf)[0]
+        header["magic"] = _MAGIC
+        header["version"] = _VERSION
+        header["ball_count"] = _BALL_COUNT
+        header["slot_count"] = slot_count
+        header["state_codes"] = STATE_CODES
+        header["ball_radius"] = ball_radius
+        header["sliding_friction_const"] = geometry.sliding_friction_const
+        header["rolling_friction_const"] = geometry.rolling_friction_const
+        header["gravitational_const"] = geometry.gravitational_const
+        header["table_width"] = geometry.board_width
+        header["table_length"] = geometry.board_length
+        header["side_pocket_width"] = geometry.side_pocket_width
+        header["corner_pocket_width"] = geometry.corner_pocket_width
+        del header
+        _created_names.add(memory.name)
+        return cls(memory, True)
+
+    @classmethod
+    def attach(cls, name: str):
+        # Only the writer removes the memory. Before Python 3.13 every SharedMemory is registered with the resource
+        # tracker, which would remove it when a reader exits (CPython gh-82300, bpo-38119), and unregistering needs
+        # the private name the tracker was given.
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name, track=False), False)
+        memory = shared_memory.SharedMemory(name)
+        if memory.name not in _created_names:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, False)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def written(self) -> int:
+        return int(self.header["written"])
+
+    @property
+    def is_closed(self) -> bool:
+        return bool(self.header["closed"])
+
+    def get_geometry(self) -> TableGeometry:
+        return TableGeometry.from_recording_header(self.header)
+
+    def write(self, time: float, game_number: int, shot_number: int, positions: np.ndarray, states: np.ndarray):
+        sequence = int(self.header["written"])
+        slot = self.slots[sequence % self.slot_count]
+        # Frame n is stored under sequence 2n + 2 once complete, and 2n + 1 while being written
+        slot["sequence"] = 2 * sequence + 1
+        slot["time"] = time
+        slot["game_number"] = game_number
+        slot["shot_number"] = shot_number
+        slot["positions"] = positions
+        slot["states"] = states
+        slot["sequence"] = 2 * sequence + 2
+        self.header["written"] = sequence + 1
+
+    def read(self, frame_number: int) -> Optional[FeedFrame]:
+        # The frame, or None if it is not written yet or was already overwritten
+        slot = self.slots[frame_number % self.slot_count]
+        expected = 2 * frame_number + 2
+        if int(slot["sequence"]) != expected:
+            return None
+        frame = FeedFrame(frame_number, float(slot["time"]), int(slot["game_number"]), int(slot["shot_number"]),
+                          slot["positions"].copy(), slot["states"].copy())
+        if int(slot["sequence"]) != expected:
+            return None
+        return frame
+
+    def read_into(self, frame_number: int, positions: np.ndarray, states: np.ndarray) -> bool:
+        # Like read, but into caller owned buffers so following the feed allocates nothing
+        slot = self.slots[frame_number % self.slot_count]
+        expected = 2 * frame_number + 2
+        if int(slot["sequence"]) != expected:
+            return False
+        positions[...] = slot["positions"]
+        states[...] = slot["states"]
+        return int(slot["sequence"]) == expected
+
+    def latest(self, attempts: int = 4) -> Optional[FeedFrame]:
+        # Retries while the writer laps the reader, which only happens when a frame is written during the read;
+        # None when there are no frames yet or a fast writer kept lapping the reader
+        for _ in range(attempts):
+            written = self.written
+            if written == 0:
+                return None
+            frame = self.read(written - 1)
+            if frame is not None:
+                return frame
+        return None
+
+    def next_frame_number(self, frame_number: int) -> Tuple[int, int]:
+        # For readers that want every frame: where to continue from and how many frames they missed
+        oldest = max(0, self.written - self.slot_count + 1)
+        if frame_number < oldest:
+            return oldest, oldest - frame_number
+        return frame_number, 0
+
+    def close(self):
+        if self._owner:
+            self.header["closed"] = 1
+        self.header = None
+        self.slots = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+            _created_names.discard(self._memory.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,155 @@
+from collections import deque
+import csv
+import json
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+
+class FrameProfiler:
+    # Update and draw are measured on the render thread; decide and simulate are added to the frame they finish in,
+    # whichever thread ran them. Update includes any shot decided and simulated inside it. Only the last window
+    # frames are kept for the stats; with a dump path every frame is written to it as it ends.
+    SECTIONS = ("update", "draw", "decide", "simulate")
+    COLUMNS = ("frame", "start", "interval", "update", "draw", "decide", "simulate", "total", "missed")
+
+    def __init__(self, frames_per_second: int, window: int = 300, dump_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.frames_per_second = frames_per_second
+        self.deadline = 1 / frames_per_second
+        self.window = window
+        self.frames: deque[Tuple[int, float, float, float, float, float, float, float, bool]] = deque(maxlen=window)
+        self.frame_count = 0
+        self.missed_count = 0
+
+        self.dump_path = dump_path
+        self._dump_file = None
+        self._csv_writer = None
+        if dump_path is not None:
+            self._open_dump(dump_path)
+
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = [0.0] * len(FrameProfiler.SECTIONS)
+        self._current = [0.0] * len(FrameProfiler.SECTIONS)
+        self._frame_start: Optional[float] = None
+        self._previous_frame_start: Optional[float] = None
+        self._lap_start: float = 0
+
+    def begin_frame(self):
+        now = self._clock()
+        self._previous_frame_start, self._frame_start = self._frame_start, now
+        self._lap_start = now
+        self._current = [0.0] * len(FrameProfiler.SECTIONS)
+
+    def lap(self, section: str):
+        now = self._clock()
+        self._current[FrameProfiler.SECTIONS.index(section)] += now - self._lap_start
+        self._lap_start = now
+
+    def end_frame(self):
+        total = self._clock() - self._frame_start
+        interval = self._frame_start - self._previous_frame_start if self._previous_frame_start is not None else 0.0
+
+        with self._lock:
+            pending, self._pending = self._pending, [0.0] * len(FrameProfiler.SECTIONS)
+        update, draw, decide, simulate = (current + other for current, other in zip(self._current, pending))
+
+        # A frame is missed when it started late, which is what shows on screen; half a frame of slack absorbs
+        # timer jitter
+        missed = interval > self.deadline * 1.5
+        row = (self.frame_count, self._frame_start, interval, update, draw, decide, simulate, total, missed)
+        self.frames.append(row)
+        self.frame_count += 1
+        self.missed_count += missed
+        if self._dump_file is not None:
+            self._write_dump_row(row)
+
+    def record(self, section: str, duration: float):
+        with self._lock:
+            self._pending[FrameProfiler.SECTIONS.index(section)] += duration
+
+    def profile_shot(self, simulate_next_shot: Callable, table_state, shot_decider: Callable):
+        # Imported here, it needs fastfiz and the profiler does not otherwise
+        from .BudgetedDecider import resolve_decision
+
+        decide_duration = 0.0
+
+        def _decider(state):
+            nonlocal decide_duration
+            decide_start = self._clock()
+            try:
+                return resolve_decision(shot_decider(state))
+            finally:
+                decide_duration += self._clock() - decide_start
+
+        start = self._clock()
+        result = simulate_next_shot(table_state, _decider)
+        self.record("decide", decide_duration)
+        self.record("simulate", self._clock() - start - decide_duration)
+        return result
+
+    def stats(self, window: Optional[int] = None) -> dict:
+        rows = list(self.frames)[-(window or self.window):]
+        if not rows:
+            return dict()
+
+        samples = np.array([row[2:8] for row in rows], dtype=np.float64)
+        stats = dict()
+        for column, name in enumerate(("interval", *FrameProfiler.SECTIONS, "total")):
+            values = samples[:, column]
+            stats[name] = {"mean": float(values.mean()), "p95": float(np.percentile(values, 95)),
+                           "max": float(values.max())}
+
+        intervals = samples[1:, 0]
+        stats["frames"] = len(rows)
+        stats["missed"] = sum(1 for row in rows if row[8])
+        stats["fps"] = float(1 / intervals.mean()) if len(intervals) and intervals.mean() > 0 else 0.0
+        return stats
+
+    def summary_lines(self) -> list[str]:
+        stats = self.stats()
+        if not stats:
+            return ["No frames recorded"]
+        return [f"{stats['fps']:.0f} fps",
+                f"update {stats['update']['mean'] * 1000:.2f} ms",
+                f"draw {stats['draw']['mean'] * 1000:.2f} ms",
+                f"decide {stats['decide']['max'] * 1000:.1f} ms max",
+                f"simulate {stats['simulate']['max'] * 1000:.1f} ms max",
+                f"missed {stats['missed']}/{stats['frames']}"]
+
+    def summary(self) -> str:
+        return ", ".join(self.summary_lines())
+
+    def close(self):
+        # Finishes the dump; the JSON one ends with the stats of the last window and the totals
+        if self._dump_file is None:
+            return
+        if self._csv_writer is None:
+            self._dump_file.write("], \"stats\": ")
+            json.dump({**self.stats(), "total_frames": self.frame_count, "total_missed": self.missed_count},
+                      self._dump_file)
+            self._dump_file.write("}")
+        self._dump_file.close()
+        self._dump_file = None
+
+    def _open_dump(self, path: str):
+        if path.endswith(".json"):
+            self._dump_file = open(path, "w")
+            self._dump_file.write(f"{{\"frames_per_second\": {self.frames_per_second}, \"frames\": [")
+        elif path.endswith(".csv"):
+            self._dump_file = open(path, "w", newline="")
+            self._csv_writer = csv.writer(self._dump_file)
+            self._csv_writer.writerow(FrameProfiler.COLUMNS)
+        else:
+            raise Exception("Profiles can only be dumped as .csv or .json!")
+
+    def _write_dump_row(self, row: tuple):
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(row)
+            return
+        if row[0] > 0:
+            self._dump_file.write(", ")
+        json.dump(dict(zip(FrameProfiler.COLUMNS, row)), self._dump_file)
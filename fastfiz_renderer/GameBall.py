@@ -1,7 +1,15 @@
+from __future__ import annotations
+
+import math
+
 from p5 import *
-import fastfiz as ff
+from p5.core import p5 as p5_core
+import skia
 import vectormath as vmath
 
+from .FastFizCompat import ff
+from .ShotTimeline import BallTimeline, relevant_ball_states
+
 
 class GameBall:
     ball_colors = {
@@ -56,103 +64,44 @@ class GameBall:
             if horizontal_mode:
                 rotate(-PI / 2)
 
-            ts = int(scaling / 30)
+            ts = GameBall._get_label_size(scaling)
             textSize(ts)
             fill(*GameBall.ball_colors[ff.Ball.EIGHT])
             text(str(self.number), 0, ts * 0.8)
             pop()
 
-    def update(self, time_since_shot_start: float, shot: ff.Shot, sliding_friction_const: float,
-               rolling_friction_const: float, gravitational_const: float):
-        relevant_states = self._get_relevant_ball_states_from_shot(shot)
+    def get_label_reach(self, scaling: int) -> float:
+        # How far the number drawn in stroke mode reaches from the ball's center, turned either way; p5 centers the
+        # text on x and puts its baseline half the text size above y
+        ts = GameBall._get_label_size(scaling)
+        font = skia.Font(p5_core.renderer.style.text_font.getTypeface(), ts)
+        metrics = font.getMetrics()
+        baseline = ts * 0.8 - ts / 2
+        return math.hypot(font.measureText(str(self.number)) / 2,
+                          max(abs(baseline + metrics.fAscent), abs(baseline + metrics.fDescent)))
 
-        if not relevant_states:
-            return
+    def update(self, time_since_shot_start: float, timeline: BallTimeline):
+        position = timeline.position_at(time_since_shot_start)
 
-        cur_state: _BallState = relevant_states[0]
-
-        if cur_state.e_time > time_since_shot_start:
+        if position is None:
             return
 
-        for state in relevant_states:
-            if cur_state.e_time < state.e_time <= time_since_shot_start:
-                cur_state = state
-
-        time_since_event_start = time_since_shot_start - cur_state.e_time
-
-        def calc_sliding_displacement(delta_time: float) -> vmath.Vector2:
-            rotational_velocity: vmath.Vector3 = self.radius * vmath.Vector3(0, 0, cur_state.ang_vel.z).cross(
-                cur_state.ang_vel)
-            relative_velocity = cur_state.vel + vmath.Vector2(rotational_velocity.x, rotational_velocity.y)
-            return cur_state.vel * delta_time - 0.5 * sliding_friction_const * gravitational_const * delta_time ** 2 * relative_velocity.normalize()
+        pos_x, pos_y, self.state = position
+        self.position = vmath.Vector2(pos_x, pos_y)
 
-        def calc_rolling_displacement(delta_time: float) -> vmath.Vector2:
-            return cur_state.vel * delta_time - 0.5 * rolling_friction_const * gravitational_const * delta_time ** 2 * cur_state.vel.copy().normalize()
+    def force_to_end_of_shot_pos(self, timeline: BallTimeline):
+        self.position = vmath.Vector2(*timeline.end_position)
+        self.state = timeline.end_state
 
-        displacement = vmath.Vector2(0, 0)
-
-        if cur_state.state == ff.Ball.ROLLING:
-            displacement = calc_rolling_displacement(time_since_event_start)
-        if cur_state.state == ff.Ball.SLIDING:
-            displacement = calc_sliding_displacement(time_since_event_start)
-
-        self.position = displacement + cur_state.pos
-        self.state = cur_state.state
-
-    def force_to_end_of_shot_pos(self, shot: ff.Shot):
-        relevant_states = self._get_relevant_ball_states_from_shot(shot)
-        if relevant_states:
-            self.position = relevant_states[-1].pos
-            self.state = relevant_states[-1].state
-
-    def is_mouse_over(self, scaling: int, offset: vmath.Vector2):
-        virtual_pos = vmath.Vector2(mouse_x, mouse_y) / scaling - offset
-        d = dist((self.position.x, self.position.y, 0), (virtual_pos.x, virtual_pos.y, 0))
+    def is_mouse_over(self, mouse_board_pos: vmath.Vector2):
+        d = dist((self.position.x, self.position.y, 0), (mouse_board_pos.x, mouse_board_pos.y, 0))
         hovered = d < self.radius
         self.is_being_hovered = hovered
         return hovered
 
+    @staticmethod
+    def _get_label_size(scaling: int) -> int:
+        return int(scaling / 30)
+
     def _get_relevant_ball_states_from_shot(self, shot: ff.Shot):
-        relevant_states: list[_BallState] = []
-
-        for event in shot.getEventList():
-            event: ff.Event
-            if event.getBall1() == self.number:
-                new_ball_event = _BallState.from_event_and_ball(event, event.getBall1Data())
-                relevant_states.append(new_ball_event)
-            elif event.getBall2() == self.number:
-                new_ball_event = _BallState.from_event_and_ball(event, event.getBall2Data())
-                relevant_states.append(new_ball_event)
-
-        return relevant_states
-
-
-class _BallState:
-    def __init__(self, e_time: float, pos: vmath.Vector2, vel: vmath.Vector2, ang_vel: vmath.Vector3, state: int,
-                 state_str: str,
-                 event_course: int):
-        self.e_time = e_time
-        self.pos = pos
-        self.vel = vel
-        self.ang_vel = ang_vel
-        self.state = state
-        self.state_str = state_str
-        self.event_course = event_course
-
-    @classmethod
-    def from_event_and_ball(cls, event: ff.Event, ball: ff.Ball):
-        e_time = event.getTime()
-        pos = ball.getPos()
-        vel = ball.getVelocity()
-        ang_vel = ball.getSpin()
-        state = ball.getState()
-        state_str = ball.getStateString()
-        event_course = event.getType()
-        return cls(e_time, vmath.Vector2([pos.x, pos.y]), vmath.Vector2([vel.x, vel.y]),
-                   vmath.Vector3([ang_vel.x, ang_vel.y, ang_vel.z]), state, state_str, event_course)
-
-    def __str__(self):
-        return (f"Time: {self.e_time:.3f},\t "
-                f"Pos: ({self.pos.x:.3f}, {self.pos.y:.3f}),\t "
-                f"Vel: ({self.vel.x:.3f}, {self.vel.y:.3f}),\t "
-                f"State: {self.state_str}")
+        return relevant_ball_states(shot, self.number)
@@ -0,0 +1,61 @@
+from typing import Any, Callable, Optional, Set, Tuple
+
+import fastfiz as ff
+
+from .BudgetedDecider import GameAborted, ShotSkipped, resolve_decision
+
+
+class GameFlow:
+    # Deciders may also return a future, a coroutine or an async generator, see resolve_decision
+    ShotDecider = Callable[[ff.TableState], Optional[ff.ShotParams]]
+    Game = Tuple[ff.TableState, ShotDecider]
+
+    CUE_BALL_POCKETED = "Cue ball pocketed"
+    NO_MORE_SHOTS = "No more shots left"
+    SHOT_NOT_POSSIBLE = "Shot not possible"
+    SHOT_LIMIT_REACHED = "Shot limit reached"
+
+    @staticmethod
+    def eight_ball_games(shot_deciders: list[ShotDecider]) -> list[Game]:
+        games: list[GameFlow.Game] = []
+        for decider in shot_deciders:
+            game_state: ff.GameState = ff.GameState.RackedState(ff.GT_EIGHTBALL)
+            table_state: ff.TableState = game_state.tableState()
+            games.append((table_state, decider))
+        return games
+
+    @staticmethod
+    def simulate_next_shot(table_state: ff.TableState, shot_decider: ShotDecider,
+                           execute_shot: Optional[Callable[[ff.TableState, ff.ShotParams], Any]] = None) -> Tuple[
+            Optional[ff.ShotParams], Optional[Any], Optional[str]]:
+        # Returns the executed shot, or the reason the game ended instead, or neither if the decider passed its
+        # turn. execute_shot replaces TableState.executeShot, e.g. with a cached version, and its result is
+        # returned as the shot.
+        if table_state.getBall(ff.Ball.CUE).isPocketed():
+            return None, None, GameFlow.CUE_BALL_POCKETED
+
+        try:
+            params = resolve_decision(shot_decider(table_state))
+        except ShotSkipped:
+            return None, None, None
+        except GameAborted as reason:
+            return None, None, str(reason)
+
+        if params is None:
+            return None, None, GameFlow.NO_MORE_SHOTS
+        elif table_state.isPhysicallyPossible(params) != ff.TableState.OK_PRECONDITION:
+            return params, None, GameFlow.SHOT_NOT_POSSIBLE
+
+        if execute_shot is not None:
+            return params, execute_shot(table_state, params), None
+        return params, table_state.executeShot(params), None
+
+    @staticmethod
+    def verify_table_dimensions(games: list[Game]):
+        widths: Set[float] = {table.TABLE_WIDTH for table in
+                              [table_state.getTable() for table_state in [game[0] for game in games]]}
+        lengths: Set[float] = {table.TABLE_LENGTH for table in
+                               [table_state.getTable() for table_state in [game[0] for game in games]]}
+
+        if len(widths) > 1 or len(lengths) > 1:
+            raise Exception("Games must have the same table width and length!")
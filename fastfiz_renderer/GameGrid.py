@@ -0,0 +1,126 @@
+import math
+from typing import Tuple
+
+import numpy as np
+from p5 import *
+import fastfiz as ff
+
+from .GameFlow import GameFlow
+from .GameTable import GameTable
+from .ShotTimeline import ShotTimeline, evaluate_segments
+
+
+class GameTile:
+    def __init__(self, game_number: int, table_state: ff.TableState, shot_decider: GameFlow.ShotDecider,
+                 game_table: GameTable):
+        self.game_number = game_number
+        self.table_state = table_state
+        self.shot_decider = shot_decider
+        self.game_table = game_table
+        self.finished = False
+
+
+class GameGrid:
+    def __init__(self, games: list[GameFlow.Game], columns: Optional[int] = None, tile_count: Optional[int] = None,
+                 shot_speed_factor: float = 1, clock: Callable[[], float] = time.time):
+        if not games:
+            raise Exception("No games provided!")
+        GameFlow.verify_table_dimensions(games)
+
+        self._games = list(games)
+        self._game_number = 0
+        self._shot_speed_factor = shot_speed_factor
+        self._clock = clock
+
+        tile_count = min(tile_count or len(self._games), len(self._games))
+        self.columns = columns or math.ceil(math.sqrt(tile_count))
+        self.rows = math.ceil(tile_count / self.columns)
+        self.tiles: list[GameTile] = [self._next_tile() for _ in range(tile_count)]
+
+        # Scratch buffers for evaluating the balls of every tile in one pass
+        self._positions = np.full((tile_count, ShotTimeline.ball_count, 2), np.nan)
+        self._states = np.full((tile_count, ShotTimeline.ball_count), -1, dtype=np.int64)
+
+    @property
+    def is_finished(self) -> bool:
+        return all(tile.finished and tile.game_table.is_idle for tile in self.tiles)
+
+    def get_tile_size(self, scaling: int, horizontal_mode: bool) -> Tuple[int, int]:
+        return self.tiles[0].game_table.get_canvas_size(scaling, horizontal_mode)
+
+    def get_canvas_size(self, scaling: int, horizontal_mode: bool) -> Tuple[int, int]:
+        width, length = self.get_tile_size(scaling, horizontal_mode)
+        return width * self.columns, length * self.rows
+
+    def update(self):
+        # Shots are started and finished per table, but the balls of all moving tables are evaluated together
+        active: list[Tuple[int, ShotTimeline, float]] = []
+        for tile_index, tile in enumerate(self.tiles):
+            time_since_shot_start = tile.game_table.advance(lambda: self._handle_shoot(tile))
+            if time_since_shot_start is not None:
+                active.append((tile_index, tile.game_table.active_shot, time_since_shot_start))
+
+        if not active:
+            return
+
+        tile_rows, ball_rows, segment_rows, times = [], [], [], []
+        for tile_index, shot, time_since_shot_start in active:
+            indices = shot.active_segments_at(time_since_shot_start)
+            numbers = np.flatnonzero(indices >= 0)
+            tile_rows.append(np.full(len(numbers), tile_index))
+            ball_rows.append(numbers)
+            segment_rows.append(indices[numbers])
+            times.append(np.full(len(numbers), time_since_shot_start))
+
+        tile_rows, ball_rows = np.concatenate(tile_rows), np.concatenate(ball_rows)
+        coefficients = np.concatenate([shot.coefficients[rows] for (_, shot, _), rows in zip(active, segment_rows)])
+        states = np.concatenate([shot.segment_states[rows] for (_, shot, _), rows in zip(active, segment_rows)])
+
+        self._positions[tile_rows, ball_rows] = evaluate_segments(coefficients, np.concatenate(times))
+        self._states[tile_rows, ball_rows] = states
+        moved = np.zeros((len(self.tiles), ShotTimeline.ball_count), dtype=bool)
+        moved[tile_rows, ball_rows] = True
+
+        for tile_index, _, _ in active:
+            self.tiles[tile_index].game_table.apply_positions(self._positions[tile_index], self._states[tile_index],
+                                                              moved[tile_index])
+
+    def draw(self, scaling=200, horizontal_mode=False, stroke_mode=False):
+        # Every tile has the same geometry, so they all draw the one cached static layer
+        tile_width, tile_length = self.get_tile_size(scaling, horizontal_mode)
+        for tile_index, tile in enumerate(self.tiles):
+            push()
+            translate((tile_index % self.columns) * tile_width, (tile_index // self.columns) * tile_length)
+            tile.game_table.draw(scaling, horizontal_mode, stroke_mode)
+            pop()
+
+    def draw_changes(self, scaling=200, horizontal_mode=False, stroke_mode=False) -> bool:
+        # Tiles redraw independently, so idle tables cost nothing while their neighbours animate
+        tile_width, tile_length = self.get_tile_size(scaling, horizontal_mode)
+        changed = False
+        for tile_index, tile in enumerate(self.tiles):
+            push()
+            translate((tile_index % self.columns) * tile_width, (tile_index // self.columns) * tile_length)
+            changed = tile.game_table.draw_changes(scaling, horizontal_mode, stroke_mode) or changed
+            pop()
+        return changed
+
+    def _next_tile(self) -> GameTile:
+        table_state, shot_decider = self._games.pop(0)
+        self._game_number += 1
+        game_table = GameTable.from_table_state(table_state, self._shot_speed_factor, self._clock)
+        return GameTile(self._game_number, table_state, shot_decider, game_table)
+
+    def _handle_shoot(self, tile: GameTile):
+        if tile.finished:
+            return
+
+        params, shot, end_reason = GameFlow.simulate_next_shot(tile.table_state, tile.shot_decider)
+        if shot is not None:
+            tile.game_table.add_shot(params, shot)
+        if end_reason:
+            print(f"{tile.game_number}: {end_reason}")
+            if self._games:
+                self.tiles[self.tiles.index(tile)] = self._next_tile()
+            else:
+                tile.finished = True
@@ -1,66 +1,179 @@
-from typing import Tuple, Set
+import atexit
+from typing import Tuple
 
 from p5 import *
-import fastfiz as ff
 from vectormath import Vector2
+import fastfiz as ff
 
+from .AimPredictor import AimPredictor
+from .CandidateEvaluator import CandidateEvaluator
+from .FrameFeed import FrameFeed
+from .FrameProfiler import FrameProfiler
+from .GameFlow import GameFlow
+from .GameGrid import GameGrid
+from .GameSession import GameSession
+from .GameStatistics import GameStatistics
 from .GameTable import GameTable
+from .HeadlessRenderer import FrameSink, HeadlessRenderer, RetainedSurface, VirtualClock
+from .PositionHeatmap import PositionHeatmap
+from .ShotCache import ShotCache
+from .SketchWindow import SketchWindow
+from .TableGeometry import TableGeometry
 
 
 class GameHandler:
-    _instance = None
-    ShotDecider = Callable[[ff.TableState], Optional[ff.ShotParams]]
-    Game = Tuple[ff.TableState, ShotDecider]
+    ShotDecider = GameFlow.ShotDecider
+    Game = GameFlow.Game
+
+    # Shots aimed by hand in grab mode get faster the further the mouse is pulled from the cue ball, and are only
+    # played once the mouse was dragged this many meters from where it was pressed, so a plain click plays nothing
+    AIM_SPEED_PER_METER = 4
+    AIM_SPEED_RANGE = (0.2, 4.5)
+    AIM_MIN_DRAG = 0.05
 
     def __init__(self, mac_mode=False, window_pos: Tuple[int, int] = (100, 100), frames_per_second: int = 60,
-                 scaling: int = 200, horizontal_mode: bool = False):
-        if GameHandler._instance is None:
-            self._game_number: int = 0
-            self._games: list[GameHandler.Game] = []
-            self._game_table: Optional[GameTable] = None
-            self._table_state: Optional[ff.TableState] = None
-            self._start_ball_positions: dict[int, Tuple[float, float]] = dict()
-            self._shot_decider: Optional[GameHandler.ShotDecider] = None
-
-            self._mac_mode: bool = mac_mode
-            self._window_pos: Tuple[int, int] = window_pos
-            self._frames_per_second: int = frames_per_second
-            self._scaling: int = scaling
-            self._horizontal_mode: bool = horizontal_mode
-            self._stroke_mode: bool = False
-            self._grab_mode: bool = False
-            self._shot_speed_factor: float = 1
-
-            GameHandler._instance = self
-        else:
-            raise Exception("This class is a singleton!")
+                 scaling: int = 200, horizontal_mode: bool = False, stroke_mode: bool = False):
+        self._session: Optional[GameSession] = None
+
+        self._mac_mode: bool = mac_mode
+        self._window_pos: Tuple[int, int] = window_pos
+        self._frames_per_second: int = frames_per_second
+        self._scaling: int = scaling
+        self._horizontal_mode: bool = horizontal_mode
+        self._stroke_mode: bool = stroke_mode
+        self._grab_mode: bool = False
+
+        self._profiler: Optional[FrameProfiler] = None
+        self._profiler_overlay: bool = False
+        self._shot_cache: Optional[ShotCache] = None
+        self._feed_settings: Optional[Tuple[str, int]] = None
+        self._candidate_preview: Optional[Tuple[CandidateEvaluator, Callable[[ff.TableState], list], int]] = None
+
+    def enable_profiling(self, overlay: bool = True, dump_path: Optional[str] = None) -> FrameProfiler:
+        self._profiler = FrameProfiler(self._frames_per_second, dump_path=dump_path)
+        self._profiler_overlay = overlay
+        if dump_path is not None:
+            atexit.register(self._dump_profile, self._profiler)
+        return self._profiler
+
+    def enable_shot_cache(self, max_entries: int = 1024, path: Optional[str] = None) -> ShotCache:
+        # Restarted games and replayed shot lists skip the simulation; with a path the cache outlives the process
+        self._shot_cache = ShotCache(max_entries, path)
+        if path is not None:
+            atexit.register(self._shot_cache.save)
+        return self._shot_cache
+
+    def enable_frame_feed(self, name: str, slot_count: int = 256):
+        # Every frame of the following runs is also written to shared memory under this name, for viewers in other
+        # processes to attach to with watch_feed or FrameFeed.attach
+        self._feed_settings = (name, slot_count)
+
+    def enable_candidate_preview(self, evaluator: CandidateEvaluator,
+                                 candidate_generator: Callable[[ff.TableState], list[ff.ShotParams]], top_k: int = 3):
+        # Pressing c in a game window evaluates the generator's candidates for the table as it is and draws the best
+        # top_k as ghosts once the evaluator is done
+        self._candidate_preview = (evaluator, candidate_generator, top_k)
 
     def play_eight_ball_games(self, shot_deciders: list[ShotDecider],
                               shot_speed_factor: float = 1,
                               auto_play: bool = False):
-        games: list[GameHandler.Game] = []
-        for decider in shot_deciders:
-            game_state: ff.GameState = ff.GameState.RackedState(ff.GT_EIGHTBALL)
-            table_state: ff.TableState = game_state.tableState()
-            games.append((table_state, decider))
+        self.play_games(GameFlow.eight_ball_games(shot_deciders), shot_speed_factor, auto_play)
+
+    def play_games(self, games: list[Game], shot_speed_factor: float = 1, auto_play: bool = False,
+                   prefetch_shots: bool = True, statistics: Optional[GameStatistics] = None):
+        # statistics gets every shot and game as it is played, so it can be written or summarised while playing
+        feed = self._create_feed(games)
+        try:
+            with GameSession(games, shot_speed_factor, auto_play, prefetch_shots, profiler=self._profiler,
+                             shot_cache=self._shot_cache, idle_wait=1 / self._frames_per_second,
+                             feed=feed, statistics=statistics) as session:
+                self._session = session
+                try:
+                    self._run_session_window(session)
+                finally:
+                    self._session = None
+        finally:
+            if feed is not None:
+                feed.close()
+
+    def show_heatmap(self, heatmap: PositionHeatmap, group: Optional[str] = None):
+        # An empty table with the heatmap over the board; it keeps up if the heatmap is still being filled.
+        # G cycles through the ball groups.
+        geometry = heatmap.geometry
+        game_table = GameTable(geometry.board_width, geometry.board_length, geometry.side_pocket_width,
+                               geometry.corner_pocket_width, geometry.rolling_friction_const,
+                               geometry.sliding_friction_const, geometry.gravitational_const, [], 1)
+        game_table.set_heatmap(heatmap, group)
+        groups = [None, *heatmap.groups]
+        width, length = game_table.get_canvas_size(self._scaling, self._horizontal_mode)
+        frame_buffer = RetainedSurface(*game_table.get_canvas_size(self._get_draw_scaling(), self._horizontal_mode))
+
+        def _setup():
+            size(width, length)
+            ellipseMode(CENTER)
+            textAlign(CENTER, CENTER)
+            if not self._stroke_mode:
+                noStroke()
+
+        def _draw():
+            frame_buffer.draw(lambda: game_table.draw_changes(self._get_draw_scaling(), self._horizontal_mode,
+                                                              self._stroke_mode))
+
+        def _key_released(event):
+            nonlocal group
+            if event.key == "f" or event.key == "F":
+                self._stroke_mode = not self._stroke_mode
+            elif event.key == "g" or event.key == "G":
+                group = groups[(groups.index(group) + 1) % len(groups)]
+                game_table.set_heatmap(heatmap, group)
 
-        self.play_games(games, shot_speed_factor, auto_play)
+        self._run_window(_draw, _setup, _key_released)
 
-    def play_games(self, games: list[Game], shot_speed_factor: float = 1, auto_play: bool = False):
-        if not games:
-            raise Exception("No games provided!")
+    def watch_feed(self, name: str):
+        # Shows the frames another process writes to a feed until it closes the feed
+        feed = FrameFeed.attach(name)
+        try:
+            game_table = GameTable.from_feed(feed)
+            width, length = game_table.get_canvas_size(self._scaling, self._horizontal_mode)
+            frame_buffer = RetainedSurface(*game_table.get_canvas_size(self._get_draw_scaling(),
+                                                                       self._horizontal_mode))
 
-        self._games = games
-        self._verify_table_dimensions()
-        self._shot_speed_factor = shot_speed_factor
-        self._handle_next_game()
+            def _setup():
+                size(width, length)
+                ellipseMode(CENTER)
+                textAlign(CENTER, CENTER)
+                if not self._stroke_mode:
+                    noStroke()
 
-        shot_requester = self._handle_shoot if auto_play else None
-        width = int(self._game_table.width * self._scaling)
-        length = int(self._game_table.length * self._scaling)
+            def _draw():
+                if feed.is_closed:
+                    self._close_window()
+                    return
+                game_table.follow_feed(feed)
+                frame_buffer.draw(lambda: game_table.draw_changes(self._get_draw_scaling(), self._horizontal_mode,
+                                                                  self._stroke_mode))
+
+            def _key_released(event):
+                if event.key == "f" or event.key == "F":
+                    self._stroke_mode = not self._stroke_mode
 
-        if self._horizontal_mode:
-            width, length = length, width
+            self._run_window(_draw, _setup, _key_released)
+        finally:
+            feed.close()
+
+    def _run_session_window(self, session: GameSession):
+        width, length = self._get_canvas_size()
+        # Idle frames only copy the retained table onto the window; shots redraw the areas around moving balls
+        frame_buffer = RetainedSurface(*session.game_table.get_canvas_size(self._get_draw_scaling(),
+                                                                           self._horizontal_mode))
+        # Grab mode aiming: dragging on the cloth aims the cue ball at the mouse and releasing plays the shot, dragging
+        # a ball keeps the last aim so its effect on the shot shows while moving it
+        aim_predictor = AimPredictor(session.game_table, session.game_table.game_balls[ff.Ball.CUE].radius)
+        aim_phi: Optional[float] = None
+        aim_speed: float = 0
+        aim_start: Optional[Vector2] = None
+        is_aiming = False
+        is_aim_dragged = False
 
         def _setup():
             size(width, length)
@@ -69,32 +182,84 @@ class GameHandler:
             if not self._stroke_mode:
                 noStroke()
 
+        def _draw_table() -> bool:
+            return session.game_table.draw_changes(self._get_draw_scaling(), self._horizontal_mode, self._stroke_mode)
+
         def _draw():
-            background(255)
-            self._game_table.update(shot_requester)
-            self._game_table.draw(self._scaling * 2 if self._mac_mode else self._scaling, self._horizontal_mode,
-                                  self._stroke_mode)
+            if session.is_finished:
+                self._close_window()
+                return
+            session.update()
+            frame_buffer.draw(_draw_table)
+
+        def _profiled_draw():
+            if session.is_finished:
+                self._close_window()
+                return
+            self._profiler.begin_frame()
+            session.update()
+            self._profiler.lap("update")
+            frame_buffer.draw(_draw_table, self._profiler_overlay)
+            self._profiler.lap("draw")
+            self._profiler.end_frame()
+            if self._profiler_overlay:
+                self._draw_profiler_overlay()
 
         def _key_released(event):
             if event.key == "RIGHT":
-                self._handle_shoot()
+                session.shoot()
             elif event.key == "r" or event.key == "R":
-                self._handle_restart()
+                session.restart()
             elif event.key == "n" or event.key == "N":
-                print(f"{self._game_number}: Game skipped")
-                self._handle_next_game()
+                session.skip_game()
+            elif event.key == "z" or event.key == "Z":
+                session.undo()
+            elif event.key == "y" or event.key == "Y":
+                session.redo()
+            elif event.key == "p" or event.key == "P":
+                session.resume() if session.is_paused else session.pause()
             elif event.key == "f" or event.key == "F":
                 self._stroke_mode = not self._stroke_mode
             elif event.key == "g" or event.key == "G":
                 self._grab_mode = not self._grab_mode
+                if not self._grab_mode:
+                    session.game_table.clear_aim_preview()
+            elif event.key == "o" or event.key == "O":
+                self._profiler_overlay = not self._profiler_overlay
+            elif (event.key == "c" or event.key == "C") and self._candidate_preview is not None:
+                evaluator, candidate_generator, top_k = self._candidate_preview
+                with session.shot_lock:
+                    candidates = candidate_generator(session.table_state)
+                session.preview_candidates(evaluator, candidates, top_k)
+
+        def _get_mouse_board_pos() -> Vector2:
+            return Vector2(*session.game_table.get_board_position((mouse_x, mouse_y), self._get_draw_scaling(),
+                                                                  self._horizontal_mode))
+
+        def _aim_at_mouse():
+            nonlocal aim_phi, aim_speed
+            cue_position = session.game_table.game_balls[ff.Ball.CUE].position
+            mouse_pos = _get_mouse_board_pos()
+            aim_phi = AimPredictor.get_phi((cue_position.x, cue_position.y), (mouse_pos.x, mouse_pos.y))
+            min_speed, max_speed = GameHandler.AIM_SPEED_RANGE
+            aim_speed = min(max(dist((cue_position.x, cue_position.y, 0), (mouse_pos.x, mouse_pos.y, 0))
+                                * GameHandler.AIM_SPEED_PER_METER, min_speed), max_speed)
+
+        def _update_aim_preview():
+            # Only the geometric prediction runs while the mouse moves; executeShot waits for the release
+            game_table = session.game_table
+            if aim_phi is not None and game_table.is_idle:
+                game_table.set_aim_preview(aim_predictor.predict(*game_table.get_ball_states(), aim_phi))
 
         def _mouse_pressed(_):
+            nonlocal is_aiming, is_aim_dragged, aim_start
             if self._grab_mode:
-                scaling = self._scaling * 2 if self._mac_mode else self._scaling
+                game_table = session.game_table
+                mouse_pos = _get_mouse_board_pos()
                 moused_over_ball = None
 
-                for ball in self._game_table.game_balls:
-                    if ball.is_mouse_over(scaling, Vector2(self._game_table.board_pos, self._game_table.board_pos)):
+                for ball in game_table.game_balls:
+                    if ball.is_mouse_over(mouse_pos):
                         moused_over_ball = ball
                         break
 
@@ -102,71 +267,182 @@ class GameHandler:
                     moused_over_ball.is_being_dragged = True
                     return
 
+                if game_table.is_idle:
+                    is_aiming = True
+                    is_aim_dragged = False
+                    aim_start = mouse_pos
+                    _aim_at_mouse()
+                    _update_aim_preview()
+
         def _mouse_released(_):
+            nonlocal is_aiming
             if self._grab_mode:
-                for ball in self._game_table.game_balls:
-                    self._table_state.setBall(ball.number, ball.state, ball.position.x, ball.position.y)
+                if is_aiming:
+                    is_aiming = False
+                    session.game_table.clear_aim_preview()
+                    if is_aim_dragged and session.game_table.is_idle:
+                        session.shoot(self._get_aim_params(aim_phi, aim_speed))
+                    return
+
+                session.commit_ball_positions()
+                for ball in session.game_table.game_balls:
                     ball.is_being_dragged = False
 
         def _mouse_dragged(_):
+            nonlocal is_aim_dragged
             if self._grab_mode:
-                for ball in self._game_table.game_balls:
+                if is_aiming:
+                    mouse_pos = _get_mouse_board_pos()
+                    if dist((mouse_pos.x, mouse_pos.y, 0), (aim_start.x, aim_start.y, 0)) >= GameHandler.AIM_MIN_DRAG:
+                        is_aim_dragged = True
+                    _aim_at_mouse()
+                    _update_aim_preview()
+                    return
+
+                game_table = session.game_table
+                for ball in game_table.game_balls:
                     if ball.is_being_dragged:
-                        new_pos = Vector2(mouse_x, mouse_y) / self._scaling
-                        if self._mac_mode:
-                            new_pos /= 2
-                        ball.position = new_pos - Vector2(self._game_table.board_pos, self._game_table.board_pos)
+                        ball.position = _get_mouse_board_pos()
+                        _update_aim_preview()
                         return
 
-        run(renderer="skia", frame_rate=self._frames_per_second, sketch_draw=_draw, sketch_setup=_setup,
-            sketch_key_released=_key_released, sketch_mouse_dragged=_mouse_dragged,
-            sketch_mouse_released=_mouse_released, sketch_mouse_pressed=_mouse_pressed, window_xpos=self._window_pos[0],
-            window_ypos=self._window_pos[1],
-            window_title="Cue Canvas")
-
-    def _handle_next_game(self):
-        if self._games:
-            self._table_state, self._shot_decider = self._games.pop(0)
-            self._game_table = GameTable.from_table_state(self._table_state, self._shot_speed_factor)
-            self._game_number += 1
-            self._load_start_balls()
-        else:
-            print("No more games left")
-            exit()
-
-    def _handle_restart(self):
-        for ball_number, pos in self._start_ball_positions.items():
-            self._table_state.setBall(ball_number, ff.Ball.STATIONARY, pos[0], pos[1])
-        self._game_table = GameTable.from_table_state(self._table_state, self._shot_speed_factor)
-
-    def _handle_shoot(self):
-        if self._table_state.getBall(ff.Ball.CUE).isPocketed():
-            print(f"{self._game_number}: Cue ball pocketed")
-            self._handle_next_game()
-
-        params = self._shot_decider(self._table_state)
-
-        if params is None:
-            print(f"{self._game_number}: No more shots left")
-            self._handle_next_game()
-        elif self._table_state.isPhysicallyPossible(params) != ff.TableState.OK_PRECONDITION:
-            print(f"{self._game_number}: Shot not possible")
-            self._handle_next_game()
-        else:
-            shot = self._table_state.executeShot(params)
-            self._game_table.add_shot(params, shot)
-
-    def _verify_table_dimensions(self):
-        widths: Set[float] = {table.TABLE_WIDTH for table in
-                              [table_state.getTable() for table_state in [game[0] for game in self._games]]}
-        lengths: Set[float] = {table.TABLE_LENGTH for table in
-                               [table_state.getTable() for table_state in [game[0] for game in self._games]]}
-
-        if len(widths) > 1 or len(lengths) > 1:
-            raise Exception("Games must have the same table width and length!")
-
-    def _load_start_balls(self):
-        for i in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
-            ball = self._table_state.getBall(i)
-            pos = ball.getPos()
-            self._start_ball_positions[ball.getID()] = (pos.x, pos.y)
+        self._run_window(_draw if self._profiler is None else _profiled_draw, _setup, _key_released,
+                         sketch_mouse_dragged=_mouse_dragged, sketch_mouse_released=_mouse_released,
+                         sketch_mouse_pressed=_mouse_pressed)
+
+    def play_games_grid(self, games: list[Game], columns: Optional[int] = None, tile_count: Optional[int] = None,
+                        shot_speed_factor: float = 1):
+        grid = GameGrid(games, columns, tile_count, shot_speed_factor)
+        width, length = grid.get_canvas_size(self._scaling, self._horizontal_mode)
+        frame_buffer = RetainedSurface(*grid.get_canvas_size(self._get_draw_scaling(), self._horizontal_mode))
+
+        def _setup():
+            size(width, length)
+            ellipseMode(CENTER)
+            textAlign(CENTER, CENTER)
+            if not self._stroke_mode:
+                noStroke()
+
+        def _draw():
+            if grid.is_finished:
+                self._close_window()
+                return
+            if self._profiler is not None:
+                self._profiler.begin_frame()
+            grid.update()
+            if self._profiler is not None:
+                self._profiler.lap("update")
+            frame_buffer.draw(lambda: grid.draw_changes(self._get_draw_scaling(), self._horizontal_mode,
+                                                        self._stroke_mode),
+                              self._profiler is not None and self._profiler_overlay)
+            if self._profiler is not None:
+                self._profiler.lap("draw")
+                self._profiler.end_frame()
+                if self._profiler_overlay:
+                    self._draw_profiler_overlay()
+
+        def _key_released(event):
+            if event.key == "f" or event.key == "F":
+                self._stroke_mode = not self._stroke_mode
+            elif event.key == "o" or event.key == "O":
+                self._profiler_overlay = not self._profiler_overlay
+
+        self._run_window(_draw, _setup, _key_released)
+
+    def export_games(self, games: list[Game], frame_sink: Optional[FrameSink], shot_speed_factor: float = 1,
+                     frame_range: Optional[Tuple[int, int]] = None, max_shots: Optional[int] = 100,
+                     on_frame: Optional[Callable[[int], None]] = None) -> int:
+        # Games end after max_shots shots like in GameRunner, so a decider that never runs out of shots cannot keep
+        # the export going forever. on_frame is called with the number of every frame before it is simulated.
+        clock = VirtualClock(self._frames_per_second)
+        first_frame, last_frame = frame_range if frame_range else (0, None)
+        frame_number = 0
+
+        # Shots are simulated in the frame that asks for them, so the output does not depend on thread timing
+        feed = self._create_feed(games)
+        session = GameSession(games, shot_speed_factor, auto_play=True, prefetch_shots=False, clock=clock.time,
+                              profiler=self._profiler, shot_cache=self._shot_cache, feed=feed, max_shots=max_shots)
+        try:
+            renderer = None
+            if frame_sink is not None:
+                renderer = HeadlessRenderer(*session.game_table.get_canvas_size(self._scaling, self._horizontal_mode),
+                                            stroke_mode=self._stroke_mode)
+
+            def _draw():
+                session.update()
+                if self._profiler is not None:
+                    self._profiler.lap("update")
+                session.game_table.draw(self._scaling, self._horizontal_mode, self._stroke_mode)
+                if self._profiler is not None:
+                    self._profiler.lap("draw")
+
+            # Frames before the requested range are only simulated, so a range can start mid-game
+            while not session.is_finished and (last_frame is None or frame_number < last_frame):
+                if on_frame is not None:
+                    on_frame(frame_number)
+                if self._profiler is not None:
+                    self._profiler.begin_frame()
+                if renderer is not None and frame_number >= first_frame:
+                    frame_sink.write(renderer.render(_draw))
+                else:
+                    session.update()
+                    if self._profiler is not None:
+                        self._profiler.lap("update")
+                if self._profiler is not None:
+                    self._profiler.end_frame()
+                clock.tick()
+                frame_number += 1
+        finally:
+            session.close()
+            if feed is not None:
+                feed.close()
+            if frame_sink is not None:
+                frame_sink.close()
+
+        return frame_number
+
+    def _create_feed(self, games: list[Game]) -> Optional[FrameFeed]:
+        if self._feed_settings is None or not games:
+            return None
+        table_state = games[0][0]
+        name, slot_count = self._feed_settings
+        return FrameFeed.create(name, TableGeometry.from_table_state(table_state),
+                                table_state.getBall(ff.Ball.CUE).getRadius(), slot_count)
+
+    def _run_window(self, draw: Callable[[], None], setup: Callable[[], None], key_released: Callable, **handlers):
+        SketchWindow.run(draw, setup, key_released, self._frames_per_second, self._window_pos, **handlers)
+
+    @staticmethod
+    def _close_window():
+        SketchWindow.close()
+
+    @staticmethod
+    def _get_aim_params(phi: float, speed: float) -> ff.ShotParams:
+        shot_params = ff.ShotParams()
+        shot_params.v = speed
+        shot_params.a = 0
+        shot_params.b = 0
+        shot_params.phi = phi
+        shot_params.theta = 11
+        return shot_params
+
+    def _get_canvas_size(self) -> Tuple[int, int]:
+        return self._session.game_table.get_canvas_size(self._scaling, self._horizontal_mode)
+
+    def _get_draw_scaling(self) -> int:
+        return self._scaling * 2 if self._mac_mode else self._scaling
+
+    def _draw_profiler_overlay(self):
+        push()
+        noStroke()
+        fill(255)
+        textAlign(LEFT, BASELINE)
+        textSize(12)
+        for line_number, line in enumerate(self._profiler.summary_lines()):
+            text(line, 4, 14 + line_number * 14)
+        pop()
+
+    @staticmethod
+    def _dump_profile(profiler: FrameProfiler):
+        profiler.close()
+        print(f"Profile of {profiler.frame_count} frames written to {profiler.dump_path}: {profiler.summary()}")
@@ -0,0 +1,145 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import fastfiz as ff
+
+from .BudgetedDecider import resolve_decision
+from .GameFlow import GameFlow
+from .ShotRecording import ShotRecordingWriter
+from .StateCodec import StateCodec
+
+
+class ShotRecord:
+    def __init__(self, params: StateCodec.EncodedShotParams, duration: float, pocketed: list[Tuple[int, int]],
+                 fouls: list[str], first_contact: Optional[int], decide_duration: float = 0.0):
+        self.params = params
+        self.duration = duration
+        self.pocketed = pocketed
+        self.fouls = fouls
+        self.first_contact = first_contact
+        # Wall clock seconds the decider took for this shot, including turns it passed before it
+        self.decide_duration = decide_duration
+
+    @classmethod
+    def from_shot(cls, params: ff.ShotParams, shot: ff.Shot, decide_duration: float = 0.0):
+        pocketed: list[Tuple[int, int]] = []
+        first_contact: Optional[int] = None
+
+        for event in shot.getEventList():
+            event: ff.Event
+            event_type = event.getType()
+            if event_type == ff.Event.POCKETED:
+                pocketed.append((event.getBall1(), event.getBall1Data().getState()))
+            elif event_type == ff.Event.BALL_COLLISION and first_contact is None:
+                if event.getBall1() == ff.Ball.CUE:
+                    first_contact = event.getBall2()
+                elif event.getBall2() == ff.Ball.CUE:
+                    first_contact = event.getBall1()
+
+        fouls: list[str] = []
+        if first_contact is None:
+            fouls.append("No ball hit")
+        if any(ball == ff.Ball.CUE for ball, _ in pocketed):
+            fouls.append("Cue ball pocketed")
+
+        return cls(StateCodec.encode_shot_params(params), shot.getDuration(), pocketed, fouls, first_contact,
+                   decide_duration)
+
+
+class GameResult:
+    def __init__(self, game_number: int, shots: list[ShotRecord], termination_reason: str):
+        self.game_number = game_number
+        self.shots = shots
+        self.termination_reason = termination_reason
+
+    @property
+    def pocketed(self) -> list[Tuple[int, int]]:
+        return [pocket for shot in self.shots for pocket in shot.pocketed]
+
+    @property
+    def fouls(self) -> list[str]:
+        return [foul for shot in self.shots for foul in shot.fouls]
+
+    def __str__(self):
+        return (f"Game {self.game_number}: {len(self.shots)} shots, {len(self.pocketed)} pocketed, "
+                f"{len(self.fouls)} fouls, {self.termination_reason}")
+
+
+class GameRunner:
+    def __init__(self, processes: int = 1, max_shots: Optional[int] = 100, chunksize: Optional[int] = None):
+        self.processes = processes or os.cpu_count()
+        self.max_shots = max_shots
+        self.chunksize = chunksize
+
+    def run_eight_ball_games(self, shot_deciders: list[GameFlow.ShotDecider],
+                             recording_path: Optional[str] = None) -> list[GameResult]:
+        return self.run_games(GameFlow.eight_ball_games(shot_deciders), recording_path)
+
+    def run_games(self, games: list[GameFlow.Game], recording_path: Optional[str] = None) -> list[GameResult]:
+        return list(self.iter_games(games, recording_path))
+
+    def iter_games(self, games: list[GameFlow.Game], recording_path: Optional[str] = None) -> Iterator[GameResult]:
+        if not games:
+            raise Exception("No games provided!")
+
+        if recording_path is not None:
+            if self.processes != 1:
+                raise Exception("Recording is only supported with processes=1!")
+            with ShotRecordingWriter(recording_path, games[0][0]) as recorder:
+                for game_number, (table_state, decider) in enumerate(games, 1):
+                    yield GameRunner.run_game(table_state, decider, game_number, self.max_shots, recorder)
+            return
+
+        if self.processes == 1:
+            for game_number, (table_state, decider) in enumerate(games, 1):
+                yield GameRunner.run_game(table_state, decider, game_number, self.max_shots)
+            return
+
+        # Table states cross the process boundary encoded; deciders must be picklable (module level functions)
+        jobs = [(StateCodec.encode_table_state(table_state), StateCodec.encode_table(table_state.getTable()), decider,
+                 game_number, self.max_shots) for game_number, (table_state, decider) in enumerate(games, 1)]
+        chunksize = self.chunksize or max(1, len(jobs) // (self.processes * 8))
+
+        with ProcessPoolExecutor(self.processes) as pool:
+            yield from pool.map(_run_encoded_game, jobs, chunksize=chunksize)
+
+    @staticmethod
+    def run_game(table_state: ff.TableState, shot_decider: GameFlow.ShotDecider, game_number: int = 1,
+                 max_shots: Optional[int] = None, recorder: Optional[ShotRecordingWriter] = None) -> GameResult:
+        shots: list[ShotRecord] = []
+        decide_duration = 0.0
+
+        def _timed_decider(state: ff.TableState):
+            nonlocal decide_duration
+            decide_start = time.perf_counter()
+            try:
+                return resolve_decision(shot_decider(state))
+            finally:
+                decide_duration += time.perf_counter() - decide_start
+
+        # Passed turns count towards the shot limit, so a decider that keeps passing still ends its game
+        turns = 0
+        while True:
+            if max_shots is not None and turns >= max_shots:
+                return GameResult(game_number, shots, GameFlow.SHOT_LIMIT_REACHED)
+            turns += 1
+
+            start_state = StateCodec.encode_table_state(table_state) if recorder else None
+            params, shot, end_reason = GameFlow.simulate_next_shot(table_state, _timed_decider)
+            if end_reason:
+                return GameResult(game_number, shots, end_reason)
+            if shot is None:
+                continue
+
+            if recorder:
+                recorder.write_shot(game_number, len(shots), start_state, params, shot)
+            shots.append(ShotRecord.from_shot(params, shot, decide_duration))
+            decide_duration = 0.0
+
+
+def _run_encoded_game(job) -> GameResult:
+    encoded_state, encoded_table, decider, game_number, max_shots = job
+    return GameRunner.run_game(StateCodec.decode_table_state(encoded_state, encoded_table), decider, game_number,
+                               max_shots)
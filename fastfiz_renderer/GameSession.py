@@ -0,0 +1,353 @@
+import functools
+import threading
+from concurrent.futures import Future
+import time
+from typing import Any, Callable, Optional, Tuple
+
+import fastfiz as ff
+
+from .BudgetedDecider import resolve_decision
+from .CandidateEvaluator import CandidateEvaluator
+from .FrameFeed import FrameFeed
+from .FrameProfiler import FrameProfiler
+from .GameFlow import GameFlow
+from .GameRunner import ShotRecord
+from .GameStatistics import GameStatistics
+from .GameTable import GameTable
+from .ShotCache import ShotCache
+from .ShotHistory import ShotHistory
+from .ShotTimeline import ShotTimeline
+from .StateCodec import StateCodec
+
+
+class GameSession:
+    # Owns everything one run through a list of games needs, so any number of sessions can live in one process.
+    # Sessions never draw; GameHandler renders them in a window or offscreen.
+    SESSION_CLOSED = "Session closed"
+
+    def __init__(self, games: list[GameFlow.Game], shot_speed_factor: float = 1, auto_play: bool = False,
+                 prefetch_shots: bool = True, clock: Callable[[], float] = time.time,
+                 profiler: Optional[FrameProfiler] = None, shot_cache: Optional[ShotCache] = None,
+                 idle_wait: float = 1 / 60, feed: Optional[FrameFeed] = None, max_shots: Optional[int] = None,
+                 statistics: Optional[GameStatistics] = None):
+        if not games:
+            raise Exception("No games provided!")
+        if statistics is not None and shot_cache is not None:
+            raise Exception("Shot statistics need the shot events, which cached shots do not keep!")
+        GameFlow.verify_table_dimensions(games)
+
+        self._games: list[GameFlow.Game] = list(games)
+        self._game_number: int = 0
+        self._game_table: Optional[GameTable] = None
+        self._table_state: Optional[ff.TableState] = None
+        # Snapshots of the game so far; the table state is at snapshot _history_shot, ahead of the animation while
+        # shots are queued
+        self._history: Optional[ShotHistory] = None
+        self._history_shot: int = 0
+        self._shot_decider: Optional[GameFlow.ShotDecider] = None
+        self._shot_speed_factor = shot_speed_factor
+        self._clock = clock
+        self._profiler = profiler
+        self._shot_cache = shot_cache
+        self._feed = feed
+        self._max_shots = max_shots
+        # Gets every shot as it is played and every game as it ends; shots played again after going back through
+        # the history are added again; a game still open when the session closes ends with SESSION_CLOSED
+        self._statistics = statistics
+        self._is_game_open: bool = False
+        # Seconds the decider spent on turns it passed, added to the next shot it plays
+        self._passed_decide_duration: float = 0.0
+        self._finished: bool = False
+
+        self._auto_play = auto_play
+        # Auto play stops after going back through the history, so redoing shows the recorded shots instead of
+        # playing new ones over them
+        self._paused: bool = False
+        self._prefetch_shots = auto_play and prefetch_shots
+        self._shot_requester = None
+        if self._prefetch_shots:
+            self._shot_requester = self._handle_prefetched_shot
+        elif auto_play:
+            self._shot_requester = self.shoot
+
+        # Prefetching decides and simulates shots on a worker thread; game state changes happen under this lock
+        self._shot_lock = threading.RLock()
+        self._shot_worker: Optional[threading.Thread] = None
+        self._shot_worker_stop = threading.Event()
+        self._prefetch_depth: int = 1
+        self._pending_game_end: Optional[str] = None
+        # Ghosts of finished candidate evaluations, handed from the evaluator's thread to the next update
+        self._pending_ghosts: Optional[Tuple[GameTable, list[dict]]] = None
+        # Bumped whenever the table state changes under the lock, so shots simulated from an older copy are dropped
+        self._state_version: int = 0
+        # Params of a dropped prefetched shot, played next instead of asking the decider again, since deciders like
+        # a params list move on with every call
+        self._retry_params: Optional[ff.ShotParams] = None
+        self._idle_wait = idle_wait
+
+        self.next_game()
+
+    @property
+    def game_table(self) -> GameTable:
+        return self._game_table
+
+    @property
+    def game_number(self) -> int:
+        return self._game_number
+
+    @property
+    def table_state(self) -> ff.TableState:
+        return self._table_state
+
+    @property
+    def shot_lock(self) -> threading.RLock:
+        return self._shot_lock
+
+    @property
+    def is_finished(self) -> bool:
+        return self._finished
+
+    @property
+    def history(self) -> ShotHistory:
+        return self._history
+
+    @property
+    def shown_shot_number(self) -> int:
+        # The shot whose end the table shows, or the one before the shot being animated
+        with self._shot_lock:
+            active_shots = 1 if self._game_table.active_shot is not None else 0
+            return self._history_shot - self._game_table.queued_shot_count - active_shots
+
+    @property
+    def is_paused(self) -> bool:
+        return self._paused
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def start(self):
+        if self._prefetch_shots and (self._shot_worker is None or not self._shot_worker.is_alive()):
+            self._shot_worker_stop.clear()
+            self._shot_worker = threading.Thread(target=self._run_shot_worker, daemon=True)
+            self._shot_worker.start()
+
+    def close(self):
+        self._shot_worker_stop.set()
+        if self._shot_worker is not None and self._shot_worker is not threading.current_thread():
+            self._shot_worker.join()
+        self._shot_worker = None
+        with self._shot_lock:
+            if self._statistics is not None and self._is_game_open:
+                self._statistics.end_game(self._game_number, GameSession.SESSION_CLOSED)
+            self._is_game_open = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def update(self):
+        shot_requester = None if self._paused else self._shot_requester
+        pending_ghosts, self._pending_ghosts = self._pending_ghosts, None
+        if pending_ghosts is not None and pending_ghosts[0] is self._game_table and self._game_table.is_idle:
+            self._game_table.set_ghosts(pending_ghosts[1])
+        self._game_table.update(shot_requester)
+        if self._feed is not None:
+            self._game_table.write_feed(self._feed, self._game_number)
+
+    def next_game(self):
+        with self._shot_lock:
+            self._pending_game_end = None
+            self._state_version += 1
+            self._retry_params = None
+            self._passed_decide_duration = 0.0
+            self._is_game_open = False
+            self._paused = False
+            if self._games:
+                self._table_state, self._shot_decider = self._games.pop(0)
+                self._game_table = GameTable.from_table_state(self._table_state, self._shot_speed_factor,
+                                                              self._clock)
+                self._game_number += 1
+                self._history = ShotHistory.from_table_state(self._table_state)
+                self._history_shot = 0
+                self._is_game_open = True
+            elif not self._finished:
+                print("No more games left")
+                self._finished = True
+
+    def skip_game(self):
+        with self._shot_lock:
+            self._end_game("Game skipped")
+
+    def restart(self):
+        # Plays the game again from the start, unlike jumping there
+        self.jump_to_shot(0)
+        self.resume()
+
+    def undo(self):
+        # Back to the start of the shot being animated, or to the shot before the one shown
+        with self._shot_lock:
+            shown_shot_number = self.shown_shot_number
+            if self._game_table.active_shot is None:
+                shown_shot_number -= 1
+            self.jump_to_shot(max(0, shown_shot_number))
+
+    def redo(self):
+        with self._shot_lock:
+            if self.shown_shot_number < self._history.shot_count:
+                self.jump_to_shot(self.shown_shot_number + 1)
+
+    def jump_to_shot(self, shot_number: int):
+        # Restores the snapshot after the given shot without simulating anything and pauses auto play; shots played
+        # from there replace the later snapshots
+        with self._shot_lock:
+            self._paused = True
+            positions, states = self._history.restore(shot_number, self._table_state)
+            self._history_shot = shot_number
+            self._pending_game_end = None
+            self._state_version += 1
+            self._game_table.cancel_shots()
+            self._game_table.set_ball_states(positions, states)
+
+    def shoot(self, params: Optional[ff.ShotParams] = None):
+        # Plays the decider's next shot, or the given one in its place, e.g. one aimed by hand
+        with self._shot_lock:
+            if self._finished:
+                return
+            if params is None:
+                params, self._retry_params = self._retry_params, None
+            end_reason = self._simulate_next_shot(None if params is None else lambda _: params)
+            if end_reason:
+                self._end_game(end_reason)
+
+    def preview_candidates(self, evaluator: CandidateEvaluator, candidates: list[ff.ShotParams],
+                           top_k: int = 3) -> Future:
+        # Evaluates from the current table state in the background; the best candidates appear as ghosts on the
+        # table in the first update after they are done, unless the game has moved on by then
+        game_table = self._game_table
+        with self._shot_lock:
+            future = evaluator.evaluate_async(self._table_state, candidates, top_k)
+
+        def _show_ghosts(done: Future):
+            # Runs on the evaluator's thread, so the table is left to the draw thread
+            if done.exception() is None:
+                self._pending_ghosts = (game_table, [result.trajectories for result in done.result()[:top_k]
+                                                     if result.trajectories])
+
+        future.add_done_callback(_show_ghosts)
+        return future
+
+    def commit_ball_positions(self):
+        # Called after balls were moved by hand; prefetched shots were simulated from the old positions
+        with self._shot_lock:
+            self._game_table.clear_queued_shots()
+            self._pending_game_end = None
+            self._state_version += 1
+            for ball in self._game_table.game_balls:
+                self._table_state.setBall(ball.number, ball.state, ball.position.x, ball.position.y)
+
+    def _handle_prefetched_shot(self):
+        # Called by the table once it has nothing left to animate; game transitions wait until then
+        if self._pending_game_end is not None:
+            with self._shot_lock:
+                self._end_game(self._pending_game_end)
+
+    def _end_game(self, end_reason: str):
+        print(f"{self._game_number}: {end_reason}")
+        if self._statistics is not None and self._is_game_open:
+            self._statistics.end_game(self._game_number, end_reason)
+        self._is_game_open = False
+        self.next_game()
+
+    def _simulate_next_shot(self, shot_decider: Optional[GameFlow.ShotDecider] = None) -> Optional[str]:
+        if self._is_shot_limit_reached():
+            return GameFlow.SHOT_LIMIT_REACHED
+        params, shot, end_reason, decide_duration = self._play_shot(self._table_state,
+                                                                    shot_decider or self._shot_decider)
+        self._queue_shot(params, shot, decide_duration)
+        return end_reason
+
+    def _is_shot_limit_reached(self) -> bool:
+        return self._max_shots is not None and self._history_shot >= self._max_shots
+
+    def _play_shot(self, table_state: ff.TableState, shot_decider: GameFlow.ShotDecider) -> Tuple[
+            Optional[ff.ShotParams], Optional[Any], Optional[str], float]:
+        # With a shot cache the simulation yields compiled timelines instead of fastfiz shots. Also returns the
+        # seconds the decider took, which the shot statistics keep.
+        simulate_next_shot = GameFlow.simulate_next_shot
+        if self._shot_cache is not None:
+            simulate_next_shot = functools.partial(GameFlow.simulate_next_shot,
+                                                   execute_shot=self._shot_cache.execute_shot)
+        decide_duration = 0.0
+
+        def _timed_decider(state: ff.TableState):
+            nonlocal decide_duration
+            decide_start = time.perf_counter()
+            try:
+                return resolve_decision(shot_decider(state))
+            finally:
+                decide_duration += time.perf_counter() - decide_start
+
+        if self._profiler is None:
+            params, shot, end_reason = simulate_next_shot(table_state, _timed_decider)
+        else:
+            params, shot, end_reason = self._profiler.profile_shot(simulate_next_shot, table_state, _timed_decider)
+        return params, shot, end_reason, decide_duration
+
+    def _queue_shot(self, params: Optional[ff.ShotParams], shot: Optional[Any], decide_duration: float = 0.0):
+        # Expects the table state to already be at the end of the shot
+        if shot is None:
+            self._passed_decide_duration += decide_duration
+            return
+        if isinstance(shot, ShotTimeline):
+            self._game_table.add_timeline(params, shot)
+        else:
+            self._game_table.add_shot(params, shot)
+        if self._statistics is not None:
+            self._statistics.add_shot(self._game_number, self._history_shot,
+                                      ShotRecord.from_shot(params, shot,
+                                                           self._passed_decide_duration + decide_duration))
+        self._passed_decide_duration = 0.0
+        self._history.truncate(self._history_shot)
+        self._history.append(*ShotHistory.read_table_state(self._table_state))
+        self._history_shot += 1
+        self._state_version += 1
+
+    def _run_shot_worker(self):
+        # executeShot leaves the table state at the end of the shot, so the next shot can be decided while the
+        # previous one is still animating. The decider and the simulation run on a copy of the table without the
+        # lock, so input and game transitions never wait for a slow decider.
+        while not self._shot_worker_stop.is_set():
+            with self._shot_lock:
+                ready = (self._pending_game_end is None and not self._finished and not self._paused
+                         and self._game_table.queued_shot_count < self._prefetch_depth)
+                if ready and self._is_shot_limit_reached():
+                    self._pending_game_end = GameFlow.SHOT_LIMIT_REACHED
+                    ready = False
+                elif ready:
+                    state_version, game_number = self._state_version, self._game_number
+                    retry_params, self._retry_params = self._retry_params, None
+                    shot_decider = self._shot_decider if retry_params is None else lambda _: retry_params
+                    table_state = StateCodec.copy_table_state(self._table_state)
+
+            if not ready:
+                self._shot_worker_stop.wait(self._idle_wait)
+                continue
+
+            params, shot, end_reason, decide_duration = self._play_shot(table_state, shot_decider)
+
+            with self._shot_lock:
+                # Dropped if the game moved on, a shot was undone or played, or balls were moved meanwhile; the
+                # params are then played from the new table state within the same game
+                if self._state_version == state_version:
+                    for number, state, x, y in StateCodec.encode_table_state(table_state):
+                        self._table_state.setBall(number, state, x, y)
+                    self._queue_shot(params, shot, decide_duration)
+                    self._pending_game_end = end_reason
+                elif params is not None and self._game_number == game_number and self._retry_params is None:
+                    self._retry_params = params
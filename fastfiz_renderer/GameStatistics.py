@@ -0,0 +1,231 @@
+import csv
+import os
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .FastFizCompat import ff
+from .GameRunner import GameResult, ShotRecord
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+SHOT_COLUMNS = (("game", np.int64), ("shot", np.int64), ("a", np.float64), ("b", np.float64),
+                ("theta", np.float64), ("phi", np.float64), ("v", np.float64), ("duration", np.float64),
+                ("decide_duration", np.float64), ("pocketed", np.int64), ("cue_pocketed", np.bool_),
+                ("fouls", np.int64), ("first_contact", np.int64))
+GAME_COLUMNS = (("game", np.int64), ("shots", np.int64), ("pocketed", np.int64), ("fouls", np.int64),
+                ("break_pocketed", np.int64), ("break_foul", np.bool_), ("break_scratch", np.bool_),
+                ("end_reason", np.int64))
+
+# Fixed bins, so distributions can be summed chunk by chunk without knowing the whole run. The histograms have one
+# more bin below and above these edges, so samples outside them are still counted.
+PARAM_BINS = {"a": np.linspace(-1, 1, 21), "b": np.linspace(-1, 1, 21), "theta": np.linspace(0, 90, 19),
+              "phi": np.linspace(0, 360, 37), "v": np.linspace(0, 10, 41)}
+
+
+class _ColumnBuffer:
+    def __init__(self, columns: tuple, capacity: int):
+        self.columns = columns
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in columns}
+        self.capacity = capacity
+        self.length = 0
+
+    @property
+    def is_full(self) -> bool:
+        return self.length == self.capacity
+
+    def append(self, row: tuple):
+        for (name, _), value in zip(self.columns, row):
+            self.arrays[name][self.length] = value
+        self.length += 1
+
+    def take(self) -> dict[str, np.ndarray]:
+        # The filled part of every column; the buffer is reused for the next chunk
+        chunk = {name: array[:self.length] for name, array in self.arrays.items()}
+        self.length = 0
+        return chunk
+
+
+class _ColumnWriter:
+    def __init__(self, path: str, columns: tuple, labels: Optional[dict[str, list[str]]] = None):
+        # labels turns code columns back into text, like the end reasons
+        self.path = path
+        self.names = [name for name, _ in columns]
+        self.labels = labels or dict()
+        self._parquet_writer = None
+        self._csv_file = None
+
+        if path.endswith(".parquet"):
+            if not HAS_PYARROW:
+                raise Exception("Writing Parquet needs pyarrow!")
+        elif path.endswith(".csv"):
+            self._csv_file = open(path, "w", newline="")
+            csv.writer(self._csv_file).writerow(self.names)
+        else:
+            raise Exception("Statistics can only be written as .csv or .parquet!")
+
+    def write(self, chunk: dict[str, np.ndarray]):
+        columns = [self._get_column(name, chunk[name]) for name in self.names]
+        if self._csv_file is not None:
+            csv.writer(self._csv_file).writerows(zip(*columns))
+            return
+
+        table = pyarrow.table(dict(zip(self.names, columns)))
+        if self._parquet_writer is None:
+            self._parquet_writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def _get_column(self, name: str, values: np.ndarray):
+        if name in self.labels:
+            return [self.labels[name][code] for code in values.tolist()]
+        return values if self._csv_file is None else values.tolist()
+
+
+class GameStatistics:
+    # Takes game results as they come out of GameRunner.iter_games, or shot by shot from a GameSession, writes one row
+    # per shot and per game in chunks and keeps running totals of the chunks, so only one chunk per table (and the
+    # shots of the game being streamed) is ever held in memory
+    def __init__(self, output_dir: Optional[str] = None, output_format: str = "csv", chunk_rows: int = 4096):
+        self._shots = _ColumnBuffer(SHOT_COLUMNS, chunk_rows)
+        self._games = _ColumnBuffer(GAME_COLUMNS, chunk_rows)
+        self._end_reasons: list[str] = []
+        self._shot_writer: Optional[_ColumnWriter] = None
+        self._game_writer: Optional[_ColumnWriter] = None
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            self._shot_writer = _ColumnWriter(os.path.join(output_dir, f"shots.{output_format}"), SHOT_COLUMNS)
+            self._game_writer = _ColumnWriter(os.path.join(output_dir, f"games.{output_format}"), GAME_COLUMNS,
+                                              {"end_reason": self._end_reasons})
+
+        self.games = 0
+        self.shots = 0
+        self._totals = {name: 0.0 for name in ("pocketed", "cue_pocketed", "fouls", "duration", "decide_duration",
+                                               "break_pocketed", "break_foul", "break_scratch")}
+        self._max_decide_duration = 0.0
+        self._end_reason_counts = np.zeros(0, dtype=np.int64)
+        self.param_histograms = {name: np.zeros(len(edges) + 1, dtype=np.int64) for name, edges in PARAM_BINS.items()}
+        self._game_shots: list[ShotRecord] = []
+
+    def add_game(self, result: GameResult):
+        for shot_number, shot in enumerate(result.shots):
+            self._add_shot_row(result.game_number, shot_number, shot)
+        self._add_game_row(result)
+
+    def add_games(self, results: Iterable[GameResult]):
+        # Meant for GameRunner.iter_games, which hands over each game as soon as it is played
+        for result in results:
+            self.add_game(result)
+
+    def add_shot(self, game_number: int, shot_number: int, shot: ShotRecord):
+        # Streams one shot as soon as it is played; end_game then adds the row of the game these shots belong to
+        self._add_shot_row(game_number, shot_number, shot)
+        self._game_shots.append(shot)
+
+    def end_game(self, game_number: int, end_reason: str):
+        self._add_game_row(GameResult(game_number, self._game_shots, end_reason))
+        self._game_shots = []
+
+    def flush(self):
+        self._flush_shots()
+        self._flush_games()
+
+    def close(self):
+        self.flush()
+        for writer in (self._shot_writer, self._game_writer):
+            if writer is not None:
+                writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def summary(self) -> dict:
+        # Totals of everything added so far, including rows not yet written
+        self.flush()
+        shots, games = max(self.shots, 1), max(self.games, 1)
+        return {
+            "games": self.games,
+            "shots": self.shots,
+            "shots_per_game": self.shots / games,
+            "pocketed_per_shot": self._totals["pocketed"] / shots,
+            "fouls_per_shot": self._totals["fouls"] / shots,
+            "cue_pocketed_per_shot": self._totals["cue_pocketed"] / shots,
+            "break_pocketed_per_game": self._totals["break_pocketed"] / games,
+            "break_foul_rate": self._totals["break_foul"] / games,
+            "break_scratch_rate": self._totals["break_scratch"] / games,
+            "mean_shot_duration": self._totals["duration"] / shots,
+            "mean_decide_duration": self._totals["decide_duration"] / shots,
+            "max_decide_duration": self._max_decide_duration,
+            "end_reasons": dict(zip(self._end_reasons, self._end_reason_counts.tolist())),
+        }
+
+    def _add_shot_row(self, game_number: int, shot_number: int, shot: ShotRecord):
+        object_balls = sum(1 for ball, _ in shot.pocketed if ball != ff.Ball.CUE)
+        cue_pocketed = any(ball == ff.Ball.CUE for ball, _ in shot.pocketed)
+        self._shots.append((game_number, shot_number, *shot.params, shot.duration, shot.decide_duration,
+                            object_balls, cue_pocketed, len(shot.fouls),
+                            -1 if shot.first_contact is None else shot.first_contact))
+        if self._shots.is_full:
+            self._flush_shots()
+
+    def _add_game_row(self, result: GameResult):
+        break_shot = result.shots[0] if result.shots else None
+        self._games.append((result.game_number, len(result.shots),
+                            sum(1 for ball, _ in result.pocketed if ball != ff.Ball.CUE), len(result.fouls),
+                            sum(1 for ball, _ in break_shot.pocketed if ball != ff.Ball.CUE) if break_shot else 0,
+                            bool(break_shot and break_shot.fouls),
+                            bool(break_shot and any(ball == ff.Ball.CUE for ball, _ in break_shot.pocketed)),
+                            self._get_end_reason_code(result.termination_reason)))
+        if self._games.is_full:
+            self._flush_games()
+
+    def _get_end_reason_code(self, end_reason: str) -> int:
+        if end_reason not in self._end_reasons:
+            self._end_reasons.append(end_reason)
+        return self._end_reasons.index(end_reason)
+
+    def _flush_shots(self):
+        if self._shots.length == 0:
+            return
+        chunk = self._shots.take()
+        self.shots += len(chunk["game"])
+        for name in ("pocketed", "cue_pocketed", "fouls", "duration", "decide_duration"):
+            self._totals[name] += float(chunk[name].sum())
+        self._max_decide_duration = max(self._max_decide_duration, float(chunk["decide_duration"].max()))
+        for name, edges in PARAM_BINS.items():
+            values = chunk[name]
+            self.param_histograms[name] += np.concatenate(([np.count_nonzero(values < edges[0])],
+                                                           np.histogram(values, edges)[0],
+                                                           [np.count_nonzero(values > edges[-1])]))
+
+        if self._shot_writer is not None:
+            self._shot_writer.write(chunk)
+
+    def _flush_games(self):
+        if self._games.length == 0:
+            return
+        chunk = self._games.take()
+        self.games += len(chunk["game"])
+        for name in ("break_pocketed", "break_foul", "break_scratch"):
+            self._totals[name] += float(chunk[name].sum())
+        counts = np.bincount(chunk["end_reason"], minlength=len(self._end_reasons))
+        self._end_reason_counts = np.pad(self._end_reason_counts, (0, len(counts) - len(self._end_reason_counts)))
+        self._end_reason_counts += counts
+
+        if self._game_writer is not None:
+            self._game_writer.write(chunk)
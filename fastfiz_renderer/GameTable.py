@@ -1,26 +1,35 @@
+from __future__ import annotations
+
+import math
 from typing import Tuple
 
-import fastfiz as ff
+import numpy as np
 from p5 import *
+from p5.core import p5 as p5_core
+import skia
 import vectormath as vmath
 from vectormath import Vector2
 
+from .AimPredictor import AimPrediction
+from .FastFizCompat import ff
+from .FrameFeed import FrameFeed
 from .GameBall import GameBall
+from .PositionHeatmap import PositionHeatmap
+from .ShotRecording import ShotRecording
+from .ShotTimeline import ShotTimeline
+from .TableGeometry import TableGeometry
+
 
+class GameTable(TableGeometry):
+    # Wood, rails, markings and pockets are identical for every table of the same size, so they are recorded once
+    # and shared between instances until the scaling or a display mode changes
+    _static_layer: Optional[Tuple[tuple, skia.Picture]] = None
 
-class GameTable:
     def __init__(self, width: float, length: float, side_pocket_width: float, corner_pocket_width: float,
                  rolling_friction_const: float, sliding_friction_const: float, gravitational_const: float,
-                 game_balls: list[GameBall], shot_speed_factor: float):
-        self.wood_width = width / 10
-        self.rail_width = width / 30
-        self.width = width + 2 * self.wood_width + 2 * self.rail_width
-        self.length = length + 2 * self.wood_width + 2 * self.rail_width
-        self.board_width = width
-        self.board_length = length
-        self.side_pocket_width = side_pocket_width
-        self.corner_pocket_width = corner_pocket_width
-        self.board_pos = self.rail_width + self.wood_width
+                 game_balls: list[GameBall], shot_speed_factor: float, clock: Callable[[], float] = time.time):
+        super().__init__(width, length, side_pocket_width, corner_pocket_width, rolling_friction_const,
+                         sliding_friction_const, gravitational_const)
 
         self.wood_color = (103, 92, 80)
         self.rail_color = (0, 46, 30)
@@ -31,18 +40,39 @@ class GameTable:
         self.white_color = (255, 255, 255)
         self.black_color = (0, 0, 0)
 
-        self.rolling_friction_const = rolling_friction_const
-        self.sliding_friction_const = sliding_friction_const
-        self.gravitational_const = gravitational_const
         self.game_balls = game_balls
 
-        self._shot_queue: list[Tuple[ff.ShotParams, ff.Shot]] = []
-        self._active_shot: Optional[ff.Shot] = None
+        self._shot_queue: list[Tuple[ff.ShotParams, ShotTimeline]] = []
+        self._active_shot: Optional[ShotTimeline] = None
         self._active_shot_start_time: float = 0
         self._shot_speed_factor = shot_speed_factor
+        self._clock = clock
+        self._started_shot_count: int = 0
+
+        # Ball paths of candidate shots, drawn translucently under the balls until the next shot starts
+        self._ghosts: list[dict[int, list[Tuple[float, float]]]] = []
+        self._ghost_layer: Optional[Tuple[tuple, skia.Picture]] = None
+
+        # Accumulated ball positions, drawn as one image over the board and rebuilt when the heatmap changes
+        self._heatmap: Optional[PositionHeatmap] = None
+        self._heatmap_group: Optional[str] = None
+        self._heatmap_layer: Optional[Tuple[tuple, skia.Image]] = None
+
+        # Where the shot being aimed in grab mode would send the balls, drawn over the board
+        self._aim_preview: Optional[AimPrediction] = None
+
+        # Scratch buffers for exchanging frames with a FrameFeed, and the last frame shown from one
+        self._feed_positions: Optional[np.ndarray] = None
+        self._feed_states: Optional[np.ndarray] = None
+        self._feed_frame: int = -1
+
+        # What draw_changes last put on the surface
+        self._drawn_key: Optional[tuple] = None
+        self._drawn_balls: dict[int, tuple] = dict()
 
     @classmethod
-    def from_table_state(cls, table_state: ff.TableState, shot_speed_factor: float):
+    def from_table_state(cls, table_state: ff.TableState, shot_speed_factor: float,
+                         clock: Callable[[], float] = time.time):
         game_balls = []
 
         for i in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
@@ -53,13 +83,244 @@ class GameTable:
         table: ff.Table = table_state.getTable()
 
         return cls(table.TABLE_WIDTH, table.TABLE_LENGTH, table.SIDE_POCKET_WIDTH, table.CORNER_POCKET_WIDTH,
-                   table.MU_ROLLING, table.MU_SLIDING, table.g, game_balls, shot_speed_factor)
+                   table.MU_ROLLING, table.MU_SLIDING, table.g, game_balls, shot_speed_factor, clock)
+
+    @classmethod
+    def from_recording(cls, recording: ShotRecording, shot_index: int, shot_speed_factor: float,
+                       clock: Callable[[], float] = time.time):
+        header = recording.header
+        shot = recording[shot_index]
+        game_balls = []
+
+        for i in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
+            pos_x, pos_y = shot.start_positions[i].tolist()
+            game_balls.append(GameBall(float(header["ball_radius"]), i, vmath.Vector2(pos_x, pos_y),
+                                       int(shot.start_states[i])))
+
+        return cls(float(header["table_width"]), float(header["table_length"]), float(header["side_pocket_width"]),
+                   float(header["corner_pocket_width"]), float(header["rolling_friction_const"]),
+                   float(header["sliding_friction_const"]), float(header["gravitational_const"]), game_balls,
+                   shot_speed_factor, clock)
+
+    @classmethod
+    def from_feed(cls, feed: FrameFeed, clock: Callable[[], float] = time.time):
+        # A table driven by another process; follow_feed moves its balls instead of update
+        geometry = feed.get_geometry()
+        radius = float(feed.header["ball_radius"])
+        game_balls = [GameBall(radius, i, vmath.Vector2(0, 0), ff.Ball.NOTINPLAY)
+                      for i in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1)]
+
+        game_table = cls(geometry.board_width, geometry.board_length, geometry.side_pocket_width,
+                         geometry.corner_pocket_width, geometry.rolling_friction_const,
+                         geometry.sliding_friction_const, geometry.gravitational_const, game_balls, 1, clock)
+        game_table.follow_feed(feed)
+        return game_table
+
+    def follow_feed(self, feed: FrameFeed, attempts: int = 4) -> bool:
+        # Shows the newest frame in the feed; returns whether there was a new one. A writer that keeps lapping the
+        # reader leaves the last frame shown until the next call.
+        positions, states = self._get_feed_buffers()
+        for _ in range(attempts):
+            written = feed.written
+            if written == 0 or written - 1 == self._feed_frame:
+                return False
+            if feed.read_into(written - 1, positions, states):
+                self._feed_frame = written - 1
+                self.set_ball_states(positions, states)
+                return True
+        return False
+
+    def write_feed(self, feed: FrameFeed, game_number: int = 0):
+        feed.write(self._clock(), game_number, self._started_shot_count, *self.get_ball_states())
+
+    def get_ball_states(self) -> Tuple[np.ndarray, np.ndarray]:
+        # The balls as shown, in scratch buffers that the next call overwrites
+        positions, states = self._get_feed_buffers()
+        for ball in self.game_balls:
+            positions[ball.number] = (ball.position.x, ball.position.y)
+            states[ball.number] = ball.state
+        return positions, states
+
+    def _get_feed_buffers(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._feed_positions is None:
+            self._feed_positions = np.empty((ShotTimeline.ball_count, 2))
+            self._feed_states = np.empty(ShotTimeline.ball_count, dtype=np.int32)
+        return self._feed_positions, self._feed_states
 
     def draw(self, scaling=200, horizontal_mode=False, stroke_mode=False):
         if horizontal_mode:
             rotate(PI / 2)
             translate(0, -int(self.length * scaling))
 
+        self._draw_layers(scaling, horizontal_mode, stroke_mode)
+        self._drawn_key = self._get_drawn_key(scaling, horizontal_mode, stroke_mode)
+        self._drawn_balls = self._get_ball_draw_states()
+
+    def draw_changes(self, scaling=200, horizontal_mode=False, stroke_mode=False) -> bool:
+        # For surfaces that keep the previous frame: redraws nothing when nothing changed, only the areas around
+        # balls that moved or changed while few did, and everything after a display mode change
+        ball_states = self._get_ball_draw_states()
+        changed = [number for number, state in ball_states.items() if self._drawn_balls.get(number) != state]
+        full_redraw = (self._drawn_key != self._get_drawn_key(scaling, horizontal_mode, stroke_mode)
+                       or len(changed) > len(ball_states) // 2)
+
+        if not full_redraw and not changed:
+            return False
+
+        push()
+        if full_redraw:
+            self.draw(scaling, horizontal_mode, stroke_mode)
+        else:
+            if horizontal_mode:
+                rotate(PI / 2)
+                translate(0, -int(self.length * scaling))
+
+            # Old and new spot of every changed ball; the clip follows the table transform
+            dirty_area = skia.Path()
+            board_offset = int(self.board_pos * scaling)
+            balls = {ball.number: ball for ball in self.game_balls}
+            for number in changed:
+                # Stroke mode labels can reach past the ball; 4 pixels cover antialiasing and the drag outline
+                label_reach = balls[number].get_label_reach(scaling) if stroke_mode else 0
+                for ball_state in (self._drawn_balls.get(number), ball_states[number]):
+                    if ball_state is None:
+                        continue
+                    x, y = ball_state[0] * scaling, ball_state[1] * scaling
+                    radius = max(ball_state[4] * scaling, label_reach) + 4
+                    dirty_area.addRect(skia.Rect.MakeLTRB(math.floor(board_offset + x - radius),
+                                                          math.floor(board_offset + y - radius),
+                                                          math.ceil(board_offset + x + radius),
+                                                          math.ceil(board_offset + y + radius)))
+            p5_core.renderer.canvas.clipPath(dirty_area)
+
+            self._draw_layers(scaling, horizontal_mode, stroke_mode)
+            self._drawn_balls = ball_states
+        pop()
+
+        return True
+
+    def invalidate(self):
+        self._drawn_key = None
+
+    def _get_drawn_key(self, scaling, horizontal_mode, stroke_mode) -> tuple:
+        heatmap_version = self._heatmap.version if self._heatmap is not None else None
+        return scaling, horizontal_mode, stroke_mode, heatmap_version
+
+    def _get_ball_draw_states(self) -> dict[int, tuple]:
+        return {ball.number: (ball.position.x, ball.position.y, ball.state, ball.is_being_dragged, ball.radius)
+                for ball in self.game_balls}
+
+    def _draw_layers(self, scaling, horizontal_mode, stroke_mode):
+        p5_core.renderer.canvas.drawPicture(self._get_static_layer(scaling, horizontal_mode, stroke_mode))
+
+        if stroke_mode:
+            stroke(*self.black_color)
+            strokeWeight(1)
+        else:
+            noStroke()
+
+        # Balls
+        push()
+        translate(int(self.board_pos * scaling),
+                  int(self.board_pos * scaling))
+        if self._heatmap is not None:
+            p5_core.renderer.canvas.drawImageRect(self._get_heatmap_layer(),
+                                                  skia.Rect(self.board_width * scaling, self.board_length * scaling),
+                                                  skia.Paint(AntiAlias=True))
+        if self._ghosts:
+            p5_core.renderer.canvas.drawPicture(self._get_ghost_layer(scaling, stroke_mode))
+        if self._aim_preview is not None:
+            self._draw_aim_preview(scaling, stroke_mode)
+        for ball in self.game_balls:
+            ball.draw(scaling, horizontal_mode, stroke_mode)
+        pop()
+
+    def _get_static_layer(self, scaling, horizontal_mode, stroke_mode) -> skia.Picture:
+        key = (self.width, self.length, self.side_pocket_width, self.corner_pocket_width, scaling, horizontal_mode,
+               stroke_mode)
+
+        if GameTable._static_layer is None or GameTable._static_layer[0] != key:
+            recorder = skia.PictureRecorder()
+            renderer = p5_core.renderer
+            screen_canvas = renderer.canvas
+            renderer.canvas = recorder.beginRecording(skia.Rect(self.width * scaling, self.length * scaling))
+            try:
+                self._draw_static(scaling, stroke_mode)
+            finally:
+                renderer.canvas = screen_canvas
+            GameTable._static_layer = (key, recorder.finishRecordingAsPicture())
+
+        return GameTable._static_layer[1]
+
+    def _get_ghost_layer(self, scaling, stroke_mode) -> skia.Picture:
+        key = (scaling, stroke_mode)
+
+        if self._ghost_layer is None or self._ghost_layer[0] != key:
+            recorder = skia.PictureRecorder()
+            canvas = recorder.beginRecording(skia.Rect(self.board_width * scaling, self.board_length * scaling))
+            balls = {ball.number: ball for ball in self.game_balls}
+
+            for rank, trajectories in enumerate(self._ghosts):
+                # The best candidate is the most opaque
+                alpha = max(40, 150 - rank * 35)
+                for number, points in trajectories.items():
+                    ball = balls[number]
+                    color = skia.Color(*(self.black_color if stroke_mode else ball.color), alpha)
+                    path = skia.Path()
+                    path.moveTo(points[0][0] * scaling, points[0][1] * scaling)
+                    for x, y in points[1:]:
+                        path.lineTo(x * scaling, y * scaling)
+                    canvas.drawPath(path, skia.Paint(Color=color, Style=skia.Paint.kStroke_Style, AntiAlias=True,
+                                                     StrokeWidth=max(1.0, ball.radius * scaling * 0.5)))
+                    end_x, end_y = points[-1]
+                    canvas.drawCircle(end_x * scaling, end_y * scaling, ball.radius * scaling,
+                                      skia.Paint(Color=color, AntiAlias=True))
+
+            self._ghost_layer = (key, recorder.finishRecordingAsPicture())
+
+        return self._ghost_layer[1]
+
+    def _draw_aim_preview(self, scaling, stroke_mode):
+        canvas = p5_core.renderer.canvas
+        preview = self._aim_preview
+        balls = {ball.number: ball for ball in self.game_balls}
+        cue_color = self.black_color if stroke_mode else self.white_color
+
+        def draw_line(line, color, alpha, dashed=False):
+            (start_x, start_y), (end_x, end_y) = line
+            paint = skia.Paint(Color=skia.Color(*color, alpha), Style=skia.Paint.kStroke_Style, AntiAlias=True,
+                               StrokeWidth=max(1.0, scaling / 150))
+            if dashed:
+                paint.setPathEffect(skia.DashPathEffect.Make([scaling / 40, scaling / 60], 0))
+            canvas.drawLine(start_x * scaling, start_y * scaling, end_x * scaling, end_y * scaling, paint)
+
+        draw_line(preview.cue_path, cue_color, 200)
+        if preview.first_contact is None:
+            return
+
+        # Ghost ball where the cue ball touches the first ball
+        radius = balls[ff.Ball.CUE].radius
+        ghost_x, ghost_y = preview.cue_path[1]
+        canvas.drawCircle(ghost_x * scaling, ghost_y * scaling, radius * scaling,
+                          skia.Paint(Color=skia.Color(*cue_color, 200), Style=skia.Paint.kStroke_Style,
+                                     AntiAlias=True, StrokeWidth=max(1.0, scaling / 150)))
+
+        object_color = self.black_color if stroke_mode else balls[preview.first_contact].color
+        draw_line(preview.object_path, object_color, 220)
+        if preview.cue_deflection is not None:
+            draw_line(preview.cue_deflection, cue_color, 140, dashed=True)
+
+    def _get_heatmap_layer(self) -> skia.Image:
+        key = (id(self._heatmap), self._heatmap.version, self._heatmap_group)
+
+        if self._heatmap_layer is None or self._heatmap_layer[0] != key:
+            image = skia.Image.fromarray(self._heatmap.to_rgba(self._heatmap_group),
+                                         colorType=skia.kRGBA_8888_ColorType, alphaType=skia.kUnpremul_AlphaType)
+            self._heatmap_layer = (key, image)
+
+        return self._heatmap_layer[1]
+
+    def _draw_static(self, scaling, stroke_mode):
         # Wood
         fill(*self.wood_color) if not stroke_mode else fill(*self.white_color)
         rect(0, 0, self.width * scaling, self.length * scaling)
@@ -220,39 +481,100 @@ class GameTable:
                            ((self.wood_width + offset) * scaling, (self.length - self.wood_width) * scaling))  # SW
         draw_corner_pocket(PI / 4 * 7, (self.wood_width * scaling, (self.wood_width + offset) * scaling))  # NW
 
-        noStroke() if not stroke_mode else stroke(*self.black_color)
-
-        # Balls
-        push()
-        translate(int(self.board_pos * scaling),
-                  int(self.board_pos * scaling))
-        for ball in self.game_balls:
-            ball.draw(scaling, horizontal_mode, stroke_mode)
-        pop()
-
     def update(self, shot_requester: Optional[Callable[None, None]]):
+        time_since_shot_start = self.advance(shot_requester)
+        if time_since_shot_start is not None:
+            self.apply_positions(*self._active_shot.positions_at(time_since_shot_start))
+
+    def advance(self, shot_requester: Optional[Callable[None, None]]) -> Optional[float]:
+        # Starts and finishes shots; returns the time into the active shot when the balls need to be moved
         if self._active_shot is None:
             if self._shot_queue:
                 self._active_shot = self._shot_queue.pop(0)[1]
-                self._active_shot_start_time = time.time()
+                self._active_shot_start_time = self._clock()
+                self._started_shot_count += 1
+                self.clear_ghosts()
+                self.clear_aim_preview()
             else:
                 if shot_requester:
                     shot_requester()
-                return
+                return None
 
-        time_since_shot_start = (time.time() - self._active_shot_start_time) * self._shot_speed_factor
+        time_since_shot_start = (self._clock() - self._active_shot_start_time) * self._shot_speed_factor
 
-        if time_since_shot_start > self._active_shot.getDuration():
+        if time_since_shot_start > self._active_shot.duration:
             for ball in self.game_balls:
-                ball.force_to_end_of_shot_pos(self._active_shot)
+                ball_timeline = self._active_shot.get_ball_timeline(ball.number)
+                if ball_timeline:
+                    ball.force_to_end_of_shot_pos(ball_timeline)
             self._active_shot = None
-            return
+            return None
 
-        else:
-            for ball in self.game_balls:
-                ball.update(time_since_shot_start, self._active_shot, self.sliding_friction_const,
-                            self.rolling_friction_const,
-                            self.gravitational_const)
+        return time_since_shot_start
+
+    def apply_positions(self, positions: np.ndarray, states: np.ndarray, moved: np.ndarray):
+        positions, states, moved = positions.tolist(), states.tolist(), moved.tolist()
+        for ball in self.game_balls:
+            if moved[ball.number]:
+                ball.position = Vector2(*positions[ball.number])
+                ball.state = states[ball.number]
+
+    def set_ball_states(self, positions: np.ndarray, states: np.ndarray):
+        positions, states = positions.tolist(), states.tolist()
+        for ball in self.game_balls:
+            ball.position = Vector2(*positions[ball.number])
+            ball.state = states[ball.number]
+
+    @property
+    def active_shot(self) -> Optional[ShotTimeline]:
+        return self._active_shot
+
+    @property
+    def is_idle(self) -> bool:
+        return self._active_shot is None and not self._shot_queue
+
+    @property
+    def queued_shot_count(self) -> int:
+        return len(self._shot_queue)
+
+    def set_ghosts(self, ghosts: list[dict[int, list[Tuple[float, float]]]]):
+        self._ghosts = ghosts
+        self._ghost_layer = None
+        self.invalidate()
+
+    def clear_ghosts(self):
+        self.set_ghosts([])
+
+    def set_aim_preview(self, preview: Optional[AimPrediction]):
+        # Lines cross the whole board, so the next frame is redrawn in full
+        self._aim_preview = preview
+        self.invalidate()
+
+    def clear_aim_preview(self):
+        if self._aim_preview is not None:
+            self.set_aim_preview(None)
+
+    def set_heatmap(self, heatmap: Optional[PositionHeatmap], group: Optional[str] = None):
+        # Shows the heatmap of one group of balls, or of all of them, under the balls; None hides it
+        self._heatmap = heatmap
+        self._heatmap_group = group
+        self._heatmap_layer = None
+        self.invalidate()
+
+    def clear_queued_shots(self):
+        self._shot_queue.clear()
+
+    def cancel_shots(self):
+        # Stops the active shot where it is and drops the queued ones, e.g. before the balls are put elsewhere
+        self._shot_queue.clear()
+        self._active_shot = None
+        self.clear_ghosts()
+        self.clear_aim_preview()
 
     def add_shot(self, params: ff.ShotParams, shot: ff.Shot):
-        self._shot_queue.append((params, shot))
+        timeline = ShotTimeline.from_shot(shot, self.sliding_friction_const, self.rolling_friction_const,
+                                          self.gravitational_const)
+        self.add_timeline(params, timeline)
+
+    def add_timeline(self, params, timeline: ShotTimeline):
+        self._shot_queue.append((params, timeline))
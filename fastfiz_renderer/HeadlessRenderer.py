@@ -0,0 +1,147 @@
+from abc import ABC, abstractmethod
+import builtins
+import os
+import subprocess
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+from p5 import *
+from p5.core import p5 as p5_core
+from p5.sketch.Skia2DRenderer.renderer2d import SkiaRenderer
+import skia
+
+
+class VirtualClock:
+    def __init__(self, frames_per_second: int, start_time: float = 0):
+        self.frame_duration = 1 / frames_per_second
+        self.current_time = start_time
+
+    def time(self) -> float:
+        return self.current_time
+
+    def tick(self):
+        self.current_time += self.frame_duration
+
+
+class HeadlessRenderer:
+    # p5 draws through one global renderer and style state, so renderers on different threads take turns
+    _render_lock = threading.Lock()
+
+    def __init__(self, width: int, height: int, stroke_mode: bool = False):
+        self.width = width
+        self.height = height
+        self.surface = skia.Surface(width, height)
+        self._renderer = SkiaRenderer()
+        self._renderer.initialize_renderer(self.surface.getCanvas(), skia.Paint(), skia.Path())
+        self._stroke_mode = stroke_mode
+
+    def activate(self):
+        # Mirrors what p5.run sets up for the skia renderer, minus the window
+        builtins.current_renderer = "skia"
+        p5_core.mode = "P2D"
+        p5_core.renderer = self._renderer
+        ellipseMode(CENTER)
+        textAlign(CENTER, CENTER)
+        if not self._stroke_mode:
+            noStroke()
+
+    def render(self, draw: Callable[[], None]) -> np.ndarray:
+        with HeadlessRenderer._render_lock:
+            if p5_core.renderer is not self._renderer:
+                self.activate()
+            canvas = self._renderer.canvas
+            canvas.clear(skia.ColorWHITE)
+            canvas.save()
+            try:
+                draw()
+            finally:
+                canvas.restore()
+            return self.surface.makeImageSnapshot().toarray(colorType=skia.kRGBA_8888_ColorType)
+
+
+class RetainedSurface:
+    # Keeps the table between frames so a window only redraws what changed, then copies it onto the window canvas.
+    # p5's skia sketch puts the window contents back after every buffer swap, so the copy is skipped when nothing
+    # changed, unless the window got a new surface (after a resize) or something else is drawn over the copy each
+    # frame, like the profiler overlay.
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.surface = skia.Surface(width, height)
+        self.surface.getCanvas().clear(skia.ColorWHITE)
+        self._presented_surface = None
+        self._was_forced = False
+
+    def draw(self, draw: Callable[[], bool], force_present: bool = False) -> bool:
+        renderer = p5_core.renderer
+        window_canvas = renderer.canvas
+        canvas = self.surface.getCanvas()
+        renderer.canvas = canvas
+        canvas.save()
+        try:
+            changed = draw()
+        finally:
+            canvas.restore()
+            renderer.canvas = window_canvas
+
+        # The frame after a forced one is copied too, to clear what was drawn over it
+        window_surface = p5_core.sketch.surface
+        if changed or force_present or self._was_forced or window_surface is not self._presented_surface:
+            self.surface.draw(window_canvas, 0, 0)
+            self._presented_surface = window_surface
+        self._was_forced = force_present
+        return changed
+
+
+class FrameSink(ABC):
+    @abstractmethod
+    def write(self, frame: np.ndarray):
+        pass
+
+    def close(self):
+        pass
+
+
+class PngSequenceSink(FrameSink):
+    def __init__(self, directory: str, file_pattern: str = "frame_{:06d}.png", first_frame_number: int = 0):
+        self.directory = directory
+        self.file_pattern = file_pattern
+        self.first_frame_number = first_frame_number
+        self.frame_count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame: np.ndarray):
+        image = skia.Image.fromarray(np.ascontiguousarray(frame), colorType=skia.kRGBA_8888_ColorType)
+        file_name = self.file_pattern.format(self.first_frame_number + self.frame_count)
+        image.save(os.path.join(self.directory, file_name), skia.kPNG)
+        self.frame_count += 1
+
+
+class EncoderPipeSink(FrameSink):
+    def __init__(self, output_path: str, frames_per_second: int, command: Optional[list[str]] = None):
+        self.output_path = output_path
+        self.frames_per_second = frames_per_second
+        self.command = command
+        self.frame_count = 0
+        self._process: Optional[subprocess.Popen] = None
+
+    def write(self, frame: np.ndarray):
+        if self._process is None:
+            # The encoder is started on the first frame, once the frame size is known
+            height, width = frame.shape[:2]
+            command = self.command or ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                                       "-s", f"{width}x{height}", "-r", str(self.frames_per_second), "-i", "-",
+                                       "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p",
+                                       self.output_path]
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+        self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        self.frame_count += 1
+
+    def close(self):
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise Exception(f"Encoder exited with code {self._process.returncode}")
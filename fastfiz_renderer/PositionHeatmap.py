@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .FastFizCompat import ff
+from .ReplayTimeline import ReplayTimeline
+from .ShotRecording import ShotRecording
+from .TableGeometry import TableGeometry
+
+_BALL_COUNT = ff.Ball.FIFTEEN + 1
+_OFF_TABLE_STATES = (ff.Ball.NOTINPLAY, ff.Ball.POCKETED_SW, ff.Ball.POCKETED_W, ff.Ball.POCKETED_NW,
+                     ff.Ball.POCKETED_NE, ff.Ball.POCKETED_E, ff.Ball.POCKETED_SE)
+
+
+class PositionHeatmap:
+    # Counts how often balls were seen in each cell of the board, one 2D histogram per group of balls. Only the
+    # counts are kept, so any number of games can be streamed through it.
+    DEFAULT_GROUPS = {"cue": (ff.Ball.CUE,), "solids": tuple(range(ff.Ball.ONE, ff.Ball.SEVEN + 1)),
+                      "eight": (ff.Ball.EIGHT,), "stripes": tuple(range(ff.Ball.NINE, ff.Ball.FIFTEEN + 1))}
+
+    def __init__(self, geometry: TableGeometry, bins: Tuple[int, int] = (64, 128),
+                 groups: Optional[dict[str, Tuple[int, ...]]] = None):
+        self.geometry = geometry
+        self.bins = bins
+        self.groups = dict(groups or PositionHeatmap.DEFAULT_GROUPS)
+        self.counts = np.zeros((len(self.groups), bins[1], bins[0]), dtype=np.int64)
+        self.samples = 0
+        # Bumped on every change, so drawn layers know when to rebuild
+        self.version = 0
+
+        self._membership = np.zeros((len(self.groups), _BALL_COUNT), dtype=bool)
+        for group_index, numbers in enumerate(self.groups.values()):
+            self._membership[group_index, list(numbers)] = True
+
+    def add_positions(self, positions: np.ndarray, states: np.ndarray):
+        # Any number of frames at once, shaped (..., 16, 2) and (..., 16); pocketed balls are not counted
+        positions = positions.reshape(-1, _BALL_COUNT, 2)
+        states = states.reshape(-1, _BALL_COUNT)
+        on_table = ~np.isin(states, _OFF_TABLE_STATES) & ~np.isnan(positions).any(axis=2)
+
+        bins_x, bins_y = self.bins
+        cell_x = np.clip((positions[..., 0] / self.geometry.board_width * bins_x).astype(np.int64), 0, bins_x - 1)
+        cell_y = np.clip((positions[..., 1] / self.geometry.board_length * bins_y).astype(np.int64), 0, bins_y - 1)
+        cells = cell_y * bins_x + cell_x
+
+        for group_index in range(len(self.groups)):
+            selected = cells[on_table & self._membership[group_index]]
+            self.counts[group_index] += np.bincount(selected, minlength=bins_x * bins_y).reshape(bins_y, bins_x)
+
+        self.samples += len(positions)
+        self.version += 1
+
+    def add_table_state(self, table_state: ff.TableState):
+        positions = np.empty((_BALL_COUNT, 2))
+        states = np.empty(_BALL_COUNT, dtype=np.int64)
+        for number in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
+            ball: ff.Ball = table_state.getBall(number)
+            pos = ball.getPos()
+            positions[number] = (pos.x, pos.y)
+            states[number] = ball.getState()
+        self.add_positions(positions, states)
+
+    def add_recording(self, recording: ShotRecording, samples_per_second: Optional[float] = None):
+        # Where the balls came to rest after every shot, or with a sample rate, where they were over time
+        for game_number in recording.game_numbers().tolist():
+            replay = ReplayTimeline.from_recording(recording, game_number)
+            if samples_per_second is None:
+                times = replay.shot_start_times[1:].tolist() + [replay.duration]
+            else:
+                times = np.arange(0, replay.duration, 1 / samples_per_second).tolist()
+
+            frames = [replay.state_at(time) for time in times]
+            if frames:
+                self.add_positions(np.stack([positions for positions, _ in frames]),
+                                   np.stack([states for _, states in frames]))
+
+    def merge(self, other):
+        # Combines heatmaps accumulated separately, e.g. in worker processes
+        if (other.bins != self.bins or list(other.groups) != list(self.groups)
+                or not np.array_equal(other._membership, self._membership)):
+            raise Exception("Only heatmaps with the same bins and groups can be merged!")
+        if (other.geometry.board_width, other.geometry.board_length) != (self.geometry.board_width,
+                                                                         self.geometry.board_length):
+            raise Exception("Only heatmaps of the same table size can be merged!")
+        self.counts += other.counts
+        self.samples += other.samples
+        self.version += 1
+
+    def get_counts(self, group: Optional[str] = None) -> np.ndarray:
+        if group is None:
+            return self.counts.sum(axis=0)
+        return self.counts[list(self.groups).index(group)]
+
+    def to_rgba(self, group: Optional[str] = None, color: Tuple[int, int, int] = (255, 80, 0),
+                max_alpha: int = 200) -> np.ndarray:
+        # Log scaled, so rarely visited cells stay visible next to the hot spots
+        counts = self.get_counts(group)
+        intensity = np.log1p(counts.astype(np.float64))
+        if intensity.max() > 0:
+            intensity /= intensity.max()
+
+        rgba = np.zeros((*counts.shape, 4), dtype=np.uint8)
+        rgba[..., 0] = color[0]
+        rgba[..., 1] = (color[1] + (255 - color[1]) * (1 - intensity)).astype(np.uint8)
+        rgba[..., 2] = color[2]
+        rgba[..., 3] = (intensity * max_alpha).astype(np.uint8)
+        return rgba
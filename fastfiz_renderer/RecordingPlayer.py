@@ -0,0 +1,201 @@
+from typing import Tuple
+
+import numpy as np
+from p5 import *
+
+from .GameTable import GameTable
+from .HeadlessRenderer import FrameSink, HeadlessRenderer, RetainedSurface, VirtualClock
+from .ReplayTimeline import ReplayTimeline
+from .ShotRecording import ShotRecording
+from .SketchWindow import SketchWindow
+
+
+class RecordingPlayer:
+    def __init__(self, recording: ShotRecording, mac_mode=False, window_pos: Tuple[int, int] = (100, 100),
+                 frames_per_second: int = 60, scaling: int = 200, horizontal_mode: bool = False):
+        self._recording = recording
+        self._mac_mode: bool = mac_mode
+        self._window_pos: Tuple[int, int] = window_pos
+        self._frames_per_second: int = frames_per_second
+        self._scaling: int = scaling
+        self._horizontal_mode: bool = horizontal_mode
+        self._stroke_mode: bool = False
+
+        self._game_table: Optional[GameTable] = None
+        self._shot_indices: list[int] = []
+        self._next_shot: int = 0
+
+        self._replay: Optional[ReplayTimeline] = None
+        self._replay_time: float = 0
+        self._playback_speed: float = 1
+        self._paused: bool = False
+
+    def play_game(self, game_number: int, shot_speed_factor: float = 1):
+        self._load_game(game_number, shot_speed_factor, time.time)
+        frame_buffer = self._create_frame_buffer()
+
+        def _draw():
+            if self._is_finished():
+                SketchWindow.close()
+                return
+            self._game_table.update(self._queue_next_shot)
+            frame_buffer.draw(self._draw_changes)
+
+        def _key_released(event):
+            if event.key == "f" or event.key == "F":
+                self._stroke_mode = not self._stroke_mode
+
+        self._run_window(_draw, _key_released)
+
+    def review_event(self, event: np.void, playback_speed: float = 1):
+        # Opens the game of an EventIndex match, paused at the moment the event happened
+        game_number = int(event["game"])
+        shot_position = self._recording.game_shot_indices(game_number).tolist().index(int(event["shot"]))
+        self.review_game(game_number, playback_speed, shot_position, float(event["time"]), paused=True)
+
+    def review_game(self, game_number: int, playback_speed: float = 1, start_shot: int = 0, start_time: float = 0,
+                    paused: bool = False):
+        self._load_replay(game_number, playback_speed)
+        self.seek(self._replay.shot_start_time(start_shot) + start_time)
+        self._paused = paused
+        frame_buffer = self._create_frame_buffer()
+        last_frame_time = time.time()
+
+        def _draw():
+            nonlocal last_frame_time
+            now = time.time()
+            if not self._paused:
+                self.seek(self._replay_time + (now - last_frame_time) * self._playback_speed)
+            last_frame_time = now
+            frame_buffer.draw(self._draw_changes)
+
+        def _key_released(event):
+            if event.key == "SPACE":
+                self._paused = not self._paused
+            elif event.key == "RIGHT":
+                self.step_frames(1)
+            elif event.key == "LEFT":
+                self.step_frames(-1)
+            elif event.key == "UP":
+                self._playback_speed *= 2
+            elif event.key == "DOWN":
+                self._playback_speed /= 2
+            elif event.key == "b" or event.key == "B":
+                self._playback_speed = -self._playback_speed
+            elif event.key == "n" or event.key == "N":
+                self.seek_shot(self._replay.shot_at(self._replay_time) + 1)
+            elif event.key == "p" or event.key == "P":
+                self.seek_shot(self._replay.shot_at(self._replay_time) - 1)
+            elif event.key == "f" or event.key == "F":
+                self._stroke_mode = not self._stroke_mode
+
+        self._run_window(_draw, _key_released)
+
+    def export_replay(self, game_number: int, frame_sink: FrameSink, start_time: float = 0,
+                      end_time: Optional[float] = None, playback_speed: float = 1) -> int:
+        if playback_speed == 0:
+            raise Exception("Playback speed cannot be 0!")
+        self._load_replay(game_number, playback_speed)
+        end_time = self._replay.duration if end_time is None else self._replay.clamp(end_time)
+        renderer = HeadlessRenderer(*self._get_canvas_size(), stroke_mode=self._stroke_mode)
+        renderer.activate()
+
+        def _draw():
+            self._game_table.draw(self._scaling, self._horizontal_mode, self._stroke_mode)
+
+        # Negative speeds render the range backwards
+        frame_times = self._replay.frame_times(start_time, end_time, playback_speed, self._frames_per_second)
+        try:
+            for frame_time in frame_times.tolist():
+                self.seek(frame_time)
+                frame_sink.write(renderer.render(_draw))
+        finally:
+            frame_sink.close()
+
+        return len(frame_times)
+
+    def seek(self, replay_time: float):
+        self._replay_time = self._replay.clamp(replay_time)
+        self._game_table.set_ball_states(*self._replay.state_at(self._replay_time))
+
+    def seek_shot(self, shot_index: int):
+        self.seek(self._replay.shot_start_time(shot_index))
+
+    def step_frames(self, frames: int):
+        self._paused = True
+        self.seek(self._replay_time + frames / self._frames_per_second * abs(self._playback_speed))
+
+    def set_playback_speed(self, playback_speed: float):
+        self._playback_speed = playback_speed
+
+    def export_game(self, game_number: int, frame_sink: FrameSink, shot_speed_factor: float = 1) -> int:
+        clock = VirtualClock(self._frames_per_second)
+        self._load_game(game_number, shot_speed_factor, clock.time)
+        renderer = HeadlessRenderer(*self._get_canvas_size(), stroke_mode=self._stroke_mode)
+        renderer.activate()
+
+        def _draw():
+            self._game_table.update(self._queue_next_shot)
+            self._game_table.draw(self._scaling, self._horizontal_mode, self._stroke_mode)
+
+        frame_number = 0
+        try:
+            while not self._is_finished():
+                frame_sink.write(renderer.render(_draw))
+                clock.tick()
+                frame_number += 1
+        finally:
+            frame_sink.close()
+
+        return frame_number
+
+    def _run_window(self, draw: Callable[[], None], key_released: Callable):
+        width, length = self._get_canvas_size()
+
+        def _setup():
+            size(width, length)
+            ellipseMode(CENTER)
+            textAlign(CENTER, CENTER)
+            if not self._stroke_mode:
+                noStroke()
+
+        SketchWindow.run(draw, _setup, key_released, self._frames_per_second, self._window_pos)
+
+    def _create_frame_buffer(self) -> RetainedSurface:
+        # Idle frames, like a paused replay, only copy the retained table onto the window
+        return RetainedSurface(*self._game_table.get_canvas_size(self._get_draw_scaling(), self._horizontal_mode))
+
+    def _draw_changes(self) -> bool:
+        return self._game_table.draw_changes(self._get_draw_scaling(), self._horizontal_mode, self._stroke_mode)
+
+    def _get_draw_scaling(self) -> int:
+        return self._scaling * 2 if self._mac_mode else self._scaling
+
+    def _load_replay(self, game_number: int, playback_speed: float):
+        self._replay = ReplayTimeline.from_recording(self._recording, game_number)
+        self._shot_indices = self._recording.game_shot_indices(game_number).tolist()
+        self._game_table = GameTable.from_recording(self._recording, self._shot_indices[0], 1)
+        self._playback_speed = playback_speed
+        self._paused = False
+        self.seek(0)
+
+    def _load_game(self, game_number: int, shot_speed_factor: float, clock: Callable[[], float]):
+        self._shot_indices = self._recording.game_shot_indices(game_number).tolist()
+        if not self._shot_indices:
+            raise Exception(f"Game {game_number} is not in the recording!")
+
+        self._next_shot = 0
+        self._game_table = GameTable.from_recording(self._recording, self._shot_indices[0], shot_speed_factor, clock)
+
+    def _queue_next_shot(self):
+        # Shots are compiled one at a time as the table asks for them, so long games start instantly
+        if self._next_shot < len(self._shot_indices):
+            shot_index = self._shot_indices[self._next_shot]
+            self._game_table.add_timeline(self._recording[shot_index].params, self._recording.timeline(shot_index))
+            self._next_shot += 1
+
+    def _is_finished(self) -> bool:
+        return self._next_shot >= len(self._shot_indices) and self._game_table.is_idle
+
+    def _get_canvas_size(self) -> Tuple[int, int]:
+        return self._game_table.get_canvas_size(self._scaling, self._horizontal_mode)
@@ -0,0 +1,82 @@
+from typing import Tuple
+
+import numpy as np
+
+from .ShotRecording import ShotRecording
+from .ShotTimeline import ShotTimeline
+
+
+class ReplayTimeline:
+    def __init__(self, start_states: np.ndarray, start_positions: np.ndarray, shots: list[ShotTimeline]):
+        self.shots = shots
+        self.shot_start_times = np.concatenate(([0.0], np.cumsum([shot.duration for shot in shots])))[:-1]
+        self.duration = float(sum(shot.duration for shot in shots))
+
+        # Ball states at the start of every shot plus one entry for the end of the last shot, chained from the end
+        # positions of the balls each shot moved, so any instant is one shot evaluation away
+        self._shot_start_states = np.empty((len(shots) + 1, ShotTimeline.ball_count), dtype=np.int64)
+        self._shot_start_positions = np.empty((len(shots) + 1, ShotTimeline.ball_count, 2), dtype=np.float64)
+        self._shot_start_states[0] = start_states
+        self._shot_start_positions[0] = start_positions
+
+        for shot_index, shot in enumerate(shots):
+            states = self._shot_start_states[shot_index].copy()
+            positions = self._shot_start_positions[shot_index].copy()
+            for number, ball_timeline in shot.ball_timelines.items():
+                states[number] = ball_timeline.end_state
+                positions[number] = ball_timeline.end_position
+            self._shot_start_states[shot_index + 1] = states
+            self._shot_start_positions[shot_index + 1] = positions
+
+    @classmethod
+    def from_recording(cls, recording: ShotRecording, game_number: int):
+        shot_indices = recording.game_shot_indices(game_number).tolist()
+        if not shot_indices:
+            raise Exception(f"Game {game_number} is not in the recording!")
+
+        first_shot = recording[shot_indices[0]]
+        return cls(first_shot.start_states, first_shot.start_positions,
+                   [recording.timeline(shot_index) for shot_index in shot_indices])
+
+    def clamp(self, time: float) -> float:
+        return min(max(time, 0.0), self.duration)
+
+    def shot_at(self, time: float) -> int:
+        if not self.shots:
+            return 0
+        return int(np.searchsorted(self.shot_start_times, self.clamp(time), side="right")) - 1
+
+    def shot_start_time(self, shot_index: int) -> float:
+        if shot_index >= len(self.shots):
+            return self.duration
+        return float(self.shot_start_times[max(shot_index, 0)])
+
+    def frame_times(self, start_time: float, end_time: float, playback_speed: float,
+                    frames_per_second: int) -> np.ndarray:
+        # Replay time of every frame showing start_time to end_time at the given speed; negative speeds run from
+        # end_time back to start_time
+        if playback_speed == 0:
+            raise Exception("Playback speed cannot be 0!")
+        start_time, end_time = self.clamp(start_time), self.clamp(end_time)
+        frame_count = int(abs(end_time - start_time) / abs(playback_speed) * frames_per_second) + 1
+        first_time = start_time if playback_speed > 0 else end_time
+        return np.clip(first_time + np.arange(frame_count) / frames_per_second * playback_speed, 0.0, self.duration)
+
+    def state_at(self, time: float) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.shots:
+            return self._shot_start_positions[0].copy(), self._shot_start_states[0].copy()
+
+        time = self.clamp(time)
+        shot_index = self.shot_at(time)
+        shot = self.shots[shot_index]
+        time_since_shot_start = time - self.shot_start_times[shot_index]
+
+        if time_since_shot_start >= shot.duration:
+            return self._shot_start_positions[shot_index + 1].copy(), self._shot_start_states[shot_index + 1].copy()
+
+        positions = self._shot_start_positions[shot_index].copy()
+        states = self._shot_start_states[shot_index].copy()
+        shot_positions, shot_states, moved = shot.positions_at(time_since_shot_start)
+        positions[moved] = shot_positions[moved]
+        states[moved] = shot_states[moved]
+        return positions, states
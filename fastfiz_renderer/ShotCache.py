@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .FastFizCompat import ff
+from .ShotTimeline import ShotTimeline
+from .StateCodec import StateCodec
+
+_CACHE_VERSION = 2
+
+
+class ShotCache:
+    # Compiled timeline and resulting table state of a shot
+    Entry = Tuple[ShotTimeline, list[StateCodec.EncodedBall]]
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, ShotCache.Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def get_key(table_state: ff.TableState, shot_params: ff.ShotParams) -> bytes:
+        return ShotCache.get_encoded_key(StateCodec.encode_table_state(table_state),
+                                         StateCodec.encode_table(table_state.getTable()),
+                                         StateCodec.encode_shot_params(shot_params))
+
+    @staticmethod
+    def get_encoded_key(encoded_state: list[StateCodec.EncodedBall], encoded_table: StateCodec.EncodedTable,
+                        encoded_params: StateCodec.EncodedShotParams) -> bytes:
+        # Every ball's number, state and exact position plus the table geometry and physics and the shot parameters
+        values = [value for ball in encoded_state for value in ball]
+        values += [*encoded_table, *encoded_params]
+        return hashlib.blake2b(np.array(values, dtype=np.float64).tobytes(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: bytes, timeline: ShotTimeline, end_state: list[StateCodec.EncodedBall]):
+        with self._lock:
+            self._entries[key] = (timeline, end_state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def execute_shot(self, table_state: ff.TableState, shot_params: ff.ShotParams) -> ShotTimeline:
+        # Leaves the table state at the end of the shot, exactly like executeShot
+        key = ShotCache.get_key(table_state, shot_params)
+        entry = self.get(key)
+
+        if entry is not None:
+            timeline, end_state = entry
+            for number, state, x, y in end_state:
+                table_state.setBall(number, state, x, y)
+            return timeline
+
+        table: ff.Table = table_state.getTable()
+        shot = table_state.executeShot(shot_params)
+        timeline = ShotTimeline.from_shot(shot, table.MU_SLIDING, table.MU_ROLLING, table.g)
+        self.put(key, timeline, StateCodec.encode_table_state(table_state))
+        return timeline
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if path is None:
+            raise Exception("No shot cache path given!")
+
+        with self._lock:
+            entries = list(self._entries.items())
+
+        # Written next to the target and swapped in, so an interrupted save never leaves a broken cache behind
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((_CACHE_VERSION, entries), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def load(self, path: str):
+        try:
+            with open(path, "rb") as file:
+                version, entries = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError) as error:
+            print(f"Ignoring unreadable shot cache {path}: {error}")
+            return
+
+        if version != _CACHE_VERSION:
+            print(f"Ignoring shot cache {path} of version {version}")
+            return
+
+        with self._lock:
+            for key, entry in entries[-self.max_entries:]:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+from .FastFizCompat import ff
+
+_BALL_COUNT = ff.Ball.FIFTEEN + 1
+
+
+class ShotHistory:
+    # Ball positions and states before the first shot and after every shot of a game, one array row per snapshot.
+    # Rows are only ever appended, so jumping between shots is a row lookup. Going back and playing a different shot
+    # drops the rows after it; the arrays are copied before those rows are written again, so snapshots handed out
+    # earlier keep showing the shots they were taken from.
+    def __init__(self, positions: np.ndarray, states: np.ndarray, capacity: int = 64):
+        self._positions = np.empty((capacity, _BALL_COUNT, 2), dtype=np.float64)
+        self._states = np.empty((capacity, _BALL_COUNT), dtype=np.int32)
+        self._length = 0
+        self._copy_on_write = False
+        self.append(positions, states)
+
+    @classmethod
+    def from_table_state(cls, table_state: ff.TableState, capacity: int = 64):
+        return cls(*ShotHistory.read_table_state(table_state), capacity)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def shot_count(self) -> int:
+        return self._length - 1
+
+    def append(self, positions: np.ndarray, states: np.ndarray):
+        if self._length == len(self._positions):
+            self._positions = np.concatenate((self._positions, np.empty_like(self._positions)))
+            self._states = np.concatenate((self._states, np.empty_like(self._states)))
+        elif self._copy_on_write:
+            self._positions = self._positions.copy()
+            self._states = self._states.copy()
+        self._copy_on_write = False
+        self._positions[self._length] = positions
+        self._states[self._length] = states
+        self._length += 1
+
+    def truncate(self, shot_number: int):
+        # Drops every snapshot after the given shot, before a different shot is played from it
+        if shot_number + 1 < self._length:
+            self._length = shot_number + 1
+            self._copy_on_write = True
+
+    def get(self, shot_number: int) -> Tuple[np.ndarray, np.ndarray]:
+        # Read-only views of the table after the given shot, 0 being the start of the game
+        if not 0 <= shot_number < self._length:
+            raise IndexError(f"No snapshot after shot {shot_number}, the history has {self.shot_count} shots")
+        positions, states = self._positions[shot_number], self._states[shot_number]
+        positions.flags.writeable = False
+        states.flags.writeable = False
+        return positions, states
+
+    def restore(self, shot_number: int, table_state: ff.TableState) -> Tuple[np.ndarray, np.ndarray]:
+        positions, states = self.get(shot_number)
+        for number, ((x, y), state) in enumerate(zip(positions.tolist(), states.tolist())):
+            table_state.setBall(number, state, x, y)
+        return positions, states
+
+    @staticmethod
+    def read_table_state(table_state: ff.TableState) -> Tuple[np.ndarray, np.ndarray]:
+        positions = np.empty((_BALL_COUNT, 2), dtype=np.float64)
+        states = np.empty(_BALL_COUNT, dtype=np.int32)
+        for number in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
+            ball: ff.Ball = table_state.getBall(number)
+            pos = ball.getPos()
+            positions[number] = (pos.x, pos.y)
+            states[number] = ball.getState()
+        return positions, states
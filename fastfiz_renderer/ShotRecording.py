@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from typing import Iterator, Tuple
+
+import numpy as np
+import vectormath as vmath
+
+from .EventIndex import EventIndexWriter, get_index_path
+from .FastFizCompat import EVENT_CODES, STATE_CODES, ff
+from .ShotTimeline import BallState, ShotTimeline
+
+# File layout: file header, then one block per shot (shot header followed by its event columns), then an index of
+# all shot blocks and a trailer pointing at it. Without a trailer (an interrupted writer) the blocks are rescanned.
+_FILE_MAGIC = b"FFZREC\x00\x01"
+_SHOT_MAGIC = b"SHOT"
+_INDEX_MAGIC = b"FFZINDEX"
+_VERSION = 1
+_BALL_COUNT = ff.Ball.FIFTEEN + 1
+
+_file_header_dtype = np.dtype([
+    ("magic", "S8"), ("version", "<u4"), ("ball_count", "<u4"),
+    ("state_codes", "<i4", (len(STATE_CODES),)), ("event_codes", "<i4", (len(EVENT_CODES),)),
+    ("ball_radius", "<f8"), ("sliding_friction_const", "<f8"), ("rolling_friction_const", "<f8"),
+    ("gravitational_const", "<f8"), ("table_width", "<f8"), ("table_length", "<f8"),
+    ("side_pocket_width", "<f8"), ("corner_pocket_width", "<f8"),
+])
+
+_shot_header_dtype = np.dtype([
+    ("magic", "S4"), ("game_number", "<u4"), ("shot_number", "<u4"), ("event_count", "<u4"),
+    ("duration", "<f8"), ("params", "<f8", (5,)),
+    ("start_states", "<i4", (_BALL_COUNT,)), ("start_positions", "<f8", (_BALL_COUNT, 2)),
+])
+
+# One row per ball taking part in an event, the same rows BallState is built from; wide columns come first so
+# every float column stays 8-byte aligned
+_event_columns = (
+    ("time", np.dtype("<f8"), ()), ("position", np.dtype("<f8"), (2,)), ("velocity", np.dtype("<f8"), (2,)),
+    ("spin", np.dtype("<f8"), (3,)), ("event_type", np.dtype("i1"), ()), ("ball", np.dtype("i1"), ()),
+    ("state", np.dtype("i1"), ()),
+)
+
+_index_dtype = np.dtype([
+    ("offset", "<u8"), ("game_number", "<u4"), ("shot_number", "<u4"), ("event_count", "<u4"), ("duration", "<f8"),
+])
+
+_trailer_dtype = np.dtype([("index_offset", "<u8"), ("shot_count", "<u8"), ("magic", "S8")])
+
+
+def _column_sizes(event_count: int) -> list[int]:
+    return [event_count * dtype.itemsize * int(np.prod(shape)) for _, dtype, shape in _event_columns]
+
+
+def _block_size(event_count: int) -> int:
+    size = _shot_header_dtype.itemsize + sum(_column_sizes(event_count))
+    return size + (-size % 8)
+
+
+class ShotRecordingWriter:
+    # Index entries are buffered a chunk at a time and spilled to a temporary file, then copied behind the blocks on
+    # close, so memory stays the same however many shots are recorded
+    def __init__(self, path: str, table_state: ff.TableState, index_events: bool = True, index_chunk: int = 4096):
+        table: ff.Table = table_state.getTable()
+        header = np.zeros((), dtype=_file_header_dtype)
+        header["magic"] = _FILE_MAGIC
+        header["version"] = _VERSION
+        header["ball_count"] = _BALL_COUNT
+        header["state_codes"] = STATE_CODES
+        header["event_codes"] = EVENT_CODES
+        header["ball_radius"] = table_state.getBall(ff.Ball.CUE).getRadius()
+        header["sliding_friction_const"] = table.MU_SLIDING
+        header["rolling_friction_const"] = table.MU_ROLLING
+        header["gravitational_const"] = table.g
+        header["table_width"] = table.TABLE_WIDTH
+        header["table_length"] = table.TABLE_LENGTH
+        header["side_pocket_width"] = table.SIDE_POCKET_WIDTH
+        header["corner_pocket_width"] = table.CORNER_POCKET_WIDTH
+
+        self._file = open(path, "wb")
+        self._file.write(header.tobytes())
+        self._position = _file_header_dtype.itemsize
+        self._shot_count = 0
+        self._index_chunk = np.zeros(index_chunk, dtype=_index_dtype)
+        self._index_chunk_length = 0
+        self._index_file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        self._event_index = EventIndexWriter(get_index_path(path)) if index_events else None
+
+    def write_shot(self, game_number: int, shot_number: int, start_state: list[Tuple[int, int, float, float]],
+                   params: ff.ShotParams, shot: ff.Shot):
+        rows = []
+        for event in shot.getEventList():
+            event: ff.Event
+            for number, get_ball_data in ((event.getBall1(), event.getBall1Data),
+                                          (event.getBall2(), event.getBall2Data)):
+                if not ff.Ball.CUE <= number <= ff.Ball.FIFTEEN:
+                    continue
+                ball: ff.Ball = get_ball_data()
+                pos, vel, spin = ball.getPos(), ball.getVelocity(), ball.getSpin()
+                rows.append((event.getTime(), pos.x, pos.y, vel.x, vel.y, spin.x, spin.y, spin.z, event.getType(),
+                             number, ball.getState()))
+
+        table = np.array(rows, dtype=np.float64).reshape(-1, 11)
+        event_count = len(rows)
+
+        header = np.zeros((), dtype=_shot_header_dtype)
+        header["magic"] = _SHOT_MAGIC
+        header["game_number"] = game_number
+        header["shot_number"] = shot_number
+        header["event_count"] = event_count
+        header["duration"] = shot.getDuration()
+        header["params"] = (params.a, params.b, params.theta, params.phi, params.v)
+        for number, state, x, y in start_state:
+            header["start_states"][number] = state
+            header["start_positions"][number] = (x, y)
+
+        columns = (table[:, 0], table[:, 1:3], table[:, 3:5], table[:, 5:8], table[:, 8], table[:, 9], table[:, 10])
+        block = [header.tobytes()]
+        for column, (_, dtype, _) in zip(columns, _event_columns):
+            block.append(np.ascontiguousarray(column, dtype=dtype).tobytes())
+        block_size = _block_size(event_count)
+        block.append(b"\x00" * (block_size - sum(len(part) for part in block)))
+
+        self._file.write(b"".join(block))
+        if self._event_index is not None:
+            self._event_index.write_shot(game_number, self._shot_count, shot_number, shot)
+        self._index_chunk[self._index_chunk_length] = (self._position, game_number, shot_number, event_count,
+                                                       shot.getDuration())
+        self._index_chunk_length += 1
+        if self._index_chunk_length == len(self._index_chunk):
+            self._flush_index_chunk()
+        self._shot_count += 1
+        self._position += block_size
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush_index_chunk()
+        self._index_file.seek(0)
+        shutil.copyfileobj(self._index_file, self._file)
+        self._index_file.close()
+        trailer = np.array((self._position, self._shot_count, _INDEX_MAGIC), dtype=_trailer_dtype)
+        self._file.write(trailer.tobytes())
+        self._file.close()
+        if self._event_index is not None:
+            self._event_index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _flush_index_chunk(self):
+        self._index_file.write(self._index_chunk[:self._index_chunk_length].tobytes())
+        self._index_chunk_length = 0
+
+
+class RecordedShot:
+    def __init__(self, header: np.void, columns: dict[str, np.ndarray]):
+        self.game_number = int(header["game_number"])
+        self.shot_number = int(header["shot_number"])
+        self.duration = float(header["duration"])
+        self.params: Tuple[float, ...] = tuple(header["params"].tolist())
+        self.start_states: np.ndarray = header["start_states"]
+        self.start_positions: np.ndarray = header["start_positions"]
+        self.time: np.ndarray = columns["time"]
+        self.position: np.ndarray = columns["position"]
+        self.velocity: np.ndarray = columns["velocity"]
+        self.spin: np.ndarray = columns["spin"]
+        self.event_type: np.ndarray = columns["event_type"]
+        self.ball: np.ndarray = columns["ball"]
+        self.state: np.ndarray = columns["state"]
+
+
+class ShotRecording:
+    def __init__(self, path: str):
+        # Memory-mapped, so only the pages of the shots actually read are loaded
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.header = self._data[:_file_header_dtype.itemsize].view(_file_header_dtype)[0]
+
+        if bytes(self.header["magic"]) != _FILE_MAGIC or self.header["version"] != _VERSION:
+            raise Exception(f"{path} is not a shot recording!")
+        if tuple(self.header["state_codes"]) != STATE_CODES or tuple(self.header["event_codes"]) != EVENT_CODES:
+            raise Exception(f"{path} was recorded with different fastfiz state or event codes!")
+
+        self.index = self._read_index()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, shot_index: int) -> RecordedShot:
+        offset = int(self.index["offset"][shot_index])
+        event_count = int(self.index["event_count"][shot_index])
+        header = self._data[offset:offset + _shot_header_dtype.itemsize].view(_shot_header_dtype)[0]
+
+        columns = dict()
+        position = offset + _shot_header_dtype.itemsize
+        for (name, dtype, shape), size in zip(_event_columns, _column_sizes(event_count)):
+            columns[name] = self._data[position:position + size].view(dtype).reshape((event_count, *shape))
+            position += size
+
+        return RecordedShot(header, columns)
+
+    def __iter__(self) -> Iterator[RecordedShot]:
+        for shot_index in range(len(self)):
+            yield self[shot_index]
+
+    def game_numbers(self) -> np.ndarray:
+        return np.unique(self.index["game_number"])
+
+    def game_shot_indices(self, game_number: int) -> np.ndarray:
+        return np.flatnonzero(self.index["game_number"] == game_number)
+
+    def timeline(self, shot_index: int) -> ShotTimeline:
+        shot = self[shot_index]
+        ball_states: dict[int, list[BallState]] = dict()
+
+        for row in range(len(shot.time)):
+            number, state = int(shot.ball[row]), int(shot.state[row])
+            ball_states.setdefault(number, []).append(BallState(
+                float(shot.time[row]), vmath.Vector2(shot.position[row]), vmath.Vector2(shot.velocity[row]),
+                vmath.Vector3(shot.spin[row]), state, str(state), int(shot.event_type[row])))
+
+        radii = {number: float(self.header["ball_radius"]) for number in ball_states}
+        return ShotTimeline.from_ball_states(shot.duration, ball_states, radii,
+                                             float(self.header["sliding_friction_const"]),
+                                             float(self.header["rolling_friction_const"]),
+                                             float(self.header["gravitational_const"]))
+
+    def close(self):
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _read_index(self) -> np.ndarray:
+        size = len(self._data)
+        if size >= _file_header_dtype.itemsize + _trailer_dtype.itemsize:
+            trailer = self._data[size - _trailer_dtype.itemsize:].view(_trailer_dtype)[0]
+            if bytes(trailer["magic"]) == _INDEX_MAGIC:
+                index_offset = int(trailer["index_offset"])
+                index_size = int(trailer["shot_count"]) * _index_dtype.itemsize
+                return self._data[index_offset:index_offset + index_size].view(_index_dtype)
+
+        return self._scan_index(size)
+
+    def _scan_index(self, size: int) -> np.ndarray:
+        entries = []
+        offset = _file_header_dtype.itemsize
+        while offset + _shot_header_dtype.itemsize <= size:
+            header = self._data[offset:offset + _shot_header_dtype.itemsize].view(_shot_header_dtype)[0]
+            block_size = _block_size(int(header["event_count"]))
+            if bytes(header["magic"]) != _SHOT_MAGIC or offset + block_size > size:
+                break
+            entries.append((offset, header["game_number"], header["shot_number"], header["event_count"],
+                            header["duration"]))
+            offset += block_size
+        return np.array(entries, dtype=_index_dtype)
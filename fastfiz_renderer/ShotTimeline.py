@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Optional, Tuple
+
+import numpy as np
+import vectormath as vmath
+
+from .FastFizCompat import ff
+
+
+class BallTimeline:
+    # Segment layout: (start time, pos x, pos y, vel x, vel y, half acc x, half acc y, state)
+    Segment = Tuple[float, float, float, float, float, float, float, int]
+
+    def __init__(self, times: list[float], segments: list[Segment], end_position: Tuple[float, float],
+                 end_state: int):
+        self.times = times
+        self.segments = segments
+        self.end_position = end_position
+        self.end_state = end_state
+
+    def segment_at(self, time_since_shot_start: float) -> Optional[Segment]:
+        index = bisect_right(self.times, time_since_shot_start) - 1
+        if index < 0:
+            return None
+        return self.segments[index]
+
+    def position_at(self, time_since_shot_start: float) -> Optional[Tuple[float, float, int]]:
+        segment = self.segment_at(time_since_shot_start)
+        if segment is None:
+            return None
+
+        e_time, pos_x, pos_y, vel_x, vel_y, acc_x, acc_y, state = segment
+        dt = time_since_shot_start - e_time
+        return pos_x + (vel_x + acc_x * dt) * dt, pos_y + (vel_y + acc_y * dt) * dt, state
+
+    @classmethod
+    def from_ball_states(cls, states: list[BallState], radius: float, sliding_friction_const: float,
+                         rolling_friction_const: float, gravitational_const: float):
+        times: list[float] = []
+        segments: list[BallTimeline.Segment] = []
+
+        for state in states:
+            # Simultaneous events keep the first state, like the original per-frame scan did
+            if times and state.e_time <= times[-1]:
+                continue
+
+            vel_x, vel_y = state.vel.x, state.vel.y
+            acc_x, acc_y = 0.0, 0.0
+
+            if state.state == ff.Ball.ROLLING:
+                acc_x, acc_y = _scaled_direction(vel_x, vel_y, -0.5 * rolling_friction_const * gravitational_const)
+            elif state.state == ff.Ball.SLIDING:
+                spin = state.ang_vel
+                rel_x = vel_x - radius * spin.z * spin.y
+                rel_y = vel_y + radius * spin.z * spin.x
+                acc_x, acc_y = _scaled_direction(rel_x, rel_y, -0.5 * sliding_friction_const * gravitational_const)
+            else:
+                vel_x, vel_y = 0.0, 0.0
+
+            times.append(state.e_time)
+            segments.append((state.e_time, state.pos.x, state.pos.y, vel_x, vel_y, acc_x, acc_y, state.state))
+
+        last = states[-1]
+        return cls(times, segments, (last.pos.x, last.pos.y), last.state)
+
+
+class ShotTimeline:
+    ball_count = ff.Ball.FIFTEEN + 1
+
+    def __init__(self, duration: float, ball_timelines: dict[int, BallTimeline]):
+        self.duration = duration
+        self.ball_timelines = ball_timelines
+
+        # Flattened layout for evaluating every ball at once: one coefficient row per segment and, for each
+        # distinct event time, the active segment row of every ball (-1 before its first event)
+        segments = [segment for number in sorted(ball_timelines) for segment in ball_timelines[number].segments]
+        self.coefficients = np.array([segment[:7] for segment in segments], dtype=np.float64).reshape(-1, 7)
+        self.segment_states = np.array([segment[7] for segment in segments], dtype=np.int64)
+        self.event_times = np.unique(self.coefficients[:, 0])
+        self.segment_indices = np.full((len(self.event_times), ShotTimeline.ball_count), -1, dtype=np.int64)
+
+        offset = 0
+        for number in sorted(ball_timelines):
+            ball_times = ball_timelines[number].times
+            indices = np.searchsorted(ball_times, self.event_times, side='right') - 1
+            self.segment_indices[:, number] = np.where(indices >= 0, indices + offset, -1)
+            offset += len(ball_times)
+
+    def get_ball_timeline(self, number: int) -> Optional[BallTimeline]:
+        return self.ball_timelines.get(number)
+
+    def active_segments_at(self, time_since_shot_start: float) -> np.ndarray:
+        event_index = np.searchsorted(self.event_times, time_since_shot_start, side='right') - 1
+        if event_index < 0:
+            return np.full(ShotTimeline.ball_count, -1, dtype=np.int64)
+        return self.segment_indices[event_index]
+
+    def positions_at(self, time_since_shot_start: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        indices = self.active_segments_at(time_since_shot_start)
+        moved = indices >= 0
+        rows = indices[moved]
+        positions = np.full((ShotTimeline.ball_count, 2), np.nan)
+        positions[moved] = evaluate_segments(self.coefficients[rows], time_since_shot_start)
+        states = np.full(ShotTimeline.ball_count, -1, dtype=np.int64)
+        states[moved] = self.segment_states[rows]
+        return positions, states, moved
+
+    @classmethod
+    def from_shot(cls, shot: ff.Shot, sliding_friction_const: float, rolling_friction_const: float,
+                  gravitational_const: float):
+        ball_states: dict[int, list[BallState]] = dict()
+        radii: dict[int, float] = dict()
+
+        for event in shot.getEventList():
+            event: ff.Event
+            for number, get_ball_data in ((event.getBall1(), event.getBall1Data),
+                                          (event.getBall2(), event.getBall2Data)):
+                if not ff.Ball.CUE <= number <= ff.Ball.FIFTEEN:
+                    continue
+                ball: ff.Ball = get_ball_data()
+                ball_states.setdefault(number, []).append(BallState.from_event_and_ball(event, ball))
+                radii.setdefault(number, ball.getRadius())
+
+        return cls.from_ball_states(shot.getDuration(), ball_states, radii, sliding_friction_const,
+                                    rolling_friction_const, gravitational_const)
+
+    @classmethod
+    def from_ball_states(cls, duration: float, ball_states: dict[int, list[BallState]], radii: dict[int, float],
+                         sliding_friction_const: float, rolling_friction_const: float, gravitational_const: float):
+        ball_timelines = {
+            number: BallTimeline.from_ball_states(states, radii[number], sliding_friction_const,
+                                                  rolling_friction_const, gravitational_const)
+            for number, states in ball_states.items()
+        }
+
+        return cls(duration, ball_timelines)
+
+
+def relevant_ball_states(shot: ff.Shot, number: int) -> list[BallState]:
+    relevant_states: list[BallState] = []
+
+    for event in shot.getEventList():
+        event: ff.Event
+        if event.getBall1() == number:
+            relevant_states.append(BallState.from_event_and_ball(event, event.getBall1Data()))
+        elif event.getBall2() == number:
+            relevant_states.append(BallState.from_event_and_ball(event, event.getBall2Data()))
+
+    return relevant_states
+
+
+def evaluate_segments(coefficients: np.ndarray, time_since_shot_start) -> np.ndarray:
+    dt = (time_since_shot_start - coefficients[:, 0])[:, np.newaxis]
+    return coefficients[:, 1:3] + (coefficients[:, 3:5] + coefficients[:, 5:7] * dt) * dt
+
+
+def _scaled_direction(x: float, y: float, factor: float) -> Tuple[float, float]:
+    length = (x ** 2 + y ** 2) ** 0.5
+    if length == 0:
+        return 0.0, 0.0
+    return x / length * factor, y / length * factor
+
+
+class BallState:
+    def __init__(self, e_time: float, pos: vmath.Vector2, vel: vmath.Vector2, ang_vel: vmath.Vector3, state: int,
+                 state_str: str,
+                 event_course: int):
+        self.e_time = e_time
+        self.pos = pos
+        self.vel = vel
+        self.ang_vel = ang_vel
+        self.state = state
+        self.state_str = state_str
+        self.event_course = event_course
+
+    @classmethod
+    def from_event_and_ball(cls, event: ff.Event, ball: ff.Ball):
+        e_time = event.getTime()
+        pos = ball.getPos()
+        vel = ball.getVelocity()
+        ang_vel = ball.getSpin()
+        state = ball.getState()
+        state_str = ball.getStateString()
+        event_course = event.getType()
+        return cls(e_time, vmath.Vector2([pos.x, pos.y]), vmath.Vector2([vel.x, vel.y]),
+                   vmath.Vector3([ang_vel.x, ang_vel.y, ang_vel.z]), state, state_str, event_course)
+
+    def __str__(self):
+        return (f"Time: {self.e_time:.3f},\t "
+                f"Pos: ({self.pos.x:.3f}, {self.pos.y:.3f}),\t "
+                f"Vel: ({self.vel.x:.3f}, {self.vel.y:.3f}),\t "
+                f"State: {self.state_str}")
@@ -0,0 +1,29 @@
+import threading
+from typing import Callable, Tuple
+
+from p5 import *
+from p5.core import p5 as p5_core
+
+
+class SketchWindow:
+    # p5 drives a single global sketch, so only one window can be open per process, whether games, replays or feeds
+    # are shown in it; headless exports can run concurrently from any number of handlers
+    _lock = threading.Lock()
+
+    @staticmethod
+    def run(draw: Callable[[], None], setup: Callable[[], None], key_released: Callable, frames_per_second: int,
+            window_pos: Tuple[int, int], **handlers):
+        if not SketchWindow._lock.acquire(blocking=False):
+            raise Exception("Only one game window can be open at a time!")
+
+        try:
+            run(renderer="skia", frame_rate=frames_per_second, sketch_draw=draw, sketch_setup=setup,
+                sketch_key_released=key_released, **handlers, window_xpos=window_pos[0], window_ypos=window_pos[1],
+                window_title="Cue Canvas")
+        finally:
+            SketchWindow._lock.release()
+
+    @staticmethod
+    def close():
+        # Ends the sketch loop so run() returns, instead of exit() ending the process
+        p5_core.sketch.main_loop_state = False
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+from .FastFizCompat import ff
+
+
+class StateCodec:
+    # Plain tuples of numbers that survive pickling and process boundaries, unlike the pybind objects
+    EncodedBall = Tuple[int, int, float, float]
+    EncodedShotParams = Tuple[float, float, float, float, float]
+    # Width, length, side and corner pocket width, rolling and sliding friction and gravity, as in TableGeometry
+    EncodedTable = Tuple[float, float, float, float, float, float, float]
+
+    @staticmethod
+    def encode_table_state(table_state: ff.TableState) -> list[EncodedBall]:
+        encoded = []
+        for i in range(ff.Ball.CUE, ff.Ball.FIFTEEN + 1):
+            ball: ff.Ball = table_state.getBall(i)
+            pos = ball.getPos()
+            encoded.append((ball.getID(), ball.getState(), pos.x, pos.y))
+        return encoded
+
+    @staticmethod
+    def decode_table_state(encoded: list[EncodedBall], encoded_table: Optional[EncodedTable] = None) -> ff.TableState:
+        # Starts from a racked 8-ball state, so without encoded_table the table geometry is the standard one
+        table_state: ff.TableState = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+        if encoded_table is not None and StateCodec.encode_table(table_state.getTable()) != tuple(encoded_table):
+            table_state = ff.TableState(StateCodec.decode_table(encoded_table))
+        for number, state, x, y in encoded:
+            table_state.setBall(number, state, x, y)
+        return table_state
+
+    @staticmethod
+    def copy_table_state(table_state: ff.TableState) -> ff.TableState:
+        # An independent table state on the same table, e.g. to simulate on without touching the original
+        return StateCodec.decode_table_state(StateCodec.encode_table_state(table_state),
+                                             StateCodec.encode_table(table_state.getTable()))
+
+    @staticmethod
+    def encode_table(table: ff.Table) -> EncodedTable:
+        return (table.TABLE_WIDTH, table.TABLE_LENGTH, table.SIDE_POCKET_WIDTH, table.CORNER_POCKET_WIDTH,
+                table.MU_ROLLING, table.MU_SLIDING, table.g)
+
+    @staticmethod
+    def decode_table(encoded: EncodedTable) -> ff.Table:
+        # The remaining constants, like rail bounce and spinning friction, keep their defaults
+        table = ff.Table()
+        (table.TABLE_WIDTH, table.TABLE_LENGTH, table.SIDE_POCKET_WIDTH, table.CORNER_POCKET_WIDTH, table.MU_ROLLING,
+         table.MU_SLIDING, table.g) = encoded
+        return table
+
+    @staticmethod
+    def encode_shot_params(shot_params: ff.ShotParams) -> EncodedShotParams:
+        return shot_params.a, shot_params.b, shot_params.theta, shot_params.phi, shot_params.v
+
+    @staticmethod
+    def decode_shot_params(encoded: EncodedShotParams) -> ff.ShotParams:
+        shot_params = ff.ShotParams()
+        shot_params.a, shot_params.b, shot_params.theta, shot_params.phi, shot_params.v = encoded
+        return shot_params
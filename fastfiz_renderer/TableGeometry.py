@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+from .FastFizCompat import ff
+
+
+class TableGeometry:
+    def __init__(self, width: float, length: float, side_pocket_width: float, corner_pocket_width: float,
+                 rolling_friction_const: float, sliding_friction_const: float, gravitational_const: float):
+        self.wood_width = width / 10
+        self.rail_width = width / 30
+        self.width = width + 2 * self.wood_width + 2 * self.rail_width
+        self.length = length + 2 * self.wood_width + 2 * self.rail_width
+        self.board_width = width
+        self.board_length = length
+        self.side_pocket_width = side_pocket_width
+        self.corner_pocket_width = corner_pocket_width
+        self.board_pos = self.rail_width + self.wood_width
+
+        self.rolling_friction_const = rolling_friction_const
+        self.sliding_friction_const = sliding_friction_const
+        self.gravitational_const = gravitational_const
+
+    @classmethod
+    def from_table_state(cls, table_state: ff.TableState):
+        table: ff.Table = table_state.getTable()
+        return cls(table.TABLE_WIDTH, table.TABLE_LENGTH, table.SIDE_POCKET_WIDTH, table.CORNER_POCKET_WIDTH,
+                   table.MU_ROLLING, table.MU_SLIDING, table.g)
+
+    @classmethod
+    def from_recording_header(cls, header: np.void):
+        return cls(float(header["table_width"]), float(header["table_length"]), float(header["side_pocket_width"]),
+                   float(header["corner_pocket_width"]), float(header["rolling_friction_const"]),
+                   float(header["sliding_friction_const"]), float(header["gravitational_const"]))
+
+    def get_canvas_size(self, scaling: int, horizontal_mode: bool = False) -> Tuple[int, int]:
+        width = int(self.width * scaling)
+        length = int(self.length * scaling)
+
+        if horizontal_mode:
+            width, length = length, width
+
+        return width, length
+
+    def get_board_position(self, canvas_pos: Tuple[float, float], scaling: int,
+                           horizontal_mode: bool = False) -> Tuple[float, float]:
+        # Where a point on the canvas, like the mouse, is on the board; horizontal mode draws the table turned a
+        # quarter clockwise and shifted back onto the canvas
+        x, y = canvas_pos[0] / scaling, canvas_pos[1] / scaling
+        if horizontal_mode:
+            x, y = y, int(self.length * scaling) / scaling - x
+        return x - self.board_pos, y - self.board_pos
@@ -1,3 +1,44 @@
-from .GameBall import GameBall
-from .GameTable import GameTable
-from .GameHandler import GameHandler
+import importlib
+import sys
+import types
+
+# Imported on first use: the renderer classes pull in p5 (and with it vispy, skia, glfw and OpenGL), the game flow
+# needs fastfiz, and replaying recordings needs neither. Maps every export to the module it lives in.
+_exports = {
+    "GameBall": "GameBall", "GameTable": "GameTable", "GameHandler": "GameHandler", "GameFlow": "GameFlow",
+    "GameRunner": "GameRunner", "ShotRecording": "ShotRecording", "RecordingPlayer": "RecordingPlayer",
+    "ReplayTimeline": "ReplayTimeline", "FrameProfiler": "FrameProfiler", "GameGrid": "GameGrid",
+    "ShotTimeline": "ShotTimeline", "TableGeometry": "TableGeometry", "GameSession": "GameSession",
+    "ShotCache": "ShotCache", "CandidateEvaluator": "CandidateEvaluator", "DeciderServer": "DeciderServer",
+    "DeciderAgent": "DeciderServer", "BudgetedDecider": "BudgetedDecider", "FrameFeed": "FrameFeed",
+    "ShotHistory": "ShotHistory", "PositionHeatmap": "PositionHeatmap", "EventIndex": "EventIndex",
+    "GameStatistics": "GameStatistics", "AimPredictor": "AimPredictor",
+}
+
+__all__ = list(_exports)
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule, from anywhere, binds it on the package under its own name once it has loaded, which
+        # would hide the export of the same name from __getattr__; the export is bound in its place
+        if (isinstance(value, types.ModuleType) and _exports.get(name) == name
+                and value.__name__ == f"{self.__name__}.{name}"):
+            value = getattr(value, name, value)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{_exports[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.AimPredictor import AimPredictor
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.TableGeometry import TableGeometry
+
+RADIUS = 0.028575
+
+
+@pytest.fixture
+def geometry():
+    return TableGeometry(1.116, 2.236, 0.1, 0.1, 0.01, 0.2, 9.81)
+
+
+def _balls(*positions):
+    # The given balls from the cue ball on, every other ball off the table
+    all_positions = np.zeros((16, 2))
+    states = np.full(16, ff.Ball.NOTINPLAY, dtype=np.int32)
+    for number, position in enumerate(positions):
+        all_positions[number] = position
+        states[number] = ff.Ball.STATIONARY
+    return all_positions, states
+
+
+def test_straight_miss_ends_at_the_rail(geometry):
+    prediction = AimPredictor(geometry, RADIUS).predict(*_balls((0.5, 1.0)), 90)
+
+    assert prediction.first_contact is None
+    np.testing.assert_allclose(prediction.cue_path[1], (0.5, geometry.board_length - RADIUS))
+
+
+def test_full_hit_sends_the_object_ball_on_and_stops_the_cue_ball(geometry):
+    prediction = AimPredictor(geometry, RADIUS).predict(*_balls((0.5, 1.0), (0.5, 1.5)), 90)
+
+    assert prediction.first_contact == 1
+    np.testing.assert_allclose(prediction.cue_path[1], (0.5, 1.5 - 2 * RADIUS))
+    np.testing.assert_allclose(prediction.object_path[1], (0.5, geometry.board_length - RADIUS))
+    assert prediction.cue_deflection is None
+
+
+def test_cut_shot_deflects_along_the_tangent(geometry):
+    prediction = AimPredictor(geometry, RADIUS).predict(*_balls((0.5, 1.0), (0.5 + RADIUS, 1.5)), 90)
+
+    object_direction = np.subtract(*reversed(prediction.object_path))
+    cue_direction = np.subtract(*reversed(prediction.cue_deflection))
+    assert prediction.first_contact == 1
+    assert abs(np.dot(object_direction, cue_direction)) < 1e-9
+    assert object_direction[0] > 0 > cue_direction[0]
+
+
+def test_pocketed_balls_are_not_hit(geometry):
+    positions, states = _balls((0.5, 1.0), (0.5, 1.5))
+    states[1] = ff.Ball.POCKETED_NE
+
+    assert AimPredictor(geometry, RADIUS).predict(positions, states, 90).first_contact is None
+
+
+@pytest.mark.parametrize("horizontal_mode", [False, True])
+def test_board_position_of_canvas_points(geometry, horizontal_mode):
+    scaling = 200
+    board_point = (0.3, 1.7)
+    canvas_x, canvas_y = ((board_point[0] + geometry.board_pos) * scaling,
+                          (board_point[1] + geometry.board_pos) * scaling)
+    if horizontal_mode:
+        # The table is turned a quarter clockwise, so its far end is on the left
+        canvas_x, canvas_y = int(geometry.length * scaling) - canvas_y, canvas_x
+
+    np.testing.assert_allclose(geometry.get_board_position((canvas_x, canvas_y), scaling, horizontal_mode),
+                               board_point)
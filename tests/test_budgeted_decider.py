@@ -0,0 +1,142 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from fastfiz_renderer.BudgetedDecider import BudgetedDecider, GameAborted, ShotSkipped, resolve_decision
+
+
+@pytest.fixture
+def table_state():
+    ff = pytest.importorskip("fastfiz")
+    return ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+
+
+def test_resolve_decision_passes_plain_shots_through():
+    shot = object()
+    assert resolve_decision(shot, 0.1) is shot
+    assert resolve_decision(None, 0.1) is None
+
+
+def test_resolve_decision_waits_for_a_future():
+    future = concurrent.futures.Future()
+    threading.Timer(0.05, future.set_result, ("shot",)).start()
+    assert resolve_decision(future, 1) == "shot"
+
+
+def test_resolve_decision_times_out_on_a_future():
+    with pytest.raises(TimeoutError):
+        resolve_decision(concurrent.futures.Future(), 0.05)
+
+
+def test_resolve_decision_awaits_a_coroutine():
+    async def decide():
+        await asyncio.sleep(0.01)
+        return "shot"
+
+    assert resolve_decision(decide(), 1) == "shot"
+
+
+def test_resolve_decision_times_out_on_a_coroutine():
+    async def decide():
+        await asyncio.sleep(1)
+        return "shot"
+
+    with pytest.raises(TimeoutError):
+        resolve_decision(decide(), 0.05)
+
+
+def test_resolve_decision_takes_the_last_shot_of_an_async_generator():
+    async def decide():
+        for shot in ("first", "second", "third"):
+            await asyncio.sleep(0.01)
+            yield shot
+
+    assert resolve_decision(decide(), 1) == "third"
+
+
+def test_resolve_decision_takes_the_last_shot_yielded_in_time():
+    async def decide():
+        yield "quick"
+        await asyncio.sleep(1)
+        yield "thorough"
+
+    assert resolve_decision(decide(), 0.1) == "quick"
+
+
+def test_resolve_decision_times_out_on_an_async_generator_without_shots():
+    async def decide():
+        await asyncio.sleep(1)
+        yield "late"
+
+    with pytest.raises(TimeoutError):
+        resolve_decision(decide(), 0.05)
+
+
+def test_fallback_needs_a_known_name_and_a_default_shot():
+    with pytest.raises(Exception):
+        BudgetedDecider(lambda _: None, 0.1, "retry")
+    with pytest.raises(Exception):
+        BudgetedDecider(lambda _: None, 0.1, BudgetedDecider.DEFAULT)
+
+
+def _stalling_decider(release: threading.Event):
+    def decider(_):
+        release.wait(5)
+        return "late"
+
+    return decider
+
+
+def test_skip_fallback_passes_the_turn(table_state):
+    release = threading.Event()
+    decider = BudgetedDecider(_stalling_decider(release), 0.05, BudgetedDecider.SKIP)
+    try:
+        with pytest.raises(ShotSkipped):
+            decider(table_state)
+    finally:
+        release.set()
+    assert decider.timeouts == 1
+
+
+def test_default_fallback_plays_the_default_shot(table_state):
+    release = threading.Event()
+    decider = BudgetedDecider(_stalling_decider(release), 0.05, BudgetedDecider.DEFAULT, default_shot="default")
+    try:
+        assert decider(table_state) == "default"
+    finally:
+        release.set()
+    assert decider.timeouts == 1
+
+
+def test_abort_fallback_ends_the_game(table_state):
+    release = threading.Event()
+    decider = BudgetedDecider(_stalling_decider(release), 0.05, BudgetedDecider.ABORT)
+    try:
+        with pytest.raises(GameAborted, match=BudgetedDecider.OUT_OF_TIME):
+            decider(table_state)
+    finally:
+        release.set()
+
+
+def test_abandoned_decisions_do_not_hold_up_the_next_ones(table_state):
+    # More stalled decisions than a thread pool has workers; every one still gets its full budget
+    release = threading.Event()
+    stalled = threading.Event()
+
+    def decider(_):
+        if not stalled.is_set():
+            release.wait(5)
+            return "late"
+        return "shot"
+
+    budgeted = BudgetedDecider(decider, 0.02, BudgetedDecider.DEFAULT, default_shot="default")
+    try:
+        for _ in range(40):
+            assert budgeted(table_state) == "default"
+        stalled.set()
+        assert budgeted(table_state) == "shot"
+    finally:
+        release.set()
+    assert budgeted.timeouts == 40
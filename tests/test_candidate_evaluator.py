@@ -0,0 +1,23 @@
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+
+from fastfiz_renderer.CandidateEvaluator import CandidateEvaluator
+from fastfiz_renderer.DevUtils import DevShotDeciders
+from fastfiz_renderer.StateCodec import StateCodec
+
+
+def test_candidates_are_simulated_on_the_given_table():
+    table_state = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    width, length, *rest = StateCodec.encode_table(table_state.getTable())
+    table_state = StateCodec.decode_table_state(StateCodec.encode_table_state(table_state),
+                                                (width * 0.8, length * 0.8, *rest))
+    params = DevShotDeciders.north_shot_decider(table_state)
+
+    with CandidateEvaluator(processes=1) as evaluator:
+        result = evaluator.evaluate(table_state, [params], top_k=1)[0]
+
+    expected = StateCodec.copy_table_state(table_state)
+    expected.executeShot(params)
+    cue_position = expected.getBall(ff.Ball.CUE).getPos()
+    assert result.cue_end_position == pytest.approx((cue_position.x, cue_position.y))
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+
+from fastfiz_renderer.DeciderServer import DeciderAgent, DeciderServer
+from fastfiz_renderer.DevUtils import DevShotDeciders
+from fastfiz_renderer.StateCodec import StateCodec
+
+
+def _racked_table_state() -> ff.TableState:
+    return ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+
+
+def test_stub_agent_answers_with_its_shot():
+    with DeciderServer() as server:
+        agent = DeciderAgent("north", DevShotDeciders.north_shot_decider)
+        agent.run_in_thread(server.address)
+        params = server.get_decider("north")(_racked_table_state())
+
+    assert StateCodec.encode_shot_params(params) == (0, 0, 11, 270, 1.5)
+    assert agent.requests == 1
+
+
+def test_stub_agent_receives_the_table_state_over_a_unix_socket(tmp_path):
+    table_state = _racked_table_state()
+    seen = []
+
+    def decider(received: ff.TableState):
+        seen.append(StateCodec.encode_table_state(received))
+        return None
+
+    with DeciderServer(str(tmp_path / "deciders.sock")) as server:
+        DeciderAgent("watcher", decider).run_in_thread(server.address)
+        assert server.get_decider("watcher")(table_state) is None
+
+    assert seen == [StateCodec.encode_table_state(table_state)]
+
+
+def test_stub_agent_receives_the_table_geometry():
+    encoded_table = StateCodec.encode_table(_racked_table_state().getTable())
+    wide_table = (encoded_table[0] * 1.5,) + encoded_table[1:4] + (encoded_table[4] * 2,) + encoded_table[5:]
+    table_state = StateCodec.decode_table_state(StateCodec.encode_table_state(_racked_table_state()), wide_table)
+    seen = []
+
+    def decider(received: ff.TableState):
+        seen.append(StateCodec.encode_table(received.getTable()))
+        return None
+
+    with DeciderServer() as server:
+        DeciderAgent("surveyor", decider).run_in_thread(server.address)
+        assert server.get_decider("surveyor")(table_state) is None
+
+    assert seen == [wide_table]
+
+
+def test_slow_agent_times_out():
+    def slow_decider(table_state: ff.TableState):
+        time.sleep(1)
+        return DevShotDeciders.north_shot_decider(table_state)
+
+    with DeciderServer() as server:
+        DeciderAgent("slow", slow_decider).run_in_thread(server.address)
+        assert server.get_decider("slow", timeout=0.2)(_racked_table_state()) is None
+
+
+def test_missing_agent_times_out():
+    with DeciderServer() as server:
+        assert server.get_decider("nobody", timeout=0.1)(_racked_table_state()) is None
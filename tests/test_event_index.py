@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.EventIndex import EventIndex, EventIndexWriter
+from fastfiz_renderer.FastFizCompat import ff
+
+
+class _Ball:
+    def __init__(self, state: int):
+        self._state = state
+
+    def getState(self):
+        return self._state
+
+
+class _Event:
+    # The parts of ff.Event the index reads
+    def __init__(self, time: float, event_type: int, ball: int, other_ball: int = ff.Ball.UNKNOWN_ID,
+                 state: int = ff.Ball.ROLLING):
+        self._time, self._type, self._ball, self._other_ball, self._state = time, event_type, ball, other_ball, state
+
+    def getTime(self):
+        return self._time
+
+    def getType(self):
+        return self._type
+
+    def getBall1(self):
+        return self._ball
+
+    def getBall2(self):
+        return self._other_ball
+
+    def getBall1Data(self):
+        return _Ball(self._state)
+
+
+class _Shot:
+    def __init__(self, events: list[_Event]):
+        self._events = events
+
+    def getEventList(self):
+        return self._events
+
+
+SHOTS = [
+    # The 8 ball hits a rail and is pocketed
+    _Shot([_Event(0.0, ff.Event.CUE_STRIKE, ff.Ball.CUE),
+           _Event(0.5, ff.Event.BALL_COLLISION, ff.Ball.CUE, ff.Ball.EIGHT),
+           _Event(1.0, ff.Event.RAIL_COLLISION, ff.Ball.EIGHT, 2),
+           _Event(1.5, ff.Event.POCKETED, ff.Ball.EIGHT, state=ff.Ball.POCKETED_NE)]),
+    # The 8 ball is pocketed first and the cue ball hits a rail after
+    _Shot([_Event(0.0, ff.Event.CUE_STRIKE, ff.Ball.CUE),
+           _Event(0.5, ff.Event.POCKETED, ff.Ball.EIGHT, state=ff.Ball.POCKETED_SW),
+           _Event(1.0, ff.Event.RAIL_COLLISION, ff.Ball.CUE, 3)]),
+]
+
+
+@pytest.fixture(params=[True, False], ids=["sorted", "interrupted"])
+def index(request, tmp_path):
+    path = str(tmp_path / "recording.events")
+    writer = EventIndexWriter(path)
+    for shot_index, shot in enumerate(SHOTS):
+        writer.write_shot(1, shot_index, shot_index + 1, shot)
+    if request.param:
+        writer.close()
+    else:
+        writer._file.flush()
+    index = EventIndex(path)
+    yield index
+    index.close()
+    writer._file.close()
+
+
+def test_find_by_type_ball_and_pocket(index):
+    pocketed = index.find(event_type=ff.Event.POCKETED, ball=ff.Ball.EIGHT)
+    assert pocketed["shot"].tolist() == [0, 1]
+    assert index.find(pocket=ff.Ball.POCKETED_SW)["shot"].tolist() == [1]
+    assert len(index.find(involving=ff.Ball.EIGHT)) == 4
+    assert len(index.find(event_type=ff.Event.RAIL_COLLISION, time_range=(0.9, 1.1))) == 2
+
+
+def test_ids_outside_the_balls_do_not_match_every_rail(index):
+    assert len(index.find(event_type=ff.Event.RAIL_COLLISION, ball=16)) == 0
+    assert len(index.find(event_type=ff.Event.RAIL_COLLISION, ball=-1)) == 0
+
+
+def test_find_sequence_keeps_the_order_within_a_shot(index):
+    matches = index.find_sequence(dict(event_type=ff.Event.RAIL_COLLISION, ball=ff.Ball.EIGHT),
+                                  dict(event_type=ff.Event.POCKETED, ball=ff.Ball.EIGHT))
+    assert EventIndex.get_shots(matches).tolist() == [0]
+    assert np.all(matches["event_type"] == ff.Event.POCKETED)
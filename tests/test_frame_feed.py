@@ -0,0 +1,44 @@
+import numpy as np
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.FrameFeed import FrameFeed
+from fastfiz_renderer.TableGeometry import TableGeometry
+
+GEOMETRY = TableGeometry(1.12, 2.24, 0.12, 0.11, 0.015, 0.2, 9.81)
+
+
+def _frame(value: float):
+    return np.full((16, 2), value), np.full(16, ff.Ball.STATIONARY, dtype=np.int32)
+
+
+def test_reader_sees_written_frames():
+    feed = FrameFeed.create(None, GEOMETRY, 0.028575, slot_count=4)
+    reader = FrameFeed.attach(feed.name)
+    try:
+        assert reader.latest() is None
+        for frame_number in range(3):
+            feed.write(frame_number / 60, 1, frame_number, *_frame(frame_number))
+
+        frame = reader.latest()
+        assert frame.sequence == 2
+        assert frame.shot_number == 2
+        np.testing.assert_array_equal(frame.positions, _frame(2)[0])
+        assert reader.get_geometry().board_length == GEOMETRY.board_length
+    finally:
+        reader.close()
+        feed.close()
+
+
+def test_overwritten_frames_are_not_returned():
+    feed = FrameFeed.create(None, GEOMETRY, 0.028575, slot_count=2)
+    try:
+        for frame_number in range(5):
+            feed.write(0, 1, 0, *_frame(frame_number))
+
+        assert feed.read(1) is None
+        assert feed.read(4) is not None
+        positions, states = _frame(0)
+        assert not feed.read_into(2, positions, states)
+        assert feed.next_frame_number(0) == (4, 4)
+    finally:
+        feed.close()
@@ -0,0 +1,100 @@
+import csv
+import json
+
+import pytest
+
+from fastfiz_renderer.FrameProfiler import FrameProfiler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def _frames(profiler: FrameProfiler, clock: _Clock, intervals: list[float], update: float = 0.002):
+    # Each frame spends update seconds in update and the rest of its interval idle
+    for interval in intervals:
+        start = clock.now
+        profiler.begin_frame()
+        clock.now += update
+        profiler.lap("update")
+        profiler.end_frame()
+        clock.now = start + interval
+
+
+def test_stats_cover_only_the_window():
+    clock = _Clock()
+    profiler = FrameProfiler(50, window=3, clock=clock.time)
+    _frames(profiler, clock, [0.02] * 5, update=0.004)
+
+    stats = profiler.stats()
+    assert profiler.frame_count == 5 and len(profiler.frames) == 3
+    assert stats["frames"] == 3
+    assert stats["update"]["mean"] == pytest.approx(0.004)
+    assert stats["interval"]["max"] == pytest.approx(0.02)
+    assert stats["fps"] == pytest.approx(50)
+    assert profiler.stats(window=2)["frames"] == 2
+
+
+def test_frames_are_missed_by_the_gap_to_the_previous_one():
+    clock = _Clock()
+    profiler = FrameProfiler(50, clock=clock.time)
+    # The intervals of frames 1, 2 and 3 are 1.4, 1.6 and 1 deadlines
+    _frames(profiler, clock, [0.028, 0.032, 0.02, 0.02])
+
+    assert [row[8] for row in profiler.frames] == [False, False, True, False]
+    assert profiler.missed_count == 1
+
+
+def test_simulation_and_decisions_from_other_threads_join_the_next_frame():
+    clock = _Clock()
+    profiler = FrameProfiler(50, clock=clock.time)
+    profiler.record("simulate", 0.01)
+    profiler.record("simulate", 0.005)
+    _frames(profiler, clock, [0.02, 0.02])
+
+    assert [row[6] for row in profiler.frames] == [pytest.approx(0.015), 0.0]
+
+
+@pytest.mark.parametrize("extension", ["csv", "json"])
+def test_every_frame_is_streamed_to_the_dump(tmp_path, extension):
+    clock = _Clock()
+    path = str(tmp_path / f"profile.{extension}")
+    profiler = FrameProfiler(50, window=2, dump_path=path, clock=clock.time)
+    _frames(profiler, clock, [0.02, 0.04, 0.02])
+    profiler.close()
+
+    with open(path) as file:
+        if extension == "csv":
+            rows = list(csv.DictReader(file))
+            assert [row["missed"] for row in rows] == ["False", "False", "True"]
+        else:
+            dump = json.load(file)
+            rows = dump["frames"]
+            assert [row["missed"] for row in rows] == [False, False, True]
+            assert (dump["stats"]["total_frames"], dump["stats"]["total_missed"], dump["stats"]["frames"]) == (3, 1, 2)
+    assert [int(row["frame"]) for row in rows] == [0, 1, 2]
+
+
+def test_every_decision_of_a_shot_is_counted():
+    pytest.importorskip("fastfiz")
+    clock = _Clock()
+    profiler = FrameProfiler(50, clock=clock.time)
+
+    def decider(_):
+        clock.now += 0.01
+
+    def simulate_next_shot(table_state, shot_decider):
+        # Like a decider that passes its first turn, asked twice within one simulation
+        shot_decider(table_state)
+        shot_decider(table_state)
+        clock.now += 0.005
+
+    profiler.profile_shot(simulate_next_shot, None, decider)
+    _frames(profiler, clock, [0.02])
+
+    assert profiler.frames[0][5] == pytest.approx(0.02)
+    assert profiler.frames[0][6] == pytest.approx(0.005)
@@ -0,0 +1,24 @@
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+
+from fastfiz_renderer.DevUtils import DevShotDeciders
+from fastfiz_renderer.GameRunner import GameRunner
+from fastfiz_renderer.StateCodec import StateCodec
+
+
+def _small_table_state() -> ff.TableState:
+    table_state = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    width, length, *rest = StateCodec.encode_table(table_state.getTable())
+    return StateCodec.decode_table_state(StateCodec.encode_table_state(table_state), (width * 0.8, length * 0.8, *rest))
+
+
+def test_process_pool_plays_the_given_table():
+    games = [(_small_table_state(), DevShotDeciders.north_shot_decider) for _ in range(2)]
+
+    in_process = GameRunner(processes=1, max_shots=5).run_games(games)
+    pooled = GameRunner(processes=2, max_shots=5).run_games([(_small_table_state(), decider) for _, decider in games])
+
+    assert [shot.duration for result in pooled for shot in result.shots] == \
+           [shot.duration for result in in_process for shot in result.shots]
+    assert [result.termination_reason for result in pooled] == [result.termination_reason for result in in_process]
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+pytest.importorskip("p5")
+
+from fastfiz_renderer.DevUtils import DevShotDeciders
+from fastfiz_renderer.GameSession import GameSession
+from fastfiz_renderer.GameStatistics import GameStatistics
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def _update(session: GameSession, clock: _Clock, frames: int):
+    # Every frame is far enough apart for any shot to finish by the next one
+    for _ in range(frames):
+        clock.now += 100
+        session.update()
+
+
+def _ball_positions(session: GameSession):
+    return [(round(ball.position.x, 9), round(ball.position.y, 9)) for ball in session.game_table.game_balls]
+
+
+def test_undo_then_redo_shows_the_recorded_shot_without_deciding_again():
+    decided = []
+
+    def decider(table_state: ff.TableState):
+        decided.append(len(decided))
+        return DevShotDeciders.north_shot_decider(table_state)
+
+    clock = _Clock()
+    session = GameSession([(ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState(), decider)], auto_play=True,
+                          prefetch_shots=False, clock=clock.time)
+    # Auto play asks for a shot, starts it and finishes it in three frames
+    _update(session, clock, 6)
+    assert session.shown_shot_number == 2 and session.game_table.is_idle
+    after_second_shot = _ball_positions(session)
+
+    session.undo()
+    _update(session, clock, 3)
+    assert session.is_paused
+    assert session.shown_shot_number == 1
+    assert len(decided) == 2
+
+    session.redo()
+    _update(session, clock, 3)
+    assert session.shown_shot_number == 2
+    assert session.history.shot_count == 2
+    assert _ball_positions(session) == after_second_shot
+    assert len(decided) == 2
+
+
+def test_shown_shot_number_excludes_the_animating_shot():
+    clock = _Clock()
+    session = GameSession([(ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState(),
+                            DevShotDeciders.north_shot_decider)], clock=clock.time)
+    session.shoot()
+    session.update()
+
+    assert session.game_table.active_shot is not None
+    assert session.shown_shot_number == 0
+
+
+def test_prefetched_shot_dropped_for_moved_balls_is_played_later():
+    deciding = threading.Event()
+    release = threading.Event()
+    decider = DevShotDeciders.get_from_shot_params_list([DevShotDeciders.north_shot_decider(None)])
+
+    def blocking_decider(table_state: ff.TableState):
+        deciding.set()
+        release.wait(5)
+        return decider(table_state)
+
+    clock = _Clock()
+    with GameSession([(ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState(), blocking_decider)], auto_play=True,
+                     clock=clock.time, idle_wait=0.001) as session:
+        assert deciding.wait(5)
+        # Balls moved while the decider runs make its shot stale, but the params list has moved on already
+        session.commit_ball_positions()
+        release.set()
+        for _ in range(500):
+            if session.history.shot_count:
+                break
+            time.sleep(0.01)
+
+    assert session.history.shot_count == 1
+
+
+def test_statistics_get_the_decide_duration_and_the_game_open_at_close():
+    def slow_decider(table_state: ff.TableState):
+        time.sleep(0.05)
+        return DevShotDeciders.north_shot_decider(table_state)
+
+    statistics = GameStatistics()
+    session = GameSession([(ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState(), slow_decider)],
+                          statistics=statistics)
+    session.shoot()
+    session.close()
+    session.close()
+
+    summary = statistics.summary()
+    assert summary["shots"] == 1
+    assert summary["max_decide_duration"] >= 0.05
+    assert summary["end_reasons"] == {GameSession.SESSION_CLOSED: 1}
@@ -0,0 +1,43 @@
+import csv
+
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+
+from fastfiz_renderer.GameRunner import GameResult, ShotRecord
+from fastfiz_renderer.GameStatistics import PARAM_BINS, GameStatistics
+
+
+def _shot(a: float = 0.0, pocketed=(), first_contact=1) -> ShotRecord:
+    fouls = [] if first_contact is not None else ["No ball hit"]
+    return ShotRecord((a, 0.0, 10.0, 90.0, 2.0), 1.5, list(pocketed), fouls, first_contact)
+
+
+def test_streamed_shots_match_whole_games(tmp_path):
+    shots = [_shot(pocketed=[(3, ff.Ball.POCKETED_NE)]), _shot(first_contact=None)]
+    streamed = GameStatistics(str(tmp_path / "streamed"), chunk_rows=1)
+    for shot_number, shot in enumerate(shots):
+        streamed.add_shot(1, shot_number, shot)
+    streamed.end_game(1, "Shot limit reached")
+    streamed.close()
+
+    whole = GameStatistics()
+    whole.add_game(GameResult(1, shots, "Shot limit reached"))
+
+    assert streamed.summary() == whole.summary()
+    assert streamed.summary()["break_pocketed_per_game"] == 1
+    with open(tmp_path / "streamed" / "shots.csv") as file:
+        assert [row["fouls"] for row in csv.DictReader(file)] == ["0", "1"]
+    with open(tmp_path / "streamed" / "games.csv") as file:
+        assert [row["end_reason"] for row in csv.DictReader(file)] == ["Shot limit reached"]
+
+
+def test_out_of_range_params_are_counted():
+    statistics = GameStatistics()
+    statistics.add_game(GameResult(1, [_shot(-2.0), _shot(0.5), _shot(1.0), _shot(3.0)], "Shot limit reached"))
+    statistics.flush()
+
+    histogram = statistics.param_histograms["a"]
+    assert len(histogram) == len(PARAM_BINS["a"]) + 1
+    assert histogram[0] == 1 and histogram[-1] == 1
+    assert histogram.sum() == 4
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+import pytest
+
+# Fresh interpreters, since which submodules were imported before decides what the package binds
+_CASES = {
+    "export_first": "from fastfiz_renderer import ShotRecording\nimport fastfiz_renderer.ShotRecording",
+    "submodule_first": "import fastfiz_renderer.ShotRecording\nfrom fastfiz_renderer import ShotRecording",
+    "from_submodule_first": "from fastfiz_renderer.ShotRecording import ShotRecording as _\n"
+                            "from fastfiz_renderer import ShotRecording",
+    # ReplayTimeline imports ShotRecording itself
+    "imported_inside_the_package": "from fastfiz_renderer import ReplayTimeline\n"
+                                   "from fastfiz_renderer import ShotRecording",
+}
+
+
+@pytest.mark.parametrize("imports", _CASES.values(), ids=_CASES.keys())
+def test_exports_are_classes_in_any_import_order(imports):
+    check = (f"{imports}\n"
+             "import fastfiz_renderer\n"
+             "assert isinstance(ShotRecording, type), ShotRecording\n"
+             "assert fastfiz_renderer.ShotRecording is ShotRecording\n"
+             "assert isinstance(fastfiz_renderer.ReplayTimeline, type)\n"
+             "assert isinstance(sys.modules['fastfiz_renderer.ShotRecording'], type(sys))\n")
+    subprocess.run([sys.executable, "-c", f"import sys\n{check}"], check=True)
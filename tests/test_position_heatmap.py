@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.PositionHeatmap import PositionHeatmap
+from fastfiz_renderer.TableGeometry import TableGeometry
+
+GEOMETRY = TableGeometry(1.0, 2.0, 0.12, 0.11, 0.015, 0.2, 9.81)
+
+
+def _frame():
+    positions = np.full((16, 2), 0.1)
+    positions[ff.Ball.CUE] = (0.9, 1.9)
+    states = np.full(16, ff.Ball.STATIONARY)
+    states[ff.Ball.EIGHT] = ff.Ball.POCKETED_NE
+    return positions, states
+
+
+def test_positions_are_counted_per_group():
+    heatmap = PositionHeatmap(GEOMETRY, bins=(10, 20))
+    heatmap.add_positions(*_frame())
+
+    assert heatmap.get_counts("cue")[19, 9] == 1
+    assert heatmap.get_counts("solids")[1, 1] == 7
+    assert heatmap.get_counts("eight").sum() == 0
+    assert heatmap.get_counts().sum() == 15
+    assert heatmap.samples == 1
+
+
+def test_merge_adds_counts():
+    heatmap, other = PositionHeatmap(GEOMETRY, bins=(10, 20)), PositionHeatmap(GEOMETRY, bins=(10, 20))
+    heatmap.add_positions(*_frame())
+    other.add_positions(*_frame())
+
+    heatmap.merge(other)
+
+    assert heatmap.get_counts().sum() == 30
+    assert heatmap.samples == 2
+
+
+@pytest.mark.parametrize("other", [
+    PositionHeatmap(GEOMETRY, bins=(20, 40)),
+    PositionHeatmap(TableGeometry(1.2, 2.4, 0.12, 0.11, 0.015, 0.2, 9.81), bins=(10, 20)),
+    PositionHeatmap(GEOMETRY, bins=(10, 20), groups={**PositionHeatmap.DEFAULT_GROUPS, "cue": (ff.Ball.ONE,)}),
+])
+def test_merge_rejects_different_heatmaps(other):
+    with pytest.raises(Exception):
+        PositionHeatmap(GEOMETRY, bins=(10, 20)).merge(other)
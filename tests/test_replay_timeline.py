@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.ReplayTimeline import ReplayTimeline
+from fastfiz_renderer.ShotTimeline import BallTimeline, ShotTimeline
+
+
+def _rolling_shot(number: int, start_y: float, duration: float) -> ShotTimeline:
+    # One ball moves north at constant speed for the whole shot and stops at start_y + duration
+    timeline = BallTimeline([0.0], [(0.0, 0.5, start_y, 0.0, 1.0, 0.0, 0.0, ff.Ball.ROLLING)],
+                            (0.5, start_y + duration), ff.Ball.STATIONARY)
+    return ShotTimeline(duration, {number: timeline})
+
+
+@pytest.fixture
+def replay() -> ReplayTimeline:
+    start_positions = np.tile((0.5, 0.0), (ShotTimeline.ball_count, 1))
+    start_states = np.full(ShotTimeline.ball_count, ff.Ball.STATIONARY)
+    start_positions[ff.Ball.CUE] = (0.5, 0.1)
+    return ReplayTimeline(start_states, start_positions,
+                          [_rolling_shot(ff.Ball.CUE, 0.1, 1.0), _rolling_shot(ff.Ball.ONE, 0.0, 0.5)])
+
+
+def test_shots_are_found_across_boundaries(replay):
+    assert replay.duration == pytest.approx(1.5)
+    assert [replay.shot_at(time) for time in (-1.0, 0.0, 0.99, 1.0, 1.4, 1.5, 9.0)] == [0, 0, 0, 1, 1, 1, 1]
+    assert replay.shot_start_time(-1) == 0.0
+    assert replay.shot_start_time(1) == pytest.approx(1.0)
+    assert replay.shot_start_time(2) == pytest.approx(1.5)
+
+
+def test_seeking_chains_the_shots(replay):
+    positions, states = replay.state_at(0.5)
+    assert positions[ff.Ball.CUE] == pytest.approx((0.5, 0.6))
+    assert states[ff.Ball.CUE] == ff.Ball.ROLLING
+
+    # The second shot starts from where the first left the cue ball
+    positions, states = replay.state_at(1.25)
+    assert positions[ff.Ball.CUE] == pytest.approx((0.5, 1.1))
+    assert states[ff.Ball.CUE] == ff.Ball.STATIONARY
+    assert positions[ff.Ball.ONE] == pytest.approx((0.5, 0.25))
+
+
+def test_times_past_the_ends_are_clamped(replay):
+    for time, clamped in ((-5.0, 0.0), (5.0, replay.duration)):
+        positions, states = replay.state_at(time)
+        expected_positions, expected_states = replay.state_at(clamped)
+        np.testing.assert_array_equal(positions, expected_positions)
+        np.testing.assert_array_equal(states, expected_states)
+
+    positions, _ = replay.state_at(replay.duration)
+    assert positions[ff.Ball.ONE] == pytest.approx((0.5, 0.5))
+
+
+def test_negative_speeds_play_the_same_frames_backwards(replay):
+    forward = replay.frame_times(0.25, 1.25, 0.5, 60)
+    backward = replay.frame_times(0.25, 1.25, -0.5, 60)
+
+    assert len(forward) == len(backward) == 121
+    np.testing.assert_allclose(backward, forward[::-1])
+    np.testing.assert_array_equal(replay.state_at(backward[-1])[0], replay.state_at(0.25)[0])
+
+    # Frames never leave the game, even when the range does
+    clamped = replay.frame_times(-1.0, 9.0, -2, 10)
+    assert clamped[0] == replay.duration
+    assert clamped.min() >= 0.0
+    with pytest.raises(Exception, match="Playback speed cannot be 0!"):
+        replay.frame_times(0.0, 1.0, 0, 60)
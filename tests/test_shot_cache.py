@@ -0,0 +1,74 @@
+import pickle
+
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.ShotCache import ShotCache
+from fastfiz_renderer.ShotTimeline import BallTimeline, ShotTimeline
+
+STATE = [(number, ff.Ball.STATIONARY, 0.1 * number, 0.2) for number in range(16)]
+TABLE = (1.116, 2.236, 0.1, 0.1, 0.01, 0.2, 9.81)
+PARAMS = (0.0, 0.0, 11.0, 90.0, 1.5)
+
+
+def _timeline(duration: float) -> ShotTimeline:
+    cue = BallTimeline([0.0], [(0.0, 0.5, 1.0, 0.0, 1.0, 0.0, 0.0, ff.Ball.ROLLING)], (0.5, 1.0 + duration),
+                       ff.Ball.STATIONARY)
+    return ShotTimeline(duration, {ff.Ball.CUE: cue})
+
+
+def _key(index: int) -> bytes:
+    return ShotCache.get_encoded_key(STATE, TABLE, (*PARAMS[:4], float(index)))
+
+
+def test_key_changes_with_any_ball_table_or_param():
+    key = ShotCache.get_encoded_key(STATE, TABLE, PARAMS)
+    assert ShotCache.get_encoded_key(list(STATE), tuple(TABLE), tuple(PARAMS)) == key
+
+    moved = STATE[:3] + [(3, ff.Ball.STATIONARY, 0.3 + 1e-12, 0.2)] + STATE[4:]
+    pocketed = STATE[:3] + [(3, ff.Ball.POCKETED_NE, 0.3, 0.2)] + STATE[4:]
+    changed = [ShotCache.get_encoded_key(moved, TABLE, PARAMS), ShotCache.get_encoded_key(pocketed, TABLE, PARAMS),
+               ShotCache.get_encoded_key(STATE, (*TABLE[:2], 0.11, *TABLE[3:]), PARAMS),
+               ShotCache.get_encoded_key(STATE, TABLE, (*PARAMS[:3], 90.001, PARAMS[4]))]
+    assert len({key, *changed}) == 5
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ShotCache(max_entries=2)
+    cache.put(_key(0), _timeline(0.5), STATE)
+    cache.put(_key(1), _timeline(1.0), STATE)
+    assert cache.get(_key(0)) is not None
+    cache.put(_key(2), _timeline(1.5), STATE)
+
+    assert len(cache) == 2
+    assert cache.get(_key(1)) is None
+    assert cache.get(_key(0))[0].duration == 0.5
+    assert cache.get(_key(2))[0].duration == 1.5
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_saved_cache_is_loaded_in_order(tmp_path):
+    path = str(tmp_path / "shots.cache")
+    cache = ShotCache(path=path)
+    for index in range(3):
+        cache.put(_key(index), _timeline(index + 1.0), STATE)
+    cache.save()
+
+    # Only the most recently used entries fit
+    loaded = ShotCache(max_entries=2, path=path)
+    assert len(loaded) == 2
+    assert loaded.get(_key(0)) is None
+    timeline, end_state = loaded.get(_key(2))
+    assert timeline.duration == 3.0 and end_state == STATE
+    assert timeline.get_ball_timeline(ff.Ball.CUE).position_at(1.0)[:2] == pytest.approx((0.5, 2.0))
+
+
+def test_unreadable_or_outdated_caches_are_ignored(tmp_path, capsys):
+    broken = tmp_path / "broken.cache"
+    broken.write_bytes(b"not a cache")
+    outdated = tmp_path / "outdated.cache"
+    outdated.write_bytes(pickle.dumps((0, [(_key(0), (_timeline(1.0), STATE))])))
+
+    assert len(ShotCache(path=str(broken))) == 0
+    assert len(ShotCache(path=str(outdated))) == 0
+    assert "Ignoring" in capsys.readouterr().out
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.ShotHistory import ShotHistory
+
+
+def _snapshot(value: float):
+    return np.full((16, 2), value), np.full(16, ff.Ball.STATIONARY, dtype=np.int32)
+
+
+def test_snapshots_are_looked_up_by_shot():
+    history = ShotHistory(*_snapshot(0), capacity=2)
+    for shot_number in range(1, 5):
+        history.append(*_snapshot(shot_number))
+
+    assert history.shot_count == 4
+    for shot_number in range(5):
+        positions, _ = history.get(shot_number)
+        np.testing.assert_array_equal(positions, _snapshot(shot_number)[0])
+    with pytest.raises(IndexError):
+        history.get(5)
+
+
+def test_snapshots_are_read_only():
+    positions, states = ShotHistory(*_snapshot(0)).get(0)
+    with pytest.raises(ValueError):
+        positions[0, 0] = 1
+
+
+def test_truncated_snapshots_handed_out_earlier_stay_unchanged():
+    history = ShotHistory(*_snapshot(0))
+    history.append(*_snapshot(1))
+    history.append(*_snapshot(2))
+    old_positions, _ = history.get(2)
+
+    history.truncate(1)
+    history.append(*_snapshot(7))
+
+    assert history.shot_count == 2
+    np.testing.assert_array_equal(history.get(2)[0], _snapshot(7)[0])
+    np.testing.assert_array_equal(old_positions, _snapshot(2)[0])
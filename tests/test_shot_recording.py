@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.ShotRecording import ShotRecording, ShotRecordingWriter
+
+
+class _Vector:
+    def __init__(self, *values: float):
+        self.x, self.y, self.z = (*values, 0.0)[:3]
+
+
+class _BallData:
+    def __init__(self, x: float, y: float, state: int):
+        self._x, self._y, self._state = x, y, state
+
+    def getPos(self):
+        return _Vector(self._x, self._y)
+
+    def getVelocity(self):
+        return _Vector(0.0, 1.0)
+
+    def getSpin(self):
+        return _Vector(0.0, 0.0, 0.0)
+
+    def getState(self):
+        return self._state
+
+    def getRadius(self):
+        return 0.028575
+
+
+class _Event:
+    # The parts of ff.Event the writer reads; ball 2 is a rail, which is not recorded
+    def __init__(self, time: float, event_type: int, ball: int, y: float, state: int):
+        self._time, self._type, self._ball, self._data = time, event_type, ball, _BallData(0.5, y, state)
+
+    def getTime(self):
+        return self._time
+
+    def getType(self):
+        return self._type
+
+    def getBall1(self):
+        return self._ball
+
+    def getBall1Data(self):
+        return self._data
+
+    def getBall2(self):
+        return ff.Ball.UNKNOWN_ID
+
+    def getBall2Data(self):
+        return self._data
+
+
+class _Shot:
+    def __init__(self, duration: float):
+        self._duration = duration
+        self._events = [_Event(0.0, ff.Event.CUE_STRIKE, ff.Ball.CUE, 1.0, ff.Ball.SLIDING),
+                        _Event(duration, ff.Event.STATE_CHANGE, ff.Ball.CUE, 1.0 + duration, ff.Ball.STATIONARY)]
+
+    def getEventList(self):
+        return self._events
+
+    def getDuration(self):
+        return self._duration
+
+
+class _Table:
+    MU_SLIDING, MU_ROLLING, g = 0.2, 0.01, 9.81
+    TABLE_WIDTH, TABLE_LENGTH, SIDE_POCKET_WIDTH, CORNER_POCKET_WIDTH = 1.116, 2.236, 0.1, 0.1
+
+
+class _TableState:
+    def getTable(self):
+        return _Table()
+
+    def getBall(self, _):
+        return _BallData(0.0, 0.0, ff.Ball.STATIONARY)
+
+
+class _Params:
+    a, b, theta, phi, v = 0.0, 0.0, 11.0, 90.0, 1.5
+
+
+START_STATE = [(number, ff.Ball.STATIONARY, 0.1 * number, 0.2) for number in range(16)]
+SHOTS = [(1, 0, 0.5), (1, 1, 1.0), (2, 0, 1.5)]
+
+
+def _write(path: str, close: bool = True) -> ShotRecordingWriter:
+    writer = ShotRecordingWriter(path, _TableState(), index_events=False, index_chunk=2)
+    for game_number, shot_number, duration in SHOTS:
+        writer.write_shot(game_number, shot_number, START_STATE, _Params(), _Shot(duration))
+    if close:
+        writer.close()
+    return writer
+
+
+def _assert_shots(recording: ShotRecording, shot_count: int):
+    assert len(recording) == shot_count
+    for recorded, (game_number, shot_number, duration) in zip(recording, SHOTS):
+        assert (recorded.game_number, recorded.shot_number, recorded.duration) == (game_number, shot_number, duration)
+        assert recorded.params == (0.0, 0.0, 11.0, 90.0, 1.5)
+        np.testing.assert_array_equal(recorded.time, [0.0, duration])
+        np.testing.assert_array_equal(recorded.position[:, 1], [1.0, 1.0 + duration])
+        np.testing.assert_allclose(recorded.start_positions[3], (0.3, 0.2))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "games.ffzrec")
+    _write(path)
+
+    with ShotRecording(path) as recording:
+        _assert_shots(recording, len(SHOTS))
+        assert recording.game_numbers().tolist() == [1, 2]
+        assert recording.game_shot_indices(1).tolist() == [0, 1]
+        assert float(recording.header["table_length"]) == pytest.approx(2.236)
+        timeline = recording.timeline(2)
+        assert timeline.get_ball_timeline(ff.Ball.CUE).position_at(2.0)[:2] == pytest.approx((0.5, 2.5))
+
+
+def test_interrupted_writer_is_rescanned(tmp_path):
+    path = str(tmp_path / "games.ffzrec")
+    writer = _write(path, close=False)
+    writer._file.flush()
+
+    with ShotRecording(path) as recording:
+        _assert_shots(recording, len(SHOTS))
+    writer._file.close()
+
+    # A block cut short is left out
+    os.truncate(path, os.path.getsize(path) - 8)
+    with ShotRecording(path) as recording:
+        _assert_shots(recording, len(SHOTS) - 1)
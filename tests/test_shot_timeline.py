@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from fastfiz_renderer.FastFizCompat import ff
+from fastfiz_renderer.ShotTimeline import BallTimeline, ShotTimeline
+
+
+def _make_timeline() -> ShotTimeline:
+    # The cue ball rolls and stops, the one ball starts moving later, the rest never move
+    cue = BallTimeline([0.0, 1.0], [(0.0, 0.5, 1.5, 0.0, -1.0, 0.0, 0.25, ff.Ball.ROLLING),
+                                    (1.0, 0.5, 0.75, 0.0, 0.0, 0.0, 0.0, ff.Ball.STATIONARY)],
+                       (0.5, 0.75), ff.Ball.STATIONARY)
+    one = BallTimeline([0.5], [(0.5, 0.25, 0.5, 0.5, 0.0, -0.1, 0.0, ff.Ball.SLIDING)], (0.45, 0.5),
+                       ff.Ball.SLIDING)
+    return ShotTimeline(2.0, {ff.Ball.CUE: cue, ff.Ball.ONE: one})
+
+
+def test_ball_timeline_evaluates_the_active_segment():
+    timeline = _make_timeline().get_ball_timeline(ff.Ball.CUE)
+    assert timeline.position_at(-0.1) is None
+    x, y, state = timeline.position_at(0.5)
+    assert (x, y, state) == (pytest.approx(0.5), pytest.approx(1.5 - 0.5 + 0.25 * 0.25), ff.Ball.ROLLING)
+    assert timeline.position_at(1.5) == (pytest.approx(0.5), pytest.approx(0.75), ff.Ball.STATIONARY)
+
+
+@pytest.mark.parametrize("time", [0.0, 0.25, 0.5, 0.75, 1.0, 1.9])
+def test_positions_at_matches_every_ball_timeline(time):
+    timeline = _make_timeline()
+    positions, states, moved = timeline.positions_at(time)
+
+    for number in range(ShotTimeline.ball_count):
+        ball_timeline = timeline.get_ball_timeline(number)
+        expected = ball_timeline.position_at(time) if ball_timeline else None
+        assert moved[number] == (expected is not None)
+        if expected is not None:
+            np.testing.assert_allclose(positions[number], expected[:2])
+            assert states[number] == expected[2]
+        else:
+            assert np.isnan(positions[number]).all()
+            assert states[number] == -1
+
+
+def test_positions_before_the_first_event_are_unmoved():
+    positions, states, moved = _make_timeline().positions_at(-1.0)
+    assert not moved.any()
+    assert np.isnan(positions).all()
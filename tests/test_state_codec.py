@@ -0,0 +1,44 @@
+import pytest
+
+ff = pytest.importorskip("fastfiz")
+
+from fastfiz_renderer.StateCodec import StateCodec
+
+
+def test_table_state_round_trip():
+    table_state = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    table_state.setBall(ff.Ball.THREE, ff.Ball.POCKETED_NE, 0.1, 0.2)
+
+    encoded = StateCodec.encode_table_state(table_state)
+    decoded = StateCodec.decode_table_state(encoded)
+
+    assert StateCodec.encode_table_state(decoded) == encoded
+    assert decoded.getBall(ff.Ball.THREE).getState() == ff.Ball.POCKETED_NE
+
+
+def test_shot_params_round_trip():
+    params = ff.ShotParams()
+    params.a, params.b, params.theta, params.phi, params.v = 0.1, -0.2, 11, 270, 1.5
+
+    decoded = StateCodec.decode_shot_params(StateCodec.encode_shot_params(params))
+
+    assert StateCodec.encode_shot_params(decoded) == (0.1, -0.2, 11, 270, 1.5)
+
+
+def test_table_constants_survive_decoding():
+    table_state = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    width, length, *rest = StateCodec.encode_table(table_state.getTable())
+    encoded_table = (width * 0.5, length * 0.5, *rest)
+
+    decoded = StateCodec.decode_table_state(StateCodec.encode_table_state(table_state), encoded_table)
+
+    assert StateCodec.encode_table(decoded.getTable()) == encoded_table
+    assert StateCodec.encode_table(StateCodec.copy_table_state(decoded).getTable()) == encoded_table
+
+
+def test_copies_are_independent():
+    table_state = ff.GameState.RackedState(ff.GT_EIGHTBALL).tableState()
+    copy = StateCodec.copy_table_state(table_state)
+    copy.setBall(ff.Ball.ONE, ff.Ball.POCKETED_SW, 0.1, 0.1)
+
+    assert table_state.getBall(ff.Ball.ONE).getState() != ff.Ball.POCKETED_SW